@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..database.database import get_read_db
+from ..models.models import User, UserRole
+from ..utils.auth import get_current_user, check_permissions
+from ..utils.memory_diagnostics import (
+    SNAPSHOT_KEY_TYPES, memory_report, prometheus_metrics, snapshot_store, start_tracing, stop_tracing
+)
+from ..utils.parallel_analytics import system_analytics
+from ..utils.profiling import profile_store
+
+router = APIRouter(prefix="/admin")
+
+def _require_admin(current_user: User) -> None:
+    if not check_permissions(current_user.role, UserRole.ADMIN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+@router.get("/profiles/", response_model=List[dict])
+async def list_profiles(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "pstats",
+    sort: str = "cumulative",
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+
+    if format == "text":
+        try:
+            summary = profile_store.summary(profile_id, sort=sort, limit=limit)
+        except KeyError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown sort key: {sort}")
+        if summary is not None:
+            return PlainTextResponse(summary)
+    else:
+        path = profile_store.path(profile_id)
+        if path is not None:
+            return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+
+    raise HTTPException(status_code=404, detail="Profile not found")
+
+@router.get("/analytics/")
+async def get_system_analytics(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+) -> Any:
+    _require_admin(current_user)
+    if start and end and start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    return await run_in_threadpool(system_analytics, db, start, end)
+
+@router.get("/memory/")
+async def get_memory_report(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    return await run_in_threadpool(memory_report)
+
+@router.get("/memory/metrics")
+async def get_memory_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    report = await run_in_threadpool(memory_report)
+    return PlainTextResponse(prometheus_metrics(report), media_type="text/plain; version=0.0.4")
+
+@router.post("/memory/tracing")
+async def set_memory_tracing(
+    enabled: bool,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    if enabled:
+        start_tracing()
+    else:
+        stop_tracing()
+    return {"tracing": enabled}
+
+@router.post("/memory/snapshots/", status_code=status.HTTP_201_CREATED)
+async def create_memory_snapshot(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    try:
+        return await run_in_threadpool(snapshot_store.take)
+    except RuntimeError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Memory tracing is not enabled")
+
+@router.get("/memory/snapshots/", response_model=List[dict])
+async def list_memory_snapshots(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    return snapshot_store.list()
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def get_memory_snapshot(
+    snapshot_id: str,
+    format: str = "tracemalloc",
+    key_type: str = "lineno",
+    limit: int = 25,
+    base: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    _require_admin(current_user)
+    if key_type not in SNAPSHOT_KEY_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown key type: {key_type}")
+
+    if base is not None:
+        diff = await run_in_threadpool(snapshot_store.diff, snapshot_id, base, key_type, limit)
+        if diff is not None:
+            return diff
+    elif format == "top":
+        top = await run_in_threadpool(snapshot_store.top, snapshot_id, key_type, limit)
+        if top is not None:
+            return top
+    else:
+        path = snapshot_store.path(snapshot_id)
+        if path is not None:
+            return FileResponse(path, media_type="application/octet-stream", filename=f"{snapshot_id}.tracemalloc")
+
+    raise HTTPException(status_code=404, detail="Snapshot not found")
@@ -9,11 +9,12 @@ from ..database.database import get_db
 from ..models.models import User, UserRole
 from ..schemas.schemas import UserCreate, UserResponse
 from ..utils.auth import (
-    verify_password,
+    verify_and_update_password,
     get_password_hash,
     create_access_token,
     get_current_user
 )
+from ..utils.teardown import teardown_active
 
 router = APIRouter()
 
@@ -28,6 +29,11 @@ async def register_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+    if user_data.organization_id and teardown_active(db, user_data.organization_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Organization is being deleted"
+        )
     
     hashed_password = get_password_hash(user_data.password)
     db_user = User(
@@ -47,12 +53,17 @@ async def login_for_access_token(
     db: Session = Depends(get_db)
 ) -> Any:
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = verify_and_update_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Хеш создан по устаревшей политике: пересчитываем, пока известен пароль
+        user.hashed_password = new_hash
+        db.commit()
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -1,27 +1,72 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from ..database.database import get_db
-from ..models.models import User, BiometricData, AccessLog, UserRole, BiometricDataType
+from ..database import database
+from ..database.database import fan_out, get_db, get_read_db
+from ..models.models import User, BiometricData, AccessLog, UserRole, BiometricDataType, UsageSketch, MetadataKey, BiometricMetadataValue
 from ..schemas.schemas import (
     BiometricDataBase,
     BiometricDataCreate,
     BiometricDataResponse,
     BiometricDataUpdate,
+    BiometricDataBatchGet,
+    BiometricDataBatchResponse,
+    BiometricDataBulkUpdate,
+    BiometricDataBulkDelete,
+    BiometricDataFilter,
+    BulkJobResponse,
+    MetadataKeyCreate,
+    MetadataKeyResponse,
+    BiometricDataChangesResponse,
+    LatestReadingResponse,
+    BiometricTimelineResponse,
     AccessLog as AccessLogSchema,
     AnalyticsResponse
 )
 from ..utils.auth import get_current_user, check_permissions
-from ..utils.analytics import analyze_biometric_data, analyze_access_patterns
+from ..utils.admission import admission_control
+from ..utils.events import hub, event_stream
+from ..utils.encoding import negotiated_response
+from ..utils.jobs import JOB_FAILED, jobs, job_to_dict
+from ..utils.bulk_operations import count_matching, run_bulk_update, run_bulk_delete, run_in_new_session
+from ..utils.streaming_stats import observe_reading, forget_reading
+from ..utils.analytics import analyze_biometric_data, analyze_access_counts, generate_sketch_usage_report
+from ..utils.sketches import merge_usage, usage_buffer
+from ..utils.metadata_index import backfill_key, metadata_conditions
+from ..utils.change_feed import read_changes
+from ..utils.latest_readings import latest_readings
+from ..utils.timeline import decode_cursor, read_timeline
+from ..utils.ingest_dedup import client_key, content_key, find_duplicate, payload_mismatch
+from ..utils.access_log_compaction import access_counts
+from ..utils.coalescing import access_log_version, biometric_data_version, coalesced, precompute
+from ..utils.warmup import recent_activity, warmup
 from ..config import settings
 
 router = APIRouter()
 
-@router.post("/", response_model=BiometricDataResponse)
+# Период отчётов по умолчанию; с ним же отчёты прогреваются при старте
+DEFAULT_PERIOD_DAYS = 30
+
+def _replayed(original: BiometricData, payload_hash: Optional[str], response: Response) -> BiometricData:
+    if payload_mismatch(original, payload_hash):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different payload"
+        )
+    response.headers["Idempotent-Replayed"] = "true"
+    return original
+
+@router.post("/", response_model=BiometricDataResponse, dependencies=[Depends(admission_control("write"))])
 async def create_biometric_data(
     data: BiometricDataCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -31,16 +76,43 @@ async def create_biometric_data(
             detail="User must be associated with an organization"
         )
     
+    timestamp = data.timestamp or datetime.utcnow()
+    payload_hash = None
+    if idempotency_key:
+        key = client_key(current_user.id, idempotency_key)
+        # Хеш содержимого хранится рядом с ключом: повтор обязан прислать то же самое
+        payload_hash = content_key(current_user.id, data.data_type, data.value, timestamp, data.data_metadata)
+    elif settings.INGEST_CONTENT_DEDUPLICATION:
+        key = content_key(current_user.id, data.data_type, data.value, timestamp, data.data_metadata)
+    else:
+        key = None
+    
+    # Повтор загрузки: возвращается исходная запись, ничего не пишется
+    original = find_duplicate(db, current_user.organization_id, key) if key else None
+    if original is not None:
+        return _replayed(original, payload_hash, response)
+    
     biometric_data = BiometricData(
         user_id=current_user.id,
         data_type=data.data_type,
         value=data.value,
-        timestamp=data.timestamp or datetime.utcnow(),
+        timestamp=timestamp,
         data_metadata=data.data_metadata,
-        organization_id=current_user.organization_id
+        organization_id=current_user.organization_id,
+        ingest_key=key,
+        ingest_hash=payload_hash
     )
+    observe_reading(db, biometric_data)
     db.add(biometric_data)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный повтор успел раньше: его запись и есть исходная
+        db.rollback()
+        original = find_duplicate(db, current_user.organization_id, key) if key else None
+        if original is None:
+            raise
+        return _replayed(original, payload_hash, response)
     db.refresh(biometric_data)
     
     log = AccessLog(
@@ -52,15 +124,228 @@ async def create_biometric_data(
     db.add(log)
     db.commit()
     
+    # Скетчи использования обновляются пачками, а не на каждую запись
+    usage_buffer.record(
+        db, current_user.organization_id, data.data_type, datetime.utcnow().date(), current_user.id, data.value
+    )
+    
     return biometric_data
 
-@router.get("/{data_id}", response_model=BiometricDataResponse)
+@router.post("/batch-get/", response_model=BiometricDataBatchResponse, dependencies=[Depends(admission_control("batch_read"))])
+async def batch_get_biometric_data(
+    batch: BiometricDataBatchGet,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    ids = list(dict.fromkeys(batch.ids))
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No ids requested")
+    if len(ids) > settings.MULTI_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MULTI_GET_MAX_IDS} ids can be requested at once"
+        )
+    
+    # Records of other organizations are reported as missing, not as forbidden
+    rows = db.query(BiometricData).filter(
+        BiometricData.id.in_(ids),
+        BiometricData.organization_id == current_user.organization_id
+    ).all()
+    by_id = {row.id: row for row in rows}
+    # Serialize before commit: committing expires the loaded rows
+    response = BiometricDataBatchResponse(
+        found=[BiometricDataResponse.model_validate(by_id[data_id]) for data_id in ids if data_id in by_id],
+        missing=[data_id for data_id in ids if data_id not in by_id]
+    )
+    
+    if rows:
+        db.execute(insert(AccessLog), [
+            {
+                "user_id": current_user.id,
+                "organization_id": current_user.organization_id,
+                "action": "read",
+                "details": {"data_id": item.id, "batch": True}
+            }
+            for item in response.found
+        ])
+        db.commit()
+    
+    return response
+
+def _start_bulk_job(
+    operation,
+    name: str,
+    selection: BiometricDataFilter,
+    current_user: User,
+    db: Session,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    **kwargs
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    if not selection.model_dump(include={"ids", "user_id", "data_type", "start", "end"}, exclude_none=True):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Specify ids or at least one filter"
+        )
+    if selection.ids is not None and len(selection.ids) > settings.BULK_OPERATION_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BULK_OPERATION_MAX_IDS} ids can be given at once"
+        )
+    
+    total = count_matching(db, current_user.organization_id, selection)
+    job = jobs.create(db, name, current_user.organization_id, total)
+    args = (current_user.organization_id, current_user.id, selection)
+    kwargs["chunk_size"] = settings.BULK_OPERATION_CHUNK_SIZE
+    if total > settings.BULK_OPERATION_SYNC_LIMIT:
+        background_tasks.add_task(run_in_new_session, operation, job.id, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        operation(db, job, *args, **kwargs)
+        if job.status == JOB_FAILED:
+            # Already committed chunks stay applied; the job shows how far it got
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Bulk operation {job.id} failed after {job.processed} of {job.total} records"
+            )
+    return job_to_dict(job)
+
+@router.post("/bulk-update/", response_model=BulkJobResponse, dependencies=[Depends(admission_control("bulk_write"))])
+async def bulk_update_biometric_data(
+    bulk: BiometricDataBulkUpdate,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    changes = bulk.changes.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No changes specified")
+    return _start_bulk_job(
+        run_bulk_update, "bulk_update", bulk, current_user, db, background_tasks, response,
+        changes=changes
+    )
+
+@router.post("/bulk-delete/", response_model=BulkJobResponse, dependencies=[Depends(admission_control("bulk_write"))])
+async def bulk_delete_biometric_data(
+    bulk: BiometricDataBulkDelete,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return _start_bulk_job(
+        run_bulk_delete, "bulk_delete", bulk, current_user, db, background_tasks, response
+    )
+
+@router.get("/bulk-jobs/{job_id}", response_model=BulkJobResponse)
+async def get_bulk_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = jobs.get(db, job_id)
+    if job is None or job.organization_id != current_user.organization_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+@router.get("/metadata-keys/", response_model=List[MetadataKeyResponse])
+async def list_metadata_keys(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return db.query(MetadataKey).filter(MetadataKey.organization_id == current_user.organization_id).all()
+
+@router.post("/metadata-keys/", response_model=MetadataKeyResponse, status_code=status.HTTP_201_CREATED)
+async def declare_metadata_key(
+    key: MetadataKeyCreate,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    if db.query(MetadataKey).filter(
+        MetadataKey.organization_id == current_user.organization_id,
+        MetadataKey.key == key.key
+    ).first():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Metadata key already declared")
+    
+    metadata_key = MetadataKey(organization_id=current_user.organization_id, key=key.key, value_type=key.value_type)
+    db.add(metadata_key)
+    db.commit()
+    db.refresh(metadata_key)
+    
+    # Новые записи индексируются при записи, существующие — задачей, как массовые операции
+    result = MetadataKeyResponse.model_validate(metadata_key)
+    total = db.scalar(select(func.count(BiometricData.id)).where(
+        BiometricData.organization_id == current_user.organization_id
+    ))
+    job = jobs.create(db, "metadata_backfill", current_user.organization_id, total)
+    args = (current_user.organization_id, result.key, result.value_type)
+    chunk_size = settings.BULK_OPERATION_CHUNK_SIZE
+    result.job_id = job.id
+    if total > settings.BULK_OPERATION_SYNC_LIMIT:
+        background_tasks.add_task(run_in_new_session, backfill_key, job.id, *args, chunk_size=chunk_size)
+        response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        result.indexed_values = backfill_key(db, job, *args, chunk_size=chunk_size)
+        if job.status == JOB_FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Metadata backfill {job.id} failed after {job.processed} of {job.total} records"
+            )
+    return result
+
+@router.delete("/metadata-keys/{key}")
+async def delete_metadata_key(
+    key: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    metadata_key = db.query(MetadataKey).filter(
+        MetadataKey.organization_id == current_user.organization_id,
+        MetadataKey.key == key
+    ).first()
+    if not metadata_key:
+        raise HTTPException(status_code=404, detail="Metadata key not found")
+    
+    db.query(BiometricMetadataValue).filter(
+        BiometricMetadataValue.organization_id == current_user.organization_id,
+        BiometricMetadataValue.key == key
+    ).delete(synchronize_session=False)
+    db.delete(metadata_key)
+    db.commit()
+    return {"message": "Metadata key deleted"}
+
+def _in_other_shard(data_id: int, current_user: User) -> bool:
+    # id несёт номер шарда: запись из чужого шарда принадлежит другой организации
+    router = database.shard_router
+    return router.enabled and router.shard_of_id(data_id) != router.shard_for(current_user.organization_id)
+
+@router.get("/{data_id}", response_model=BiometricDataResponse, dependencies=[Depends(admission_control("read"))])
 async def get_biometric_data(
     data_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     biometric_data = db.query(BiometricData).filter(BiometricData.id == data_id).first()
+    if not biometric_data and _in_other_shard(data_id, current_user):
+        raise HTTPException(status_code=403, detail="Not authorized to access this data")
     if not biometric_data:
         raise HTTPException(status_code=404, detail="Biometric data not found")
     
@@ -78,7 +363,7 @@ async def get_biometric_data(
     
     return biometric_data
 
-@router.put("/{data_id}", response_model=BiometricDataResponse)
+@router.put("/{data_id}", response_model=BiometricDataResponse, dependencies=[Depends(admission_control("write"))])
 async def update_biometric_data(
     data_id: int,
     data: BiometricDataUpdate,
@@ -86,52 +371,157 @@ async def update_biometric_data(
     db: Session = Depends(get_db)
 ):
     biometric_data = db.query(BiometricData).filter(BiometricData.id == data_id).first()
+    if not biometric_data and _in_other_shard(data_id, current_user):
+        raise HTTPException(status_code=403, detail="Not authorized to update this data")
     if not biometric_data:
         raise HTTPException(status_code=404, detail="Biometric data not found")
     
     if biometric_data.organization_id != current_user.organization_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this data")
     
-    for field, value in data.dict(exclude_unset=True).items():
+    changes = data.dict(exclude_unset=True)
+    if "value" in changes:
+        forget_reading(db, biometric_data)
+    for field, value in changes.items():
         setattr(biometric_data, field, value)
+    if "value" in changes:
+        observe_reading(db, biometric_data)
     
     db.commit()
     db.refresh(biometric_data)
     return biometric_data
 
-@router.delete("/{data_id}")
+@router.delete("/{data_id}", dependencies=[Depends(admission_control("write"))])
 async def delete_biometric_data(
     data_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     biometric_data = db.query(BiometricData).filter(BiometricData.id == data_id).first()
+    if not biometric_data and _in_other_shard(data_id, current_user):
+        raise HTTPException(status_code=403, detail="Not authorized to delete this data")
     if not biometric_data:
         raise HTTPException(status_code=404, detail="Biometric data not found")
     
     if biometric_data.organization_id != current_user.organization_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this data")
     
+    forget_reading(db, biometric_data)
     db.delete(biometric_data)
     db.commit()
     return {"message": "Biometric data deleted successfully"}
 
-@router.get("/", response_model=List[BiometricDataResponse])
+@router.get("/", response_model=List[BiometricDataResponse], dependencies=[Depends(admission_control("list"))])
 async def list_biometric_data(
+    request: Request,
     data_type: Optional[BiometricDataType] = None,
+    meta: List[str] = Query([]),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    query = db.query(BiometricData).filter(BiometricData.organization_id == current_user.organization_id)
+    query = db.query(BiometricData).filter(
+        BiometricData.organization_id == current_user.organization_id,
+        *metadata_conditions(db, current_user.organization_id, meta)
+    )
     if data_type:
         query = query.filter(BiometricData.data_type == data_type)
-    return query.all()
+    # В пуле потоков, чтобы отключение клиента прерывало запрос к базе
+    rows = await run_in_threadpool(query.all)
+    return negotiated_response(request, rows, BiometricDataResponse, tabular=True)
 
-@router.get("/analytics/", response_model=AnalyticsResponse)
-async def get_analytics(
+@router.get("/latest/", response_model=List[LatestReadingResponse], dependencies=[Depends(admission_control("read"))])
+async def get_latest_readings(
+    user_id: Optional[int] = None,
+    data_type: Optional[BiometricDataType] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if user_id is None:
+        user_id = current_user.id
+    elif user_id != current_user.id and not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    if data_type is not None:
+        reading = latest_readings.get(db, user_id, data_type)
+        readings = [(data_type.value, reading)] if reading is not None else []
+    else:
+        readings = latest_readings.for_user(db, user_id)
+    return [
+        {"data_id": reading.data_id, "user_id": user_id, "data_type": kind,
+         "value": reading.value, "timestamp": reading.timestamp}
+        for kind, reading in readings
+        if reading.organization_id == current_user.organization_id
+    ]
+
+@router.get("/timeline/", response_model=BiometricTimelineResponse, dependencies=[Depends(admission_control("list"))])
+async def get_biometric_timeline(
+    request: Request,
     data_type: BiometricDataType,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    include_metadata: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
+):
+    if user_id is None:
+        user_id = current_user.id
+    elif user_id != current_user.id and not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    
+    limit = max(1, min(limit, settings.TIMELINE_MAX_PAGE_SIZE))
+    items, next_cursor, has_more = await run_in_threadpool(
+        read_timeline, db, current_user.organization_id, user_id, data_type, start, end, after, limit,
+        descending=order == "desc", include_metadata=include_metadata
+    )
+    return negotiated_response(request, {
+        "user_id": user_id,
+        "data_type": data_type,
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }, BiometricTimelineResponse)
+
+@router.get("/changes/", response_model=BiometricDataChangesResponse, dependencies=[Depends(admission_control("list"))])
+async def get_biometric_changes(
+    request: Request,
+    since: int = 0,
+    limit: int = 500,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User must be associated with an organization"
+        )
+    
+    limit = max(1, min(limit, settings.CHANGE_FEED_MAX_PAGE_SIZE))
+    changes, next_cursor, has_more = await run_in_threadpool(read_changes, db, current_user.organization_id, since, limit)
+    return negotiated_response(request, {
+        "changes": changes,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }, BiometricDataChangesResponse)
+
+@router.get("/events/")
+async def stream_biometric_events(
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
     if not current_user.organization_id:
         raise HTTPException(
@@ -139,31 +529,189 @@ async def get_analytics(
             detail="User must be associated with an organization"
         )
     
-    data = db.query(BiometricData).filter(
+    subscription = hub.subscribe(current_user.organization_id, settings.EVENT_SUBSCRIBER_BUFFER)
+    return StreamingResponse(
+        event_stream(subscription, request.is_disconnected, settings.EVENT_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/anomalies/", response_model=List[BiometricDataResponse], dependencies=[Depends(admission_control("list"))])
+async def list_anomalies(
+    request: Request,
+    data_type: Optional[BiometricDataType] = None,
+    min_score: Optional[float] = None,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    threshold = settings.ANOMALY_SCORE_THRESHOLD if min_score is None else min_score
+    query = db.query(BiometricData).filter(
         BiometricData.organization_id == current_user.organization_id,
-        BiometricData.data_type == data_type
-    ).all()
+        BiometricData.anomaly_score >= threshold
+    )
+    if data_type:
+        query = query.filter(BiometricData.data_type == data_type)
+    rows = await run_in_threadpool(query.order_by(BiometricData.anomaly_score.desc()).limit(min(limit, 1000)).all)
+    return negotiated_response(request, rows, BiometricDataResponse, tabular=True)
+
+def _usage_sketches(db: Session, organization_id: int, period_days: int, data_type: Optional[BiometricDataType] = None):
+    start = (datetime.utcnow() - timedelta(days=period_days)).date()
+    query = db.query(UsageSketch).filter(
+        UsageSketch.organization_id == organization_id,
+        UsageSketch.day >= start
+    )
+    if data_type:
+        query = query.filter(UsageSketch.data_type == data_type)
+    return [
+        row for row in usage_buffer.read(organization_id, query.all)
+        if row.day >= start and (data_type is None or row.data_type == data_type)
+    ]
+
+@router.get("/usage-report/", response_model=dict, dependencies=[Depends(admission_control("analytics"))])
+async def get_usage_report(
+    request: Request,
+    period_days: int = DEFAULT_PERIOD_DAYS,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    organization_id = current_user.organization_id
+    report = await coalesced(
+        db, "usage_report", organization_id, {"period_days": period_days}, biometric_data_version(db, organization_id),
+        lambda session: generate_sketch_usage_report(_usage_sketches(session, organization_id, period_days), period_days)
+    )
+    return negotiated_response(request, report)
+
+@router.get("/quantiles/", response_model=dict, dependencies=[Depends(admission_control("analytics"))])
+async def get_quantiles(
+    request: Request,
+    data_type: BiometricDataType,
+    q: List[float] = Query([0.5, 0.9, 0.99]),
+    period_days: int = 30,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not check_permissions(current_user.role, UserRole.ORGANIZATION):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    if any(not 0 <= value <= 1 for value in q):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Quantiles must be within [0, 1]")
+    
+    organization_id = current_user.organization_id
+    
+    def compute(session: Session) -> dict:
+        rows = _usage_sketches(session, organization_id, period_days, data_type)
+        if not rows:
+            raise HTTPException(status_code=404, detail="No data found for analysis")
+        
+        _, values = merge_usage(rows)
+        return {
+            "data_type": data_type,
+            "count": values.count,
+            "quantiles": {str(value): result for value, result in zip(q, values.quantiles(q))},
+            "rank_error": values.rank_error,
+            "period": f"Last {period_days} days"
+        }
+    
+    result = await coalesced(
+        db, "quantiles", organization_id, {"data_type": data_type, "q": q, "period_days": period_days},
+        biometric_data_version(db, organization_id), compute
+    )
+    return negotiated_response(request, result)
+
+def _analytics_summary(db: Session, organization_id: int, data_type: BiometricDataType, conditions) -> dict:
+    values = db.scalars(select(BiometricData.value).where(
+        BiometricData.organization_id == organization_id,
+        BiometricData.data_type == data_type,
+        *conditions
+    )).all()
     
-    if not data:
+    if not values:
         raise HTTPException(status_code=404, detail="No data found for analysis")
     
-    values = [d.value for d in data]
     return {
         "data_type": data_type,
         "count": len(values),
         "average": sum(values) / len(values),
         "min": min(values),
         "max": max(values),
-        "metadata": {
-            "organization_id": current_user.organization_id,
-            "analysis_timestamp": datetime.utcnow().isoformat()
-        }
+        "metadata": {"organization_id": organization_id}
     }
 
-@router.get("/access-logs/", response_model=List[AccessLogSchema])
+@router.get("/analytics/", response_model=AnalyticsResponse, dependencies=[Depends(admission_control("analytics"))])
+async def get_analytics(
+    request: Request,
+    data_type: BiometricDataType,
+    meta: List[str] = Query([]),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    if not current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User must be associated with an organization"
+        )
+    
+    organization_id = current_user.organization_id
+    conditions = metadata_conditions(db, organization_id, meta)
+    result = await coalesced(
+        db, "analytics", organization_id, {"data_type": data_type, "meta": sorted(meta)},
+        biometric_data_version(db, organization_id),
+        lambda session: _analytics_summary(session, organization_id, data_type, conditions)
+    )
+    # Сводка берётся из общего кеша, поэтому время анализа ставится на каждый ответ
+    result = {**result, "metadata": {**result["metadata"], "analysis_timestamp": datetime.utcnow().isoformat()}}
+    return negotiated_response(request, result, AnalyticsResponse)
+
+def _warm_analytics(db: Session) -> int:
+    # Отчёт и аналитика с параметрами по умолчанию для самых активных организаций
+    _, organization_ids = recent_activity(db, settings.WARMUP_ACTIVITY_DAYS)
+    computed = 0
+    for organization_id in organization_ids[:settings.WARMUP_ORGANIZATIONS]:
+        db.info["organization_id"] = organization_id
+        version = biometric_data_version(db, organization_id)
+        computed += precompute(
+            db, "usage_report", organization_id, {"period_days": DEFAULT_PERIOD_DAYS}, version,
+            lambda session: generate_sketch_usage_report(
+                _usage_sketches(session, organization_id, DEFAULT_PERIOD_DAYS), DEFAULT_PERIOD_DAYS
+            )
+        )
+        data_types = db.scalars(
+            select(BiometricData.data_type).where(BiometricData.organization_id == organization_id).distinct()
+        ).all()
+        for data_type in data_types:
+            computed += precompute(
+                db, "analytics", organization_id, {"data_type": data_type, "meta": []}, version,
+                lambda session: _analytics_summary(session, organization_id, data_type, [])
+            )
+    return computed
+
+warmup.add_step("analytics", _warm_analytics)
+
+def _all_access_logs(db: Session) -> List[AccessLog]:
+    # Журнал доступа собирается со всех шардов параллельно
+    shards = fan_out(db, lambda session: session.query(AccessLog).all())
+    return sorted((log for logs in shards for log in logs), key=lambda log: log.timestamp or datetime.min)
+
+@router.get("/access-logs/", response_model=List[AccessLogSchema], dependencies=[Depends(admission_control("access_logs"))])
 async def get_access_logs(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> List[AccessLogSchema]:
     if not check_permissions(current_user.role, UserRole.ORGANIZATION):
         raise HTTPException(
@@ -171,13 +719,15 @@ async def get_access_logs(
             detail="Not enough permissions"
         )
     
-    logs = db.query(AccessLog).all()
-    return logs
+    # В пуле потоков, чтобы отключение клиента прерывало запрос к базе
+    logs = await run_in_threadpool(_all_access_logs, db)
+    return negotiated_response(request, logs, AccessLogSchema, tabular=True)
 
-@router.get("/access-analytics/", response_model=dict)
+@router.get("/access-analytics/", response_model=dict, dependencies=[Depends(admission_control("access_analytics"))])
 async def get_access_analytics(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> dict:
     if not check_permissions(current_user.role, UserRole.ORGANIZATION):
         raise HTTPException(
@@ -185,12 +735,15 @@ async def get_access_analytics(
             detail="Not enough permissions"
         )
     
-    logs = db.query(AccessLog).all()
-    return analyze_access_patterns([{
-        "id": log.id,
-        "organization_id": log.organization_id,
-        "user_id": log.user_id,
-        "action": log.action,
-        "timestamp": log.timestamp,
-        "details": log.details
-    } for log in logs]) 
\ No newline at end of file
+    def compute(session: Session) -> dict:
+        # Почасовые агрегаты свёрнутого журнала плюс свежие строки, со всех шардов
+        counts = {}
+        for shard_counts in fan_out(session, access_counts):
+            for key, count in shard_counts.items():
+                counts[key] = counts.get(key, 0) + count
+        return analyze_access_counts(counts)
+    
+    result = await coalesced(
+        db, "access_analytics", current_user.organization_id, {}, access_log_version(db), compute
+    )
+    return negotiated_response(request, result)
\ No newline at end of file
@@ -1,11 +1,18 @@
 from typing import List, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from ..database.database import get_db
-from ..models.models import User, UserRole, Organization
-from ..schemas.schemas import OrganizationCreate, OrganizationResponse, OrganizationUpdate
+from ..models.models import User, UserRole, Organization, OrganizationTeardown
+from ..schemas.schemas import (
+    OrganizationCreate,
+    OrganizationResponse,
+    OrganizationUpdate,
+    OrganizationTeardownResponse
+)
 from ..utils.auth import get_current_user, check_permissions
+from ..utils.caches import cached_organization
+from ..utils.teardown import start_teardown, run_teardown
 
 router = APIRouter(prefix="/organizations")
 
@@ -42,7 +49,7 @@ async def get_organization(
             detail="Not enough permissions"
         )
     
-    organization = db.query(Organization).filter(Organization.id == organization_id).first()
+    organization = cached_organization(db, organization_id)
     if not organization:
         raise HTTPException(status_code=404, detail="Organization not found")
     return organization
@@ -71,9 +78,11 @@ async def update_organization(
     db.refresh(db_organization)
     return db_organization
 
-@router.delete("/{organization_id}")
-async def delete_organization(
+@router.delete("/{organization_id}", response_model=OrganizationTeardownResponse, status_code=status.HTTP_202_ACCEPTED)
+@router.post("/{organization_id}/teardown", response_model=OrganizationTeardownResponse, status_code=status.HTTP_202_ACCEPTED)
+async def teardown_organization(
     organization_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Any:
@@ -87,9 +96,28 @@ async def delete_organization(
     if not organization:
         raise HTTPException(status_code=404, detail="Organization not found")
     
-    db.delete(organization)
-    db.commit()
-    return {"message": "Organization deleted successfully"}
+    teardown = start_teardown(db, organization_id)
+    background_tasks.add_task(run_teardown, teardown.id)
+    return teardown
+
+@router.get("/{organization_id}/teardown", response_model=OrganizationTeardownResponse)
+async def get_organization_teardown(
+    organization_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    if not check_permissions(current_user.role, UserRole.ADMIN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    teardown = db.query(OrganizationTeardown).filter(
+        OrganizationTeardown.organization_id == organization_id
+    ).order_by(OrganizationTeardown.id.desc()).first()
+    if not teardown:
+        raise HTTPException(status_code=404, detail="Teardown not found")
+    return teardown
 
 @router.get("/", response_model=List[OrganizationResponse])
 async def list_organizations(
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 import secrets
 
@@ -12,8 +12,169 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Password hashing policy: "bcrypt" or "argon2" (argon2id, needs argon2-cffi).
+    # Hashes made under other parameters are upgraded on the next successful login
+    PASSWORD_HASH_SCHEME: str = "bcrypt"
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    
     # Database settings
     DATABASE_URL: str = "sqlite:///./biometric.db"
+    # Read replicas for read-only endpoints; empty means reads use DATABASE_URL
+    READ_DATABASE_URLS: List[str] = []
+    # How long a client keeps reading from the primary after its own write
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Sharding of organization-scoped tables: "off", "per_org" (database per
+    # organization, {shard} is its id) or "hash" ({shard} is organization_id % SHARD_COUNT)
+    SHARDING_MODE: str = "off"
+    SHARD_URL_TEMPLATE: str = "sqlite:///./shards/shard_{shard}.db"
+    SHARD_COUNT: int = 4
+    SHARD_FANOUT_WORKERS: int = 8
+    
+    # Per-organization admission control
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ORG_RATE_LIMIT_PER_SECOND: float = 50.0
+    ORG_RATE_LIMIT_BURST: float = 200.0
+    ORG_MAX_CONCURRENT_REQUESTS: int = 16
+    ADMISSION_LEASE_SECONDS: float = 300.0
+    ADMISSION_COST_WEIGHTS: Dict[str, float] = {
+        "read": 1.0,
+        "write": 1.0,
+        "list": 5.0,
+        "analytics": 10.0,
+        "access_logs": 5.0,
+        "access_analytics": 10.0,
+        "batch_read": 10.0,
+        "bulk_write": 20.0,
+    }
+    # Shared SQLite file for limiter state across workers; None keeps it in-process
+    ADMISSION_STATE_PATH: Optional[str] = None
+    
+    # Request deadlines: clients may ask for a timeout in seconds with the
+    # REQUEST_TIMEOUT_HEADER header (capped by MAX_REQUEST_TIMEOUT), routes are capped
+    # by REQUEST_TIMEOUTS per admission cost key. Database statements running past
+    # the deadline or after the client disconnects are interrupted with a 504
+    REQUEST_TIMEOUT_HEADER: str = "X-Request-Timeout"
+    MAX_REQUEST_TIMEOUT: float = 300.0
+    REQUEST_TIMEOUTS: Dict[str, float] = {
+        "read": 10.0,
+        "write": 10.0,
+        "list": 30.0,
+        "analytics": 60.0,
+        "access_logs": 30.0,
+        "access_analytics": 60.0,
+        "batch_read": 30.0,
+        "bulk_write": 120.0,
+    }
+    # SQLite VM instructions between deadline checks
+    DEADLINE_CHECK_INSTRUCTIONS: int = 1000
+    
+    # Upper bound for ids in one multi-get request
+    MULTI_GET_MAX_IDS: int = 5000
+    
+    # Bulk update/delete: rows per transaction, the size above which a job runs in
+    # background and the upper bound for explicitly listed ids
+    BULK_OPERATION_CHUNK_SIZE: int = 1000
+    BULK_OPERATION_SYNC_LIMIT: int = 5000
+    BULK_OPERATION_MAX_IDS: int = 5000
+    
+    # Organization teardown: rows deleted per transaction, pause between batches and
+    # how long a worker holds a job without progress before another worker may take it over
+    TEARDOWN_BATCH_SIZE: int = 1000
+    TEARDOWN_PAUSE_SECONDS: float = 0.05
+    TEARDOWN_LEASE_SECONDS: float = 60.0
+    # Authentication caches whether an organization is being deleted for this long;
+    # a teardown waits it out before its final sweep so no worker still admits writes
+    TEARDOWN_STATE_TTL: float = 5.0
+    
+    # Access log compaction: raw rows older than ACCESS_LOG_RETENTION_DAYS are archived
+    # (gzip NDJSON with sha256) and folded into hourly aggregates
+    ACCESS_LOG_RETENTION_DAYS: int = 30
+    ACCESS_LOG_ARCHIVE_DIR: str = "./archives/access_logs"
+    ACCESS_LOG_COMPACTION_BATCH_SIZE: int = 10000
+    
+    # System-wide admin analytics: work is split per organization into CHUNK_DAYS
+    # time ranges and aggregated by a process pool (0 workers computes in-process);
+    # each worker streams FETCH_SIZE rows at a time
+    ADMIN_ANALYTICS_WORKERS: int = 4
+    ADMIN_ANALYTICS_CHUNK_DAYS: int = 30
+    ADMIN_ANALYTICS_FETCH_SIZE: int = 10000
+    ADMIN_ANALYTICS_START_METHOD: str = "spawn"
+    
+    # Usage sketches of single writes are buffered in memory and merged into the
+    # daily rows once an organization has RECORDS pending or the oldest is SECONDS old;
+    # a background task checks the age, so quiet organizations are flushed too
+    USAGE_BUFFER_RECORDS: int = 500
+    USAGE_BUFFER_SECONDS: float = 5.0
+    
+    # In-process caches of authenticated users, organizations and analytics results.
+    # ORM changes invalidate entries at once; other writers are seen within the TTL.
+    # A TTL of 0 disables the cache. Principal caching is off by default: role changes
+    # and deletions made by other workers would keep authenticating for up to the TTL
+    PRINCIPAL_CACHE_TTL: float = 0.0
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    ORGANIZATION_CACHE_TTL: float = 300.0
+    ORGANIZATION_CACHE_SIZE: int = 1000
+    ANALYTICS_CACHE_TTL: float = 300.0
+    ANALYTICS_CACHE_SIZE: int = 1000
+    
+    # Startup warmup primes the caches for the users and organizations most active
+    # in the last WARMUP_ACTIVITY_DAYS; /ready answers 503 until it finishes or times out
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT: float = 30.0
+    WARMUP_ACTIVITY_DAYS: int = 7
+    WARMUP_PRINCIPALS: int = 1000
+    WARMUP_ORGANIZATIONS: int = 100
+    
+    # Change feed page size limit for incremental sync
+    CHANGE_FEED_MAX_PAGE_SIZE: int = 1000
+    
+    # Ingest deduplication: uploads with an Idempotency-Key header resolve to the
+    # reading first stored under that key, or get 422 if their payload differs from it;
+    # without the header an identical reading (user, type, value, timestamp, metadata)
+    # is treated as a retry when enabled
+    INGEST_CONTENT_DEDUPLICATION: bool = True
+    
+    # Page size limit for per-user timelines
+    TIMELINE_MAX_PAGE_SIZE: int = 1000
+    
+    # Share one computation between identical concurrent analytics requests
+    REQUEST_COALESCING: bool = True
+    
+    # Streaming statistics and ingest-time anomaly scoring
+    STATS_EWMA_ALPHA: float = 0.1
+    ANOMALY_MIN_SAMPLES: int = 10
+    ANOMALY_SCORE_THRESHOLD: float = 3.0
+    
+    # Live event feed
+    EVENT_SUBSCRIBER_BUFFER: int = 1000
+    EVENT_HEARTBEAT_SECONDS: float = 15.0
+    # Shared SQLite file used to fan events out across workers; None disables it
+    EVENT_BROKER_PATH: Optional[str] = None
+    EVENT_BROKER_POLL_INTERVAL: float = 0.2
+    # The in-process index of latest readings follows writes through these events, so
+    # it needs the broker to see other workers' writes; without one it is used only
+    # when this is set (a single worker), otherwise every lookup reads the database
+    LATEST_READINGS_SINGLE_WORKER: bool = False
+    
+    # Responses smaller than this are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    
+    # Request profiling: admins opt in per request with X-Profile: 1 or ?profile=1,
+    # PROFILE_SAMPLE_RATE additionally profiles that fraction of all requests
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_MAX_FILES: int = 200
+    
+    # Memory diagnostics: tracemalloc tracing (MEMORY_TRACE_FRAMES frames per allocation)
+    # starts with the app when MEMORY_TRACING is set or later on an admin request;
+    # snapshots for download and diffing are kept in MEMORY_SNAPSHOT_DIR
+    MEMORY_TRACING: bool = False
+    MEMORY_TRACE_FRAMES: int = 1
+    MEMORY_SNAPSHOT_DIR: str = "./memory_snapshots"
+    MEMORY_SNAPSHOT_MAX_FILES: int = 20
     
     # CORS settings
     CORS_ORIGINS: List[str] = ["*"]
@@ -1,19 +1,312 @@
-from sqlalchemy import create_engine
+import hashlib
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, event, inspect, make_url, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from ..config import settings
+from .types import codec, compression_scope, _organization
+
+def create_db_engine(url: str, **kwargs):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(url, connect_args=connect_args, **kwargs)
+
+T = TypeVar("T")
+
+SHARDING_MODES = ("off", "per_org", "hash")
+
+# Row ids of a shard start at shard << SHARD_ID_BITS, so ids are unique across shards
+SHARD_ID_BITS = 40
+
+class ShardNotSelected(RuntimeError):
+    """A sharded table was used by a session without an organization"""
+
+async def shard_not_selected_handler(request: Request, exc: ShardNotSelected) -> JSONResponse:
+    # Organization data lives in the organization's shard; users without one have none
+    return JSONResponse({"detail": "User must be associated with an organization"}, status_code=403)
+
+class ShardRouter:
+    """
+    Engines for organization-scoped tables (Table.info["sharded"]).
+    per_org gives every organization its own database, hash places it
+    on shard organization_id % shard_count. Tables are created on first use.
+    """
+
+    def __init__(self, mode: str, url_template: str, shard_count: int):
+        if mode not in SHARDING_MODES:
+            raise ValueError(f"Unknown sharding mode: {mode}")
+        self.mode = mode
+        self.url_template = url_template
+        self.shard_count = shard_count
+        self._engines: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def shard_for(self, organization_id: int) -> int:
+        return organization_id if self.mode == "per_org" else organization_id % self.shard_count
+
+    def shards(self, organization_ids: Iterable[int]) -> List[int]:
+        if self.mode == "hash":
+            return list(range(self.shard_count))
+        return sorted(set(organization_ids))
+
+    def engine(self, shard: int):
+        with self._lock:
+            shard_engine = self._engines.get(shard)
+            if shard_engine is None:
+                url = self.url_template.format(shard=shard)
+                database = make_url(url).database
+                if url.startswith("sqlite") and database and database != ":memory:":
+                    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+                shard_engine = create_db_engine(url)
+                create_schema(shard_engine, sharded_tables())
+                if url.startswith("sqlite"):
+                    _seed_id_range(shard_engine, shard)
+                self._engines[shard] = shard_engine
+            return shard_engine
+
+    def engine_for(self, organization_id: int):
+        return self.engine(self.shard_for(organization_id))
+
+    def shard_of_id(self, row_id: int) -> int:
+        return row_id >> SHARD_ID_BITS
+
+def _seed_id_range(bind, shard: int) -> None:
+    # AUTOINCREMENT tables continue from sqlite_sequence; tables that already
+    # have a sequence row (shards created earlier) keep their ids
+    with bind.begin() as connection:
+        for table in sharded_tables():
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            connection.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table.name, shard << SHARD_ID_BITS, table.name)
+            )
+
+def sharded_tables() -> list:
+    return [table for table in Base.metadata.sorted_tables if table.info.get("sharded")]
+
+def add_missing_columns(bind, tables: Optional[list] = None) -> List[str]:
+    """
+    create_all never alters existing tables: nullable columns added to the
+    models later are added with ALTER TABLE ... ADD COLUMN. Returns the
+    added columns as "table.column".
+    """
+    inspector = inspect(bind)
+    added = []
+    for table in tables if tables is not None else Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if column.primary_key or not column.nullable:
+                raise RuntimeError(f"Column {table.name}.{column.name} is NOT NULL and has to be migrated by hand")
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as connection:
+                connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+# Indexes superseded by a differently keyed index under a new name
+OBSOLETE_INDEXES = {"biometric_data": ("ix_biometric_data_timeline",)}
+
+def create_schema(bind, tables: Optional[list] = None) -> None:
+    Base.metadata.create_all(bind=bind, tables=tables)
+    add_missing_columns(bind, tables)
+    # create_all skips indexes of tables that already exist
+    for table in tables if tables is not None else Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+        with bind.begin() as connection:
+            for name in OBSOLETE_INDEXES.get(table.name, ()):
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+
+shard_router = ShardRouter(settings.SHARDING_MODE, settings.SHARD_URL_TEMPLATE, settings.SHARD_COUNT)
+
+def session_organization_id(session: Session) -> Optional[int]:
+    organization_id = session.info.get("organization_id")
+    if organization_id is None and "request_state" in session.info:
+        # Set by get_current_user after the session was opened
+        organization_id = getattr(session.info["request_state"], "organization_id", None)
+    return organization_id
+
+class ShardedSession(Session):
+    """
+    Session that sends statements on sharded tables to the shard of the
+    session's organization; everything else goes to the primary database.
+    A commit that writes to both databases commits them one after the
+    other, not atomically: code that writes to both (teardown, bulk jobs)
+    must tolerate one side being committed without the other.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        table = getattr(mapper, "local_table", None)
+        if table is not None and table.info.get("sharded"):
+            organization_id = session_organization_id(self)
+            if organization_id is None:
+                raise ShardNotSelected(f"Table {table.name} is sharded: set session.info['organization_id'] or use fan_out()")
+            return shard_router.engine_for(organization_id)
+        return super().get_bind(mapper, clause=clause, **kw)
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}
+engine = create_db_engine(settings.DATABASE_URL)
+SessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    class_=ShardedSession if shard_router.enabled else Session
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Replicas mirror the primary only, so sharded deployments read from the primary router
+read_engines = [] if shard_router.enabled else [create_db_engine(url) for url in settings.READ_DATABASE_URLS]
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+]
 
 Base = declarative_base()
 
-def get_db():
+# Tables whose writes don't make a client sticky to the primary (audit trail)
+NON_STICKY_TABLES = {"access_logs"}
+
+class ReplicaRouter:
+    """
+    Routes read-only sessions to replicas (round-robin) unless the client
+    wrote to the primary within the read-your-writes window.
+    """
+
+    def __init__(self, primary: sessionmaker, replicas: List[sessionmaker], sticky_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self._cycle = itertools.cycle(replicas) if replicas else None
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_write(self, key: Optional[str]) -> None:
+        if not key or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[key] = now
+            if len(self._last_write) > 10000:
+                cutoff = now - self.sticky_seconds
+                self._last_write = {k: t for k, t in self._last_write.items() if t >= cutoff}
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        if not key:
+            return False
+        with self._lock:
+            last_write = self._last_write.get(key)
+        return last_write is not None and time.monotonic() - last_write < self.sticky_seconds
+
+    def read_session_factory(self, key: Optional[str] = None) -> sessionmaker:
+        if not self.replicas or self.is_sticky(key):
+            return self.primary
+        with self._lock:
+            return next(self._cycle)
+
+replica_router = ReplicaRouter(SessionLocal, ReadSessionLocals, settings.READ_YOUR_WRITES_SECONDS)
+
+def sticky_key(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+@event.listens_for(Session, "after_flush")
+def _track_writes(session, flush_context):
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if getattr(obj, "__tablename__", None) not in NON_STICKY_TABLES:
+            session.info["wrote"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _mark_sticky(session):
+    if session.info.pop("wrote", False):
+        replica_router.mark_write(session.info.get("sticky_key"))
+
+@event.listens_for(Session, "after_rollback")
+def _reset_writes(session):
+    session.info.pop("wrote", None)
+
+@event.listens_for(Session, "before_flush")
+def _enter_compression_scope(session, flush_context, instances):
+    # CompactJSON picks the organization's dictionary while the flush binds values;
+    # the dictionary is read here with this session, not from inside the flush
+    organization_id = session_organization_id(session)
+    codec.preload(session, organization_id)
+    session.info["compression_token"] = _organization.set(organization_id)
+
+@event.listens_for(Session, "after_flush_postexec")
+def _exit_compression_scope(session, flush_context):
+    token = session.info.pop("compression_token", None)
+    if token is not None:
+        _organization.reset(token)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _reset_compression_scope(session, previous_transaction):
+    # A failed flush never reaches after_flush_postexec
+    _exit_compression_scope(session, None)
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_compression_scope(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update:
+        organization_id = session_organization_id(orm_execute_state.session)
+        codec.preload(orm_execute_state.session, organization_id)
+        with compression_scope(organization_id):
+            return orm_execute_state.invoke_statement()
+
+def fan_out(db: Session, query: Callable[[Session], T], organization_ids: Optional[Iterable[int]] = None) -> List[T]:
+    """
+    Runs query against every shard in parallel and returns the per-shard
+    results; without sharding it runs once in the given session.
+    Ids of biometric_data and access_logs are unique across SQLite shards
+    (see SHARD_ID_BITS); other sharded ids only within a shard.
+    """
+    if not shard_router.enabled:
+        return [query(db)]
+    if organization_ids is None:
+        organizations = Base.metadata.tables["organizations"]
+        organization_ids = db.scalars(select(organizations.c.id)).all()
+    shards = shard_router.shards(organization_ids)
+    if not shards:
+        return []
+
+    def run(shard: int) -> T:
+        # The request state carries the deadline to shard connections
+        session = Session(bind=shard_router.engine(shard), info={"request_state": db.info.get("request_state")})
+        try:
+            return query(session)
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=min(len(shards), settings.SHARD_FANOUT_WORKERS)) as pool:
+        return list(pool.map(run, shards))
+
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["sticky_key"] = sticky_key(request)
+    db.info["request_state"] = request.state
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    db = replica_router.read_session_factory(sticky_key(request))()
+    db.info["request_state"] = request.state
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -0,0 +1,240 @@
+"""
+Компактное хранение JSON-полей (CompactJSON): MessagePack + zstd,
+при наличии — со словарём, обученным по данным организации.
+Без msgpack/zstandard значения пишутся как JSON + zlib.
+Значения, записанные раньше текстом JSON, читаются без миграции.
+"""
+import json
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+# Первый байт значения — формат; текст JSON никогда не начинается с этих байтов
+FORMAT_MSGPACK = 1
+FORMAT_MSGPACK_ZSTD = 2
+FORMAT_MSGPACK_ZSTD_DICT = 3  # далее 4 байта id словаря
+FORMAT_JSON_ZLIB = 4
+COMPACT_FORMATS = (FORMAT_MSGPACK, FORMAT_MSGPACK_ZSTD, FORMAT_MSGPACK_ZSTD_DICT, FORMAT_JSON_ZLIB)
+
+# Меньшие значения сжатие только увеличивает
+MIN_COMPRESS_SIZE = 64
+
+_organization: ContextVar[Optional[int]] = ContextVar("compact_json_organization", default=None)
+
+@contextmanager
+def compression_scope(organization_id: Optional[int]):
+    """
+    Организация, чей словарь используется при записи значений в этом контексте
+    """
+    token = _organization.set(organization_id)
+    try:
+        yield
+    finally:
+        _organization.reset(token)
+
+def current_organization() -> Optional[int]:
+    return _organization.get()
+
+class MetadataCodec:
+    """
+    Кодек CompactJSON и реестр zstd-словарей (id словаря -> данные).
+    Словари организаций подгружаются из таблицы metadata_dictionaries
+    при первом обращении; новый словарь другого процесса используется
+    для записи после перезапуска, для чтения — сразу.
+    """
+
+    def __init__(self, level: int = 3):
+        self.level = level
+        self._dictionaries: Dict[int, Any] = {}
+        self._by_organization: Dict[int, Optional[int]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def compact(self) -> bool:
+        return msgpack is not None and zstandard is not None
+
+    def register(self, dictionary_id: int, data: bytes, organization_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(data)
+            if organization_id is not None:
+                self._by_organization[organization_id] = dictionary_id
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dictionaries.clear()
+            self._by_organization.clear()
+        self._local = threading.local()
+
+    def dictionary_for(self, organization_id: Optional[int]) -> Optional[int]:
+        if organization_id is None or not self.compact:
+            return None
+        with self._lock:
+            if organization_id in self._by_organization:
+                return self._by_organization[organization_id]
+        row = self._load(organization_id=organization_id)
+        with self._lock:
+            self._by_organization.setdefault(organization_id, row[0] if row else None)
+            return self._by_organization[organization_id]
+
+    def preload(self, session, organization_id: Optional[int]) -> None:
+        """
+        Словарь организации читается сессией вызывающего до записи значений,
+        чтобы encode внутри flush не открывал отдельную сессию
+        """
+        from ..models.models import MetadataDictionary
+
+        if organization_id is None or not self.compact:
+            return
+        with self._lock:
+            if organization_id in self._by_organization:
+                return
+        row = session.execute(
+            select(MetadataDictionary.id, MetadataDictionary.data)
+            .where(MetadataDictionary.organization_id == organization_id)
+            .order_by(MetadataDictionary.id.desc())
+            .limit(1)
+        ).first()
+        with self._lock:
+            if row is not None:
+                self._dictionaries.setdefault(row[0], zstandard.ZstdCompressionDict(row[1]))
+            self._by_organization.setdefault(organization_id, row[0] if row else None)
+
+    def _dictionary(self, dictionary_id: int):
+        with self._lock:
+            dictionary = self._dictionaries.get(dictionary_id)
+        if dictionary is None:
+            if self._load(dictionary_id=dictionary_id) is None:
+                raise ValueError(f"Unknown compression dictionary {dictionary_id}")
+            with self._lock:
+                dictionary = self._dictionaries[dictionary_id]
+        return dictionary
+
+    def _load(self, dictionary_id: Optional[int] = None, organization_id: Optional[int] = None):
+        from ..models.models import MetadataDictionary
+        from . import database
+
+        db = database.SessionLocal()
+        try:
+            query = db.query(MetadataDictionary.id, MetadataDictionary.organization_id, MetadataDictionary.data)
+            if dictionary_id is not None:
+                query = query.filter(MetadataDictionary.id == dictionary_id)
+            else:
+                query = query.filter(MetadataDictionary.organization_id == organization_id)
+            row = query.order_by(MetadataDictionary.id.desc()).first()
+        finally:
+            db.close()
+        if row is not None:
+            with self._lock:
+                self._dictionaries.setdefault(row[0], zstandard.ZstdCompressionDict(row[2]))
+        return row
+
+    def _thread_cache(self, name: str) -> dict:
+        # Объекты zstandard нельзя делить между потоками
+        cache = getattr(self._local, name, None)
+        if cache is None:
+            cache = {}
+            setattr(self._local, name, cache)
+        return cache
+
+    def _compressor(self, dictionary_id: Optional[int]):
+        cache = self._thread_cache("compressors")
+        compressor = cache.get(dictionary_id)
+        if compressor is None:
+            dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            cache[dictionary_id] = compressor
+        return compressor
+
+    def _decompressor(self, dictionary_id: Optional[int]):
+        cache = self._thread_cache("decompressors")
+        decompressor = cache.get(dictionary_id)
+        if decompressor is None:
+            dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+            decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            cache[dictionary_id] = decompressor
+        return decompressor
+
+    def encode(self, value: Any, organization_id: Optional[int] = None) -> bytes:
+        if not self.compact:
+            return bytes([FORMAT_JSON_ZLIB]) + zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        packed = msgpack.packb(value, use_bin_type=True)
+        if len(packed) < MIN_COMPRESS_SIZE:
+            return bytes([FORMAT_MSGPACK]) + packed
+        dictionary_id = self.dictionary_for(organization_id)
+        compressed = self._compressor(dictionary_id).compress(packed)
+        if dictionary_id is None:
+            return bytes([FORMAT_MSGPACK_ZSTD]) + compressed
+        return bytes([FORMAT_MSGPACK_ZSTD_DICT]) + struct.pack("<I", dictionary_id) + compressed
+
+    def decode(self, raw) -> Any:
+        if isinstance(raw, str):
+            return json.loads(raw)
+        raw = bytes(raw)
+        if not raw or raw[0] not in COMPACT_FORMATS:
+            return json.loads(raw)
+        kind = raw[0]
+        if kind == FORMAT_JSON_ZLIB:
+            return json.loads(zlib.decompress(raw[1:]))
+        if kind == FORMAT_MSGPACK:
+            packed = raw[1:]
+        elif kind == FORMAT_MSGPACK_ZSTD:
+            packed = self._decompressor(None).decompress(raw[1:])
+        else:
+            (dictionary_id,) = struct.unpack_from("<I", raw, 1)
+            packed = self._decompressor(dictionary_id).decompress(raw[5:])
+        return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+
+    def is_current(self, raw, organization_id: Optional[int] = None) -> bool:
+        """
+        Записано ли значение так, как его записал бы encode сейчас
+        """
+        if raw is None:
+            return True
+        if isinstance(raw, str) or not raw or raw[0] not in COMPACT_FORMATS:
+            return False
+        if not self.compact:
+            return raw[0] == FORMAT_JSON_ZLIB
+        if raw[0] == FORMAT_MSGPACK:
+            return True
+        dictionary_id = self.dictionary_for(organization_id)
+        if dictionary_id is None:
+            return raw[0] == FORMAT_MSGPACK_ZSTD
+        return raw[0] == FORMAT_MSGPACK_ZSTD_DICT and struct.unpack_from("<I", raw, 1)[0] == dictionary_id
+
+codec = MetadataCodec()
+
+class CompactJSON(TypeDecorator):
+    """
+    JSON-значение в компактном бинарном виде; приложение и схемы
+    работают с обычными dict/list
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return codec.encode(value, current_organization())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return codec.decode(value)
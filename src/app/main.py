@@ -1,15 +1,55 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .api import auth, biometric, organizations
-from .database.database import engine, Base
+from .api import admin, auth, biometric, organizations
+from .database.database import ShardNotSelected, engine, create_schema, shard_not_selected_handler
+from .utils.events import hub, SQLiteEventBroker
+from .utils.deadlines import DeadlineExceeded, DeadlineMiddleware, deadline_exceeded_handler
+from .utils.encoding import CompressionMiddleware
+from .utils.memory_diagnostics import MemoryMiddleware, route_memory, start_tracing
+from .utils.parallel_analytics import shutdown_analytics_pool
+from .utils.profiling import ProfilingMiddleware, profile_store
+from .utils.sketches import flush_usage_buffer, flush_usage_periodically
+from .utils.teardown import resume_teardowns
+from .utils.warmup import warmup
 
-Base.metadata.create_all(bind=engine)
+create_schema(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.MEMORY_TRACING:
+        start_tracing()
+    if settings.EVENT_BROKER_PATH:
+        hub.broker = SQLiteEventBroker(
+            settings.EVENT_BROKER_PATH,
+            hub,
+            poll_interval=settings.EVENT_BROKER_POLL_INTERVAL
+        )
+        hub.broker.start()
+    resume_teardowns()
+    # Caches are primed in the background; /ready reports when this is done
+    warmup_task = asyncio.create_task(warmup.run()) if settings.WARMUP_ENABLED else None
+    if warmup_task is None:
+        warmup.skip()
+    usage_flush_task = asyncio.create_task(flush_usage_periodically())
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    usage_flush_task.cancel()
+    if hub.broker is not None:
+        hub.broker.stop()
+        hub.broker = None
+    flush_usage_buffer()
+    shutdown_analytics_pool()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -19,10 +59,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware, store=profile_store, sample_rate=settings.PROFILE_SAMPLE_RATE)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(DeadlineMiddleware, header=settings.REQUEST_TIMEOUT_HEADER)
+# Outermost, so response buffers of compression are counted too
+app.add_middleware(MemoryMiddleware, stats=route_memory)
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+app.add_exception_handler(ShardNotSelected, shard_not_selected_handler)
 
 app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["auth"])
 app.include_router(biometric.router, prefix=f"{settings.API_V1_STR}/biometric", tags=["biometric"])
 app.include_router(organizations.router, prefix=settings.API_V1_STR, tags=["organizations"])
+app.include_router(admin.router, prefix=settings.API_V1_STR, tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -30,4 +78,9 @@ async def root():
         "message": "Welcome to the Biometric Data Management API",
         "version": settings.VERSION,
         "docs_url": f"{settings.API_V1_STR}/docs"
-    } 
\ No newline at end of file
+    } 
+
+@app.get("/ready")
+async def ready():
+    state = warmup.snapshot()
+    return JSONResponse(state, status_code=status.HTTP_200_OK if state["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE)
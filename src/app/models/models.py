@@ -1,10 +1,11 @@
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLEnum, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Enum as SQLEnum, JSON, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from ..database.database import Base
+from ..database.types import CompactJSON
 
 class UserRole(str, Enum):
     USER = "user"
@@ -18,6 +19,10 @@ class BiometricDataType(str, Enum):
     IRIS = "iris"
     PALM = "palm"
 
+class MetadataValueType(str, Enum):
+    STRING = "string"
+    NUMBER = "number"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -55,13 +60,49 @@ class BiometricData(Base):
     data_type = Column(SQLEnum(BiometricDataType))
     value = Column(Float)
     timestamp = Column(DateTime)
-    data_metadata = Column(JSON)
+    data_metadata = Column(CompactJSON)
+    # z-score against the user's running statistics at ingest time
+    anomaly_score = Column(Float, nullable=True)
+    # Client idempotency key or content hash; retried uploads resolve to the original row
+    ingest_key = Column(String, nullable=True)
+    # Content hash of the upload stored under a client key; a reused key must carry the same payload
+    ingest_hash = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="biometric_data")
     organization = relationship("Organization", back_populates="biometric_data")
 
+    # Organization-scoped tables are marked sharded and live in the organization's shard
+    __table_args__ = (
+        Index("ix_biometric_data_org_anomaly", "organization_id", "anomaly_score"),
+        # Covers the user timeline: rows are read in (timestamp, id) order without touching the table
+        # or sorting; id precedes value so that it breaks timestamp ties in the index order
+        Index("ix_biometric_data_timeline_position", "organization_id", "user_id", "data_type", "timestamp", "id", "value"),
+        Index("uq_biometric_data_ingest_key", "organization_id", "ingest_key", unique=True),
+        # AUTOINCREMENT lets every shard start its ids at its own offset
+        {"sqlite_autoincrement": True, "info": {"sharded": True}},
+    )
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    # Bulk import progress; written in the transaction that inserts the rows it counts
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"))
+    name = Column(String)
+    source = Column(String)
+    rows_read = Column(Integer, default=0)
+    rows_imported = Column(Integer, default=0)
+    rows_rejected = Column(Integer, default=0)
+    rows_duplicate = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("organization_id", "name", name="uq_import_checkpoints_org_name"),
+        {"info": {"sharded": True}},
+    )
+
 class AccessLog(Base):
     __tablename__ = "access_logs"
 
@@ -73,4 +114,164 @@ class AccessLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="access_logs")
-    organization = relationship("Organization", back_populates="access_logs") 
\ No newline at end of file
+    organization = relationship("Organization", back_populates="access_logs")
+
+    __table_args__ = {"sqlite_autoincrement": True, "info": {"sharded": True}}
+
+class AccessLogHourly(Base):
+    __tablename__ = "access_log_hourly"
+
+    # Compacted access_logs: number of rows per organization, action and hour
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True)
+    action = Column(String)
+    hour = Column(DateTime)
+    count = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_access_log_hourly_org_hour", "organization_id", "hour", "action"),
+        {"info": {"sharded": True}},
+    )
+
+class AccessLogArchive(Base):
+    __tablename__ = "access_log_archives"
+
+    # Archive files of compacted raw rows; kept after organization teardown
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, nullable=True, index=True)
+    path = Column(String)
+    sha256 = Column(String(64))
+    row_count = Column(Integer)
+    first_id = Column(Integer)
+    last_id = Column(Integer)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = {"info": {"sharded": True}}
+
+class BiometricStats(Base):
+    __tablename__ = "biometric_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    organization_id = Column(Integer, ForeignKey("organizations.id"), index=True)
+    data_type = Column(SQLEnum(BiometricDataType))
+    count = Column(Integer, default=0)
+    mean = Column(Float, default=0.0)
+    # Sum of squared deviations (Welford), variance = m2 / (count - 1)
+    m2 = Column(Float, default=0.0)
+    min = Column(Float, nullable=True)
+    max = Column(Float, nullable=True)
+    ewma = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "data_type", name="uq_biometric_stats_user_type"),
+        {"info": {"sharded": True}},
+    )
+
+class UsageSketch(Base):
+    __tablename__ = "usage_sketches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), index=True)
+    data_type = Column(SQLEnum(BiometricDataType))
+    day = Column(Date)
+    record_count = Column(Integer, default=0)
+    # Serialized HyperLogLog of user ids and KLL sketch of values
+    users_hll = Column(LargeBinary)
+    values_kll = Column(LargeBinary)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("organization_id", "data_type", "day", name="uq_usage_sketches_org_type_day"),
+        {"info": {"sharded": True}},
+    )
+
+class MetadataKey(Base):
+    __tablename__ = "metadata_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), index=True)
+    # Dotted path into data_metadata, e.g. "device.id"
+    key = Column(String)
+    value_type = Column(SQLEnum(MetadataValueType))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("organization_id", "key", name="uq_metadata_keys_org_key"),
+    )
+
+class BiometricMetadataValue(Base):
+    __tablename__ = "biometric_metadata_values"
+
+    id = Column(Integer, primary_key=True, index=True)
+    data_id = Column(Integer, ForeignKey("biometric_data.id"), index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"))
+    key = Column(String)
+    value_text = Column(String, nullable=True)
+    value_number = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # data_id is included so filter subqueries are answered from the index alone
+        Index("ix_metadata_values_org_key_text", "organization_id", "key", "value_text", "data_id"),
+        Index("ix_metadata_values_org_key_number", "organization_id", "key", "value_number", "data_id"),
+        {"info": {"sharded": True}},
+    )
+
+class BiometricChange(Base):
+    __tablename__ = "biometric_changes"
+
+    # Monotonic sync cursor; AUTOINCREMENT keeps seq of replaced entries from being reused
+    seq = Column(Integer, primary_key=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"))
+    data_id = Column(Integer, index=True)
+    # "upsert" or "delete" (tombstone); only the latest change per record is kept
+    change_type = Column(String)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_biometric_changes_org_seq", "organization_id", "seq"),
+        {"sqlite_autoincrement": True, "info": {"sharded": True}},
+    )
+
+class MetadataDictionary(Base):
+    __tablename__ = "metadata_dictionaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), index=True)
+    # Trained zstd dictionary used by CompactJSON for this organization's rows
+    data = Column(LargeBinary)
+    sample_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OrganizationTeardown(Base):
+    __tablename__ = "organization_teardowns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: the row outlives the organization it tears down
+    organization_id = Column(Integer, index=True)
+    status = Column(String, default="pending")
+    phase = Column(String, nullable=True)
+    deleted_counts = Column(JSON, default=dict)
+    error = Column(String, nullable=True)
+    # Worker running the job; another worker may take it over once the lease expires
+    owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BulkJob(Base):
+    __tablename__ = "bulk_jobs"
+
+    # Kept in the primary database so every worker sees the same job state
+    id = Column(String(32), primary_key=True)
+    operation = Column(String)
+    organization_id = Column(Integer, index=True)
+    status = Column(String, default="pending")
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from ..models.models import UserRole, BiometricDataType
+from ..models.models import UserRole, BiometricDataType, MetadataValueType
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -35,6 +35,19 @@ class OrganizationResponse(OrganizationBase):
     class Config:
         from_attributes = True
 
+class OrganizationTeardownResponse(BaseModel):
+    id: int
+    organization_id: int
+    status: str
+    phase: Optional[str] = None
+    deleted_counts: Dict[str, int] = {}
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class BiometricDataBase(BaseModel):
     data_type: BiometricDataType
     value: float
@@ -53,11 +66,62 @@ class BiometricDataResponse(BiometricDataBase):
     id: int
     user_id: int
     organization_id: int
+    anomaly_score: Optional[float] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class LatestReadingResponse(BaseModel):
+    data_id: int
+    user_id: int
+    data_type: BiometricDataType
+    value: float
+    timestamp: datetime
+
+class BiometricTimelineEntry(BaseModel):
+    id: int
+    timestamp: datetime
+    value: float
+    data_metadata: Optional[Dict[str, Any]] = None
+
+class BiometricTimelineResponse(BaseModel):
+    user_id: int
+    data_type: BiometricDataType
+    items: List[BiometricTimelineEntry]
+    next_cursor: Optional[str] = None
+    has_more: bool
+
+class BiometricDataBatchGet(BaseModel):
+    ids: List[int]
+
+class BiometricDataBatchResponse(BaseModel):
+    found: List[BiometricDataResponse]
+    missing: List[int]
+
+class BiometricDataFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    user_id: Optional[int] = None
+    data_type: Optional[BiometricDataType] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+class BiometricDataBulkUpdate(BiometricDataFilter):
+    changes: BiometricDataUpdate
+
+class BiometricDataBulkDelete(BiometricDataFilter):
+    pass
+
+class BulkJobResponse(BaseModel):
+    job_id: str
+    operation: str
+    status: str
+    total: int
+    processed: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
 class AccessLogBase(BaseModel):
     action: str
     details: Dict[str, Any]
@@ -80,4 +144,29 @@ class AnalyticsResponse(BaseModel):
     average: float
     min: float
     max: float
-    metadata: Dict[str, Any] 
\ No newline at end of file
+    metadata: Dict[str, Any] 
+
+class MetadataKeyCreate(BaseModel):
+    key: str
+    value_type: MetadataValueType = MetadataValueType.STRING
+
+class MetadataKeyResponse(MetadataKeyCreate):
+    id: int
+    created_at: datetime
+    indexed_values: Optional[int] = None
+    # Backfill of existing records; poll /bulk-jobs/{job_id} when it runs in background
+    job_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class BiometricDataChange(BaseModel):
+    seq: int
+    type: str
+    data_id: int
+    data: Optional[BiometricDataResponse] = None
+
+class BiometricDataChangesResponse(BaseModel):
+    changes: List[BiometricDataChange]
+    next_cursor: int
+    has_more: bool
@@ -0,0 +1,189 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models.models import AccessLog, AccessLogArchive, AccessLogHourly
+
+# (organization_id, action, hour) -> число обращений
+HourlyKey = Tuple[Optional[int], str, datetime]
+
+@dataclass
+class AccessLogCompactionStats:
+    rows_archived: int = 0
+    archives_written: int = 0
+    hours_updated: int = 0
+
+def truncate_to_hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def fold_hourly(rows: Iterable[Tuple[Optional[int], str, Optional[datetime]]]) -> Dict[HourlyKey, int]:
+    counts: Dict[HourlyKey, int] = {}
+    for organization_id, action, timestamp in rows:
+        if timestamp is None:
+            continue
+        key = (organization_id, action, truncate_to_hour(timestamp))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def _organization_filter(column, organization_id: Optional[int]):
+    return column.is_(None) if organization_id is None else column == organization_id
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_archive(directory: str, organization_id: Optional[int], rows: List[AccessLog]) -> Tuple[str, str]:
+    """
+    Сырые строки в gzip NDJSON и файл .sha256 рядом (формат sha256sum).
+    Имя уникально (время записи и случайный суффикс): id строк могут
+    повторяться после удаления и в разных шардах. Существующий архив
+    не перезаписывается; файл без строки в access_log_archives остаётся
+    от прерванной транзакции и может быть удалён.
+    """
+    os.makedirs(directory, exist_ok=True)
+    scope = "none" if organization_id is None else str(organization_id)
+    written = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"access_logs_org{scope}_{rows[0].id}-{rows[-1].id}_{written}_{uuid.uuid4().hex[:8]}.ndjson.gz"
+    path = os.path.join(directory, name)
+    temporary = path + ".tmp"
+    with gzip.open(temporary, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({
+                "id": row.id,
+                "organization_id": row.organization_id,
+                "user_id": row.user_id,
+                "action": row.action,
+                "details": row.details,
+                "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+            }, separators=(",", ":")) + "\n")
+    with open(temporary, "rb") as f:
+        os.fsync(f.fileno())
+    # link, в отличие от replace, не заменяет существующий файл
+    try:
+        os.link(temporary, path)
+    finally:
+        os.remove(temporary)
+    checksum = _sha256(path)
+    with open(path + ".sha256", "w", encoding="utf-8") as f:
+        f.write(f"{checksum}  {name}\n")
+    return path, checksum
+
+def verify_archive(archive: AccessLogArchive) -> bool:
+    return os.path.exists(archive.path) and _sha256(archive.path) == archive.sha256
+
+def add_hourly_counts(db: Session, organization_id: Optional[int], counts: Dict[HourlyKey, int]) -> int:
+    """
+    Прибавление счётчиков организации к агрегатам; недостающие часы вставляются
+    """
+    if not counts:
+        return 0
+    hours = [hour for _, _, hour in counts]
+    existing = {
+        (row.organization_id, row.action, row.hour): row.id
+        for row in db.execute(
+            select(AccessLogHourly.id, AccessLogHourly.organization_id, AccessLogHourly.action, AccessLogHourly.hour)
+            .where(
+                _organization_filter(AccessLogHourly.organization_id, organization_id),
+                AccessLogHourly.hour.between(min(hours), max(hours))
+            )
+        )
+    }
+    for key, count in counts.items():
+        if key in existing:
+            db.execute(
+                update(AccessLogHourly)
+                .where(AccessLogHourly.id == existing[key])
+                .values(count=AccessLogHourly.count + count)
+            )
+    new_rows = [
+        {"organization_id": key[0], "action": key[1], "hour": key[2], "count": count}
+        for key, count in counts.items()
+        if key not in existing
+    ]
+    if new_rows:
+        db.execute(insert(AccessLogHourly), new_rows)
+    return len(counts)
+
+def compact_access_logs(
+    db: Session,
+    organization_id: Optional[int],
+    cutoff: datetime,
+    archive_dir: str,
+    batch_size: int = 10000,
+    progress: Optional[Callable[[AccessLogCompactionStats], None]] = None
+) -> AccessLogCompactionStats:
+    """
+    Свёртка строк access_logs старше cutoff в почасовые агрегаты.
+    Каждый батч сначала записывается в архив, затем в одной транзакции
+    обновляются агрегаты, регистрируется архив и удаляются сырые строки.
+    """
+    stats = AccessLogCompactionStats()
+    if organization_id is not None:
+        db.info["organization_id"] = organization_id
+    while True:
+        rows = db.scalars(
+            select(AccessLog)
+            .where(_organization_filter(AccessLog.organization_id, organization_id), AccessLog.timestamp < cutoff)
+            .order_by(AccessLog.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return stats
+
+        path, checksum = write_archive(archive_dir, organization_id, rows)
+        stats.hours_updated += add_hourly_counts(
+            db, organization_id, fold_hourly((row.organization_id, row.action, row.timestamp) for row in rows)
+        )
+        timestamps = [row.timestamp for row in rows]
+        db.add(AccessLogArchive(
+            organization_id=organization_id,
+            path=path,
+            sha256=checksum,
+            row_count=len(rows),
+            first_id=rows[0].id,
+            last_id=rows[-1].id,
+            start_time=min(timestamps),
+            end_time=max(timestamps)
+        ))
+        db.execute(
+            delete(AccessLog).where(AccessLog.id.in_([row.id for row in rows])),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        stats.rows_archived += len(rows)
+        stats.archives_written += 1
+        if progress:
+            progress(stats)
+
+def access_counts(db: Session) -> Dict[HourlyKey, int]:
+    """
+    Почасовые счётчики обращений: агрегаты плюс ещё не свёрнутые строки,
+    сгруппированные по часам в самой базе
+    """
+    counts: Dict[HourlyKey, int] = {}
+    for organization_id, action, hour, count in db.execute(
+        select(AccessLogHourly.organization_id, AccessLogHourly.action, AccessLogHourly.hour, AccessLogHourly.count)
+    ):
+        key = (organization_id, action, hour)
+        counts[key] = counts.get(key, 0) + count
+    hour = func.strftime("%Y-%m-%d %H:00:00", AccessLog.timestamp)
+    for organization_id, action, hour_text, count in db.execute(
+        select(AccessLog.organization_id, AccessLog.action, hour, func.count())
+        .where(AccessLog.timestamp.is_not(None))
+        .group_by(AccessLog.organization_id, AccessLog.action, hour)
+    ):
+        key = (organization_id, action, datetime.fromisoformat(hour_text))
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
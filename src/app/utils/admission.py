@@ -0,0 +1,191 @@
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..models.models import User
+from .auth import get_current_user
+from .deadlines import request_deadline
+
+class MemoryLimiterStore:
+    """
+    Состояние лимитеров в памяти процесса
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._slots: Dict[str, Dict[str, float]] = {}
+
+    def take_tokens(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+        return (cost - tokens) / rate if rate > 0 else float("inf")
+
+    def acquire_slot(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            leases = self._slots.setdefault(key, {})
+            for lease_id in [k for k, expires in leases.items() if expires < now]:
+                del leases[lease_id]
+            if len(leases) >= limit:
+                return None
+            lease_id = uuid.uuid4().hex
+            leases[lease_id] = now + lease_seconds
+            return lease_id
+
+    def release_slot(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            self._slots.get(key, {}).pop(lease_id, None)
+
+class FileLimiterStore:
+    """
+    Состояние лимитеров в общем SQLite-файле, разделяемое воркерами.
+    Слоты конкурентности выдаются как аренды с истечением, поэтому
+    упавший воркер не удерживает их навсегда.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS slots (lease_id TEXT PRIMARY KEY, key TEXT, expires REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slots_key ON slots (key)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def take_tokens(self, key: str, cost: float, rate: float, burst: float) -> float:
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if allowed:
+            return 0.0
+        return (cost - tokens) / rate if rate > 0 else float("inf")
+
+    def acquire_slot(self, key: str, limit: int, lease_seconds: float) -> Optional[str]:
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.execute("DELETE FROM slots WHERE key = ? AND expires < ?", (key, now))
+            (in_use,) = conn.execute("SELECT COUNT(*) FROM slots WHERE key = ?", (key,)).fetchone()
+            lease_id = None
+            if in_use < limit:
+                lease_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO slots (lease_id, key, expires) VALUES (?, ?, ?)",
+                    (lease_id, key, now + lease_seconds)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return lease_id
+
+    def release_slot(self, key: str, lease_id: str) -> None:
+        self._connect().execute("DELETE FROM slots WHERE lease_id = ?", (lease_id,))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_limiter_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.ADMISSION_STATE_PATH:
+                _store = FileLimiterStore(settings.ADMISSION_STATE_PATH)
+            else:
+                _store = MemoryLimiterStore()
+        return _store
+
+def reset_limiter_store() -> None:
+    global _store
+    with _store_lock:
+        _store = None
+
+def admission_control(cost_key: str):
+    """
+    Зависимость FastAPI: ограничение конкурентности и token bucket
+    по организации текущего пользователя с весом эндпоинта cost_key;
+    также ограничивает дедлайн запроса таймаутом эндпоинта. Обращения
+    к хранилищу идут в пуле потоков: файловое ждёт блокировку до 5 с
+    """
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        deadline = request_deadline(request)
+        if deadline is not None:
+            deadline.limit(settings.REQUEST_TIMEOUTS.get(cost_key))
+        if not settings.ADMISSION_CONTROL_ENABLED or current_user.organization_id is None:
+            yield
+            return
+
+        store = get_limiter_store()
+        key = f"org:{current_user.organization_id}"
+        lease_id = await run_in_threadpool(
+            store.acquire_slot, key, settings.ORG_MAX_CONCURRENT_REQUESTS, settings.ADMISSION_LEASE_SECONDS
+        )
+        if lease_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent requests for organization",
+                headers={"Retry-After": "1"}
+            )
+        try:
+            retry_after = await run_in_threadpool(
+                store.take_tokens,
+                key,
+                settings.ADMISSION_COST_WEIGHTS.get(cost_key, 1.0),
+                settings.ORG_RATE_LIMIT_PER_SECOND,
+                settings.ORG_RATE_LIMIT_BURST
+            )
+            if retry_after > 0:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Rate limit exceeded for organization",
+                    headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))}
+                )
+            yield
+        finally:
+            await run_in_threadpool(store.release_slot, key, lease_id)
+
+    return dependency
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
+from .sketches import merge_usage
+
 def analyze_biometric_data(data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Анализ биометрических данных
@@ -33,13 +35,31 @@ def analyze_access_patterns(logs: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Анализ паттернов доступа к данным
     """
-    df = pd.DataFrame(logs)
+    from .access_log_compaction import fold_hourly
+
+    return analyze_access_counts(fold_hourly(
+        (log["organization_id"], log["action"], log["timestamp"]) for log in logs
+    ))
+
+def analyze_access_counts(counts: Dict[Tuple[Optional[int], str, datetime], int]) -> Dict[str, Any]:
+    """
+    Анализ паттернов доступа по почасовым счётчикам
+    (organization_id, action, hour) -> число обращений
+    """
+    by_organization: Dict[int, int] = {}
+    by_action: Dict[str, int] = {}
+    timeline: Dict[datetime, int] = {}
+    for (organization_id, action, hour), count in counts.items():
+        if organization_id is not None:
+            by_organization[organization_id] = by_organization.get(organization_id, 0) + count
+        by_action[action] = by_action.get(action, 0) + count
+        timeline[hour] = timeline.get(hour, 0) + count
     
     analysis = {
-        "total_accesses": len(logs),
-        "access_by_organization": df.groupby("organization_id")["id"].count().to_dict(),
-        "access_by_action": df["action"].value_counts().to_dict(),
-        "access_timeline": df.groupby(pd.Grouper(key="timestamp", freq="H")).size().to_dict()
+        "total_accesses": sum(counts.values()),
+        "access_by_organization": dict(sorted(by_organization.items())),
+        "access_by_action": dict(sorted(by_action.items(), key=lambda item: -item[1])),
+        "access_timeline": dict(sorted(timeline.items()))
     }
     
     return analysis
@@ -63,4 +83,31 @@ def generate_usage_report(data: List[Dict[str, Any]], period_days: int = 30) ->
         "daily_activity": period_data.groupby(pd.Grouper(key="created_at", freq="D")).size().to_dict()
     }
     
-    return report 
\ No newline at end of file
+    return report 
+
+def generate_sketch_usage_report(rows: List[Any], period_days: int = 30) -> Dict[str, Any]:
+    """
+    Отчет об использовании по дневным скетчам (UsageSketch):
+    строки за период объединяются без обращения к исходным записям.
+    active_users — оценка HyperLogLog с относительной ошибкой active_users_error.
+    Скетчи только пополняются: удалённые и изменённые записи учитываются
+    с исходными значениями, о чём сообщает includes_deleted.
+    """
+    users, values = merge_usage(rows)
+    distribution: Dict[str, int] = {}
+    daily: Dict[str, int] = {}
+    for row in rows:
+        data_type = getattr(row.data_type, "value", row.data_type)
+        distribution[data_type] = distribution.get(data_type, 0) + row.record_count
+        day = row.day.isoformat()
+        daily[day] = daily.get(day, 0) + row.record_count
+
+    return {
+        "period": f"Last {period_days} days",
+        "total_records": sum(distribution.values()),
+        "active_users": round(users.estimate()) if rows else 0,
+        "active_users_error": users.relative_error,
+        "data_distribution": distribution,
+        "daily_activity": dict(sorted(daily.items())),
+        "includes_deleted": True
+    }
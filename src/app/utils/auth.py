@@ -1,24 +1,138 @@
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..models.models import User, UserRole
 from ..database.database import get_db
+from .caches import cached_principal
+from .teardown import organization_departing
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_SCHEMES = ("bcrypt", "argon2")
+
+def build_password_context(
+    scheme: str = "bcrypt",
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 4
+) -> CryptContext:
+    """
+    Контекст хеширования для политики: новые хеши создаются выбранной схемой,
+    хеши другой схемы или с другими параметрами считаются устаревшими
+    """
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+    if scheme == "argon2":
+        from passlib.hash import argon2
+        if not argon2.has_backend():
+            raise RuntimeError("argon2 password hashing requires the argon2-cffi package")
+    return CryptContext(
+        schemes=[scheme] + [other for other in PASSWORD_SCHEMES if other != scheme],
+        deprecated="auto",
+        # min == max: хеш с любой другой стоимостью пересчитывается при входе
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism
+    )
+
+def set_password_policy(scheme: str = "bcrypt", **params) -> CryptContext:
+    """
+    Замена действующей политики хеширования паролей
+    """
+    global pwd_context
+    pwd_context = build_password_context(scheme, **params)
+    return pwd_context
+
+pwd_context = build_password_context(
+    settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds=settings.BCRYPT_ROUNDS,
+    argon2_time_cost=settings.ARGON2_TIME_COST,
+    argon2_memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2_parallelism=settings.ARGON2_PARALLELISM
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверка пароля; если хеш не соответствует текущей политике,
+    возвращается новый хеш для сохранения
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def _hash_seconds(context: CryptContext, samples: int = 3) -> float:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def calibrate_password_policy(
+    scheme: str = "bcrypt",
+    target_seconds: float = 0.25,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 4,
+    max_cost: int = 20
+) -> Dict[str, Any]:
+    """
+    Подбор максимальной стоимости хеширования, укладывающейся в target_seconds
+    на текущей машине (bcrypt — rounds, argon2 — time_cost при заданной памяти)
+    """
+    if scheme == "bcrypt":
+        def context_for(cost: int) -> CryptContext:
+            return build_password_context("bcrypt", bcrypt_rounds=cost)
+        cost = 4
+    else:
+        def context_for(cost: int) -> CryptContext:
+            return build_password_context(
+                "argon2", argon2_time_cost=cost,
+                argon2_memory_cost=argon2_memory_cost, argon2_parallelism=argon2_parallelism
+            )
+        cost = 1
+
+    seconds = _hash_seconds(context_for(cost))
+    measurements = {cost: seconds}
+    while cost < max_cost:
+        # bcrypt удваивает время на каждый раунд, argon2 растёт линейно по time_cost;
+        # заведомо слишком дорогие параметры не измеряются
+        projected = seconds * 2 if scheme == "bcrypt" else seconds * (cost + 1) / cost
+        if projected > target_seconds:
+            break
+        measured = _hash_seconds(context_for(cost + 1))
+        measurements[cost + 1] = measured
+        if measured > target_seconds:
+            break
+        cost, seconds = cost + 1, measured
+
+    params: Dict[str, Any] = {"PASSWORD_HASH_SCHEME": scheme}
+    if scheme == "bcrypt":
+        params["BCRYPT_ROUNDS"] = cost
+    else:
+        params.update(
+            ARGON2_TIME_COST=cost,
+            ARGON2_MEMORY_COST=argon2_memory_cost,
+            ARGON2_PARALLELISM=argon2_parallelism
+        )
+    return {"settings": params, "hash_seconds": seconds, "measurements": measurements}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -45,6 +159,7 @@ def check_permissions(user_role: UserRole, required_role: UserRole) -> bool:
     return role_hierarchy[user_role] >= role_hierarchy[required_role]
 
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
@@ -63,8 +178,17 @@ async def get_current_user(
     if email is None or role is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    user = cached_principal(db, email)
     if user is None or user.role != role:
         raise credentials_exception
     
+    # Rows written after a teardown phase has finished would be left behind
+    if user.organization_id and organization_departing(db, user.organization_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Organization is being deleted"
+        )
+    
+    # Routes the request's sessions to the organization's shard
+    request.state.organization_id = user.organization_id
     return user 
\ No newline at end of file
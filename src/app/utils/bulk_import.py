@@ -0,0 +1,326 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.models import BiometricData, ImportCheckpoint, User
+from ..schemas.schemas import BiometricDataCreate
+from .change_feed import CHANGE_UPSERT, record_changes
+from .ingest_dedup import content_key, existing_keys
+from .metadata_index import declared_keys, reindex
+from .sketches import record_usage
+from .streaming_stats import apply_observations
+
+SUPPORTED_FORMATS = ("csv", "ndjson", "parquet")
+MAX_ERROR_SAMPLES = 20
+
+_batch_adapter = TypeAdapter(List[BiometricDataCreate])
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    # Строки, уже сохранённые раньше (повторная загрузка) или повторённые в файле
+    rows_duplicate: int = 0
+    resumed_rows: int = 0
+    elapsed: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        # Скорость считаем только по строкам, вставленным в этом запуске
+        imported = self.rows_imported - self.resumed_rows
+        return imported / self.elapsed if self.elapsed else 0.0
+
+def detect_format(path: str) -> str:
+    """
+    Определение формата файла по расширению
+    """
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "ndjson"
+    if ext in ("csv", "parquet"):
+        return ext
+    raise ValueError(f"Cannot detect import format for {path!r}, pass it explicitly")
+
+def iter_rows(path: str, fmt: str, chunk_size: int = 10000) -> Iterator[Dict[str, Any]]:
+    """
+    Потоковое чтение строк из CSV/NDJSON/Parquet без загрузки файла целиком
+    """
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "ndjson":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Parquet import requires the pyarrow package") from exc
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported import format {fmt!r}")
+
+def load_checkpoint(db: Session, organization_id: int, name: Optional[str], source: str) -> Dict[str, int]:
+    checkpoint = _checkpoint_row(db, organization_id, name) if name else None
+    if checkpoint is None:
+        return {"rows_read": 0, "rows_imported": 0, "rows_rejected": 0, "rows_duplicate": 0}
+    if checkpoint.source != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {name!r} belongs to another source file")
+    return {
+        "rows_read": checkpoint.rows_read,
+        "rows_imported": checkpoint.rows_imported,
+        "rows_rejected": checkpoint.rows_rejected,
+        "rows_duplicate": checkpoint.rows_duplicate,
+    }
+
+def save_checkpoint(db: Session, organization_id: int, name: Optional[str], source: str, stats: ImportStats) -> None:
+    """
+    Запись контрольной точки в текущую транзакцию: она фиксируется
+    вместе со вставленными строками, поэтому после сбоя пакет не повторяется
+    """
+    if not name:
+        return
+    checkpoint = _checkpoint_row(db, organization_id, name)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(organization_id=organization_id, name=name)
+        db.add(checkpoint)
+    checkpoint.source = os.path.abspath(source)
+    checkpoint.rows_read = stats.rows_read
+    checkpoint.rows_imported = stats.rows_imported
+    checkpoint.rows_rejected = stats.rows_rejected
+    checkpoint.rows_duplicate = stats.rows_duplicate
+
+def _checkpoint_row(db: Session, organization_id: int, name: str) -> Optional[ImportCheckpoint]:
+    return db.scalars(
+        select(ImportCheckpoint).where(ImportCheckpoint.organization_id == organization_id, ImportCheckpoint.name == name)
+    ).first()
+
+def organization_members(db: Session, organization_id: int, user_ids: Set[int]) -> Set[int]:
+    """
+    Пользователи из user_ids, состоящие в организации — один запрос на пакет
+    """
+    if not user_ids:
+        return set()
+    return set(db.scalars(
+        select(User.id).where(User.organization_id == organization_id, User.id.in_(user_ids))
+    ).all())
+
+def _prepare(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(row)
+    metadata = row.get("data_metadata")
+    if isinstance(metadata, str):
+        row["data_metadata"] = json.loads(metadata) if metadata.strip() else {}
+    elif metadata is None:
+        row["data_metadata"] = {}
+    return row
+
+def validate_batch(
+    rows: List[Dict[str, Any]],
+    organization_id: int,
+    default_user_id: Optional[int] = None,
+    db: Optional[Session] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Пакетная валидация строк по схеме BiometricDataCreate.
+    С сессией строки пользователей других организаций отклоняются.
+    Возвращает строки для вставки и описания отклонённых строк.
+    """
+    errors: Dict[int, Any] = {}
+    prepared: List[Optional[Dict[str, Any]]] = []
+    for i, row in enumerate(rows):
+        try:
+            row = _prepare(row)
+            user_id = row.get("user_id") or default_user_id
+            if user_id in (None, ""):
+                raise ValueError("user_id is required")
+            row["user_id"] = int(user_id)
+            prepared.append(row)
+        except (ValueError, TypeError) as exc:
+            errors[i] = str(exc)
+            prepared.append(None)
+
+    if db is not None:
+        members = organization_members(db, organization_id, {row["user_id"] for row in prepared if row is not None})
+        for i, row in enumerate(prepared):
+            if row is not None and row["user_id"] not in members:
+                errors[i] = f"user {row['user_id']} does not belong to organization {organization_id}"
+                prepared[i] = None
+
+    candidates = [i for i, row in enumerate(prepared) if row is not None]
+    validated: List[BiometricDataCreate] = []
+    while candidates:
+        try:
+            validated = _batch_adapter.validate_python([prepared[i] for i in candidates])
+            break
+        except ValidationError as exc:
+            bad = set()
+            for error in exc.errors():
+                position = candidates[error["loc"][0]]
+                bad.add(position)
+                errors.setdefault(position, error["msg"])
+            candidates = [i for i in candidates if i not in bad]
+
+    records = [
+        {
+            "user_id": prepared[i]["user_id"],
+            "organization_id": organization_id,
+            "data_type": item.data_type,
+            "value": item.value,
+            "timestamp": item.timestamp,
+            "data_metadata": item.data_metadata,
+        }
+        for i, item in zip(candidates, validated)
+    ]
+    rejected = [{"row": i, "error": error} for i, error in sorted(errors.items())]
+    return records, rejected
+
+def _drop_duplicates(db: Session, organization_id: int, records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Отбрасывание строк, чей хеш содержимого уже сохранён или встретился
+    раньше в этом пакете; существующие ключи ищутся одним запросом на пакет
+    """
+    for record in records:
+        record["ingest_key"] = content_key(
+            record["user_id"], record["data_type"], record["value"], record["timestamp"], record["data_metadata"]
+        )
+    seen = set(existing_keys(db, organization_id, (record["ingest_key"] for record in records)))
+    unique = []
+    for record in records:
+        if record["ingest_key"] not in seen:
+            seen.add(record["ingest_key"])
+            unique.append(record)
+    return unique, len(records) - len(unique)
+
+def _connection(db: Session):
+    # Соединение той базы (шарда), где лежит biometric_data
+    return db.connection(bind_arguments={"mapper": BiometricData.__mapper__})
+
+def _drop_indexes(db: Session) -> list:
+    # Уникальные индексы остаются: по ним ищутся дубликаты
+    indexes = [index for index in BiometricData.__table__.indexes if not index.unique]
+    connection = _connection(db)
+    for index in indexes:
+        index.drop(bind=connection, checkfirst=True)
+    return indexes
+
+def _create_indexes(db: Session, indexes: list) -> None:
+    connection = _connection(db)
+    for index in indexes:
+        index.create(bind=connection, checkfirst=True)
+    db.commit()
+
+def import_biometric_file(
+    db: Session,
+    path: str,
+    organization_id: int,
+    default_user_id: Optional[int] = None,
+    fmt: Optional[str] = None,
+    batch_size: int = 5000,
+    batches_per_transaction: int = 10,
+    checkpoint: Optional[str] = None,
+    drop_indexes: bool = False,
+    progress: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """
+    Потоковый импорт исторических биометрических данных.
+    Строки валидируются пакетами, вставляются bulk insert'ом в крупных
+    транзакциях; в каждой транзакции сохраняется именованная контрольная
+    точка, с которой импорт продолжится после сбоя.
+    """
+    fmt = fmt or detect_format(path)
+    db.info.setdefault("organization_id", organization_id)
+    resumed = load_checkpoint(db, organization_id, checkpoint, path)
+    stats = ImportStats(
+        rows_read=resumed["rows_read"],
+        rows_imported=resumed["rows_imported"],
+        rows_rejected=resumed["rows_rejected"],
+        rows_duplicate=resumed["rows_duplicate"],
+        resumed_rows=resumed["rows_imported"],
+    )
+    skip = stats.rows_read
+    started = time.monotonic()
+
+    metadata_keys = declared_keys(db, organization_id)
+    dropped = _drop_indexes(db) if drop_indexes else []
+    try:
+        batch: List[Dict[str, Any]] = []
+        pending_batches = 0
+
+        def flush_batch() -> None:
+            nonlocal pending_batches
+            records, rejected = validate_batch(batch, organization_id, default_user_id, db)
+            duplicates = 0
+            if records and settings.INGEST_CONTENT_DEDUPLICATION:
+                records, duplicates = _drop_duplicates(db, organization_id, records)
+            if records:
+                scores = apply_observations(db, added=[
+                    (r["user_id"], r["organization_id"], r["data_type"], r["value"]) for r in records
+                ])
+                for record, score in zip(records, scores):
+                    record["anomaly_score"] = score
+                today = datetime.utcnow().date()
+                record_usage(db, [
+                    (r["organization_id"], r["data_type"], today, r["user_id"], r["value"]) for r in records
+                ])
+                # id новых строк нужны журналу изменений и индексу метаданных
+                ids = db.scalars(
+                    insert(BiometricData).returning(BiometricData.id, sort_by_parameter_order=True), records
+                ).all()
+                record_changes(db, organization_id, ids, CHANGE_UPSERT)
+                if metadata_keys:
+                    reindex(db, organization_id, zip(ids, (r["data_metadata"] for r in records)), metadata_keys)
+            for item in rejected:
+                item["row"] += stats.rows_read
+                if len(stats.errors) < MAX_ERROR_SAMPLES:
+                    stats.errors.append(item)
+            stats.rows_read += len(batch)
+            stats.rows_imported += len(records)
+            stats.rows_rejected += len(rejected)
+            stats.rows_duplicate += duplicates
+            batch.clear()
+            pending_batches += 1
+
+        def commit() -> None:
+            nonlocal pending_batches
+            save_checkpoint(db, organization_id, checkpoint, path, stats)
+            db.commit()
+            pending_batches = 0
+            stats.elapsed = time.monotonic() - started
+            if progress:
+                progress(stats)
+
+        for position, row in enumerate(iter_rows(path, fmt, batch_size)):
+            if position < skip:
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush_batch()
+                if pending_batches >= batches_per_transaction:
+                    commit()
+        if batch:
+            flush_batch()
+        commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if dropped:
+            _create_indexes(db, dropped)
+
+    stats.elapsed = time.monotonic() - started
+    return stats
@@ -0,0 +1,174 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..database import database
+from ..models.models import AccessLog, BiometricData, BulkJob
+from ..schemas.schemas import BiometricDataFilter
+from .events import EVENT_DELETED, EVENT_UPDATED, reading_snapshot, record_event, snapshot_builder
+from .change_feed import CHANGE_DELETE, CHANGE_UPSERT, record_changes
+from .jobs import JOB_ERROR_MESSAGE, JOB_RUNNING, finish_job
+from .metadata_index import reindex, unindex
+from .streaming_stats import apply_observations
+
+logger = logging.getLogger(__name__)
+
+def filter_conditions(organization_id: int, selection: BiometricDataFilter) -> list:
+    """
+    Условия WHERE для выборки записей организации по списку id или фильтрам
+    """
+    conditions = [BiometricData.organization_id == organization_id]
+    if selection.ids is not None:
+        conditions.append(BiometricData.id.in_(selection.ids))
+    if selection.user_id is not None:
+        conditions.append(BiometricData.user_id == selection.user_id)
+    if selection.data_type is not None:
+        conditions.append(BiometricData.data_type == selection.data_type)
+    if selection.start is not None:
+        conditions.append(BiometricData.timestamp >= selection.start)
+    if selection.end is not None:
+        conditions.append(BiometricData.timestamp < selection.end)
+    return conditions
+
+def count_matching(db: Session, organization_id: int, selection: BiometricDataFilter) -> int:
+    return db.scalar(select(func.count(BiometricData.id)).where(*filter_conditions(organization_id, selection)))
+
+def _chunks(db: Session, conditions: list, chunk_size: int):
+    # Keyset-пагинация по id: каждый чанк — отдельная короткая транзакция
+    last_id = 0
+    while True:
+        rows = db.scalars(
+            select(BiometricData)
+            .where(*conditions, BiometricData.id > last_id)
+            .order_by(BiometricData.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+def _audit(db: Session, action: str, user_id: int, organization_id: int, ids: List[int], job: BulkJob) -> None:
+    db.execute(insert(AccessLog), [
+        {
+            "user_id": user_id,
+            "organization_id": organization_id,
+            "action": action,
+            "details": {"data_id": data_id, "job_id": job.id},
+        }
+        for data_id in ids
+    ])
+
+def run_bulk_update(
+    db: Session,
+    job: BulkJob,
+    organization_id: int,
+    user_id: int,
+    selection: BiometricDataFilter,
+    changes: Dict[str, Any],
+    chunk_size: int
+) -> BulkJob:
+    """
+    Массовое обновление: один UPDATE ... WHERE id IN (...) на чанк,
+    аудит и события пишутся пакетно в той же транзакции
+    """
+    job.status = JOB_RUNNING
+    db.commit()
+    db.info.setdefault("organization_id", organization_id)
+    conditions = filter_conditions(organization_id, selection)
+    build = snapshot_builder()
+    try:
+        for rows in _chunks(db, conditions, chunk_size):
+            ids = [row.id for row in rows]
+            snapshots = [build(row) for row in rows] if build else []
+            values = {**changes, "updated_at": datetime.utcnow()}
+            db.execute(
+                update(BiometricData).where(BiometricData.id.in_(ids)).values(**values),
+                execution_options={"synchronize_session": False}
+            )
+            _audit(db, "bulk_update", user_id, organization_id, ids, job)
+            if "value" in changes:
+                apply_observations(
+                    db,
+                    added=[(row.user_id, row.organization_id, row.data_type, changes["value"]) for row in rows],
+                    removed=[(row.user_id, row.organization_id, row.data_type, row.value) for row in rows]
+                )
+            if "data_metadata" in changes:
+                reindex(db, organization_id, [(data_id, changes["data_metadata"]) for data_id in ids])
+            record_changes(db, organization_id, ids, CHANGE_UPSERT)
+            for data in snapshots:
+                data.update(changes)
+                record_event(db, EVENT_UPDATED, organization_id, _json_safe(data), build is reading_snapshot)
+            db.info["wrote"] = True
+            # Прогресс задачи фиксируется вместе с чанком
+            job.processed += len(ids)
+            db.commit()
+        finish_job(job)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Bulk job %s failed", job.id)
+        finish_job(job, error=JOB_ERROR_MESSAGE)
+        db.commit()
+    return job
+
+def run_bulk_delete(
+    db: Session,
+    job: BulkJob,
+    organization_id: int,
+    user_id: int,
+    selection: BiometricDataFilter,
+    chunk_size: int
+) -> BulkJob:
+    """
+    Массовое удаление чанками: DELETE ... WHERE id IN (...) и пакетный аудит
+    """
+    job.status = JOB_RUNNING
+    db.commit()
+    db.info.setdefault("organization_id", organization_id)
+    conditions = filter_conditions(organization_id, selection)
+    build = snapshot_builder()
+    try:
+        for rows in _chunks(db, conditions, chunk_size):
+            ids = [row.id for row in rows]
+            snapshots = [build(row) for row in rows] if build else []
+            db.execute(
+                delete(BiometricData).where(BiometricData.id.in_(ids)),
+                execution_options={"synchronize_session": False}
+            )
+            _audit(db, "bulk_delete", user_id, organization_id, ids, job)
+            apply_observations(
+                db, removed=[(row.user_id, row.organization_id, row.data_type, row.value) for row in rows]
+            )
+            unindex(db, ids)
+            record_changes(db, organization_id, ids, CHANGE_DELETE)
+            for data in snapshots:
+                record_event(db, EVENT_DELETED, organization_id, data, build is reading_snapshot)
+            db.info["wrote"] = True
+            # Прогресс задачи фиксируется вместе с чанком
+            job.processed += len(ids)
+            db.commit()
+        finish_job(job)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Bulk job %s failed", job.id)
+        finish_job(job, error=JOB_ERROR_MESSAGE)
+        db.commit()
+    return job
+
+def _json_safe(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in data.items()}
+
+def run_in_new_session(operation, job_id: str, *args, **kwargs) -> None:
+    """
+    Запуск массовой операции в фоне с собственной сессией
+    """
+    db = database.SessionLocal()
+    try:
+        operation(db, db.get(BulkJob, job_id), *args, **kwargs)
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.models import Organization, User
+from .warmup import recent_activity, warmup
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кеш с временем жизни записей; ttl <= 0 отключает кеш
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> None:
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+# email -> значения колонок пользователя
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_TTL, settings.PRINCIPAL_CACHE_SIZE)
+# id -> значения колонок организации
+organization_cache = TTLCache(settings.ORGANIZATION_CACHE_TTL, settings.ORGANIZATION_CACHE_SIZE)
+
+def _snapshot(instance) -> Dict[str, Any]:
+    return {attr.key: getattr(instance, attr.key) for attr in inspect(type(instance)).column_attrs}
+
+def cache_principal(user: User) -> None:
+    principal_cache.set(user.email, _snapshot(user))
+
+def cache_organization(organization: Organization) -> None:
+    organization_cache.set(organization.id, _snapshot(organization))
+
+def cached_principal(db: Session, email: str) -> Optional[User]:
+    """
+    Пользователь по email; из кеша возвращается не привязанная к сессии
+    копия, пригодная только для чтения полей
+    """
+    values = principal_cache.get(email)
+    if values is not None:
+        return User(**values)
+    user = db.query(User).filter(User.email == email).first()
+    if user is not None:
+        cache_principal(user)
+    return user
+
+def cached_organization(db: Session, organization_id: int) -> Optional[Organization]:
+    values = organization_cache.get(organization_id)
+    if values is not None:
+        return Organization(**values)
+    organization = db.get(Organization, organization_id)
+    if organization is not None:
+        cache_organization(organization)
+    return organization
+
+def invalidate_organization(organization_id: int) -> None:
+    organization_cache.invalidate(organization_id)
+    principal_cache.invalidate_where(lambda values: values["organization_id"] == organization_id)
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed(session, flush_context):
+    # Изменения через ORM сбрасывают записи сразу; прочие (другие процессы,
+    # Core-запросы) видны не позже чем через TTL
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            principal_cache.invalidate(instance.email)
+            for email in inspect(instance).attrs.email.history.deleted or ():
+                principal_cache.invalidate(email)
+        elif isinstance(instance, Organization):
+            organization_cache.invalidate(instance.id)
+
+def _load_by_ids(db: Session, model, ids, chunk: int = 500) -> list:
+    rows = []
+    for start in range(0, len(ids), chunk):
+        rows += db.query(model).filter(model.id.in_(ids[start:start + chunk])).all()
+    return rows
+
+def warm_principals(db: Session) -> int:
+    if principal_cache.ttl <= 0:
+        return 0
+    user_ids, _ = recent_activity(db, settings.WARMUP_ACTIVITY_DAYS)
+    users = _load_by_ids(db, User, user_ids[:settings.WARMUP_PRINCIPALS])
+    for user in users:
+        cache_principal(user)
+    return len(users)
+
+def warm_organizations(db: Session) -> int:
+    _, organization_ids = recent_activity(db, settings.WARMUP_ACTIVITY_DAYS)
+    organizations = _load_by_ids(db, Organization, organization_ids[:settings.WARMUP_ORGANIZATIONS])
+    for organization in organizations:
+        cache_organization(organization)
+    return len(organizations)
+
+warmup.add_step("principals", warm_principals)
+warmup.add_step("organizations", warm_organizations)
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from ..models.models import BiometricChange, BiometricData
+
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+
+def _connection(session: Session):
+    return session.connection(bind_arguments={"mapper": BiometricChange.__mapper__})
+
+def record_changes(session: Session, organization_id: int, data_ids: Iterable[int], change_type: str) -> None:
+    """
+    Запись изменений в журнал в текущей транзакции. Для каждой записи
+    хранится только последнее изменение с новым seq, поэтому журнал
+    растёт с числом изменённых записей, а не с числом изменений.
+    """
+    data_ids = list(dict.fromkeys(data_ids))
+    if not data_ids:
+        return
+    connection = _connection(session)
+    connection.execute(delete(BiometricChange).where(BiometricChange.data_id.in_(data_ids)))
+    connection.execute(insert(BiometricChange), [
+        {"organization_id": organization_id, "data_id": data_id, "change_type": change_type}
+        for data_id in data_ids
+    ])
+
+def read_changes(db: Session, organization_id: int, since: int, limit: int) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """
+    Изменения организации с seq > since по возрастанию seq; для upsert
+    подгружается текущее состояние записи одним запросом.
+    SQLite держит блокировку записи до commit, поэтому seq фиксируются
+    в порядке возрастания и курсор не пропускает изменений.
+    """
+    rows = db.execute(
+        select(BiometricChange.seq, BiometricChange.data_id, BiometricChange.change_type)
+        .where(BiometricChange.organization_id == organization_id, BiometricChange.seq > since)
+        .order_by(BiometricChange.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    upserts = [data_id for _, data_id, change_type in rows if change_type == CHANGE_UPSERT]
+    current = {
+        data.id: data
+        for data in db.scalars(select(BiometricData).where(BiometricData.id.in_(upserts)))
+    } if upserts else {}
+
+    changes = []
+    for seq, data_id, change_type in rows:
+        data = current.get(data_id) if change_type == CHANGE_UPSERT else None
+        if change_type == CHANGE_UPSERT and data is None:
+            # Запись удалена после чтения журнала: её tombstone будет на следующей странице
+            continue
+        changes.append({"seq": seq, "type": change_type, "data_id": data_id, "data": data})
+    next_cursor = rows[-1][0] if rows else since
+    return changes, next_cursor, has_more
+
+@event.listens_for(Session, "after_flush")
+def _record_orm_changes(session, flush_context):
+    upserts: Dict[int, List[int]] = {}
+    deletes: Dict[int, List[int]] = {}
+    for obj in session.new:
+        if isinstance(obj, BiometricData):
+            upserts.setdefault(obj.organization_id, []).append(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, BiometricData) and session.is_modified(obj, include_collections=False):
+            upserts.setdefault(obj.organization_id, []).append(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, BiometricData):
+            deletes.setdefault(obj.organization_id, []).append(obj.id)
+
+    for organization_id, data_ids in upserts.items():
+        record_changes(session, organization_id, data_ids, CHANGE_UPSERT)
+    for organization_id, data_ids in deletes.items():
+        record_changes(session, organization_id, data_ids, CHANGE_DELETE)
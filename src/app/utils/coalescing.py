@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database.database import fan_out
+from ..models.models import AccessLog, BiometricChange
+from .caches import TTLCache
+from .deadlines import DeadlineExceeded
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вычислений: первый запрос
+    с ключом выполняет функцию в пуле потоков, остальные ждут его
+    результат (или исключение). Ключ живёт только пока вычисление идёт.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def _compute(self, key: Hashable, future: Future, fn: Callable[[], Any]) -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def run(self, key: Hashable, fn: Callable[[], Any], retry_on: Tuple[type, ...] = ()) -> Any:
+        """
+        Ошибки retry_on относятся к запросу-лидеру (например, его дедлайн):
+        получив такую ошибку, ожидающий запрос повторяет вычисление сам
+        """
+        while True:
+            with self._lock:
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+                    self.executed += 1
+                else:
+                    self.shared += 1
+            if leader:
+                # Поток доводит вычисление до конца и при отмене запроса-лидера
+                await run_in_threadpool(self._compute, key, future, fn)
+                return await asyncio.wrap_future(future)
+            try:
+                return await asyncio.wrap_future(future)
+            except retry_on:
+                continue
+
+single_flight = SingleFlight()
+# Готовые результаты; версия данных в ключе делает их недействительными при записи
+result_cache = TTLCache(settings.ANALYTICS_CACHE_TTL, settings.ANALYTICS_CACHE_SIZE)
+
+def biometric_data_version(db: Session, organization_id: Optional[int]) -> int:
+    """
+    Версия данных организации — последний seq журнала изменений
+    """
+    return db.scalar(
+        select(func.coalesce(func.max(BiometricChange.seq), 0))
+        .where(BiometricChange.organization_id == organization_id)
+    )
+
+def access_log_version(db: Session) -> tuple:
+    return tuple(fan_out(db, lambda session: session.scalar(select(func.coalesce(func.max(AccessLog.id), 0)))))
+
+def _key(name: str, organization_id: Optional[int], params: Dict[str, Any], version: Hashable) -> tuple:
+    return (name, organization_id, tuple(sorted((k, repr(v)) for k, v in params.items())), version)
+
+def _own_session(db: Session) -> Session:
+    """
+    Отдельная сессия той же базы для вычисления в потоке: сессия запроса
+    закрывается вместе с ним и не может использоваться из другого потока.
+    Состояние запроса (дедлайн, организация для шардов) переносится.
+    """
+    info = {key: db.info[key] for key in ("request_state", "organization_id") if key in db.info}
+    return type(db)(bind=db.bind, autoflush=False, info=info)
+
+async def coalesced(db: Session, name: str, organization_id: Optional[int], params: Dict[str, Any],
+                    version: Hashable, fn: Callable[[Session], Any]) -> Any:
+    """
+    Результат fn(session), общий для одновременных запросов с тем же
+    эндпоинтом, организацией, параметрами и версией данных; готовый
+    результат переиспользуется, пока версия не изменилась
+    """
+    if not settings.REQUEST_COALESCING:
+        return fn(db)
+    key = _key(name, organization_id, params, version)
+    result = result_cache.get(key)
+    if result is None:
+        def compute() -> Any:
+            session = _own_session(db)
+            try:
+                return fn(session)
+            finally:
+                session.close()
+
+        result = await single_flight.run(key, compute, retry_on=(DeadlineExceeded,))
+        result_cache.set(key, result)
+    return result
+
+def precompute(db: Session, name: str, organization_id: Optional[int], params: Dict[str, Any], version: Hashable,
+               fn: Callable[[Session], Any]) -> bool:
+    """
+    Заполнение кеша результатов заранее (прогрев); False, если результат уже есть
+    """
+    key = _key(name, organization_id, params, version)
+    if result_cache.get(key) is not None:
+        return False
+    result_cache.set(key, fn(db))
+    return True
@@ -0,0 +1,157 @@
+import asyncio
+import sqlite3
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+
+from ..config import settings
+
+class DeadlineExceeded(Exception):
+    """
+    Запрос к базе прерван: истёк дедлайн или клиент отключился
+    """
+
+    def __init__(self, deadline: "Deadline"):
+        super().__init__("Request deadline exceeded")
+        self.deadline = deadline
+
+class Deadline:
+    """
+    Дедлайн запроса: время от начала запроса и флаг отмены при
+    отключении клиента. Проверяется обработчиком прогресса SQLite.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.started = time.monotonic()
+        self.expires_at = None if timeout is None else self.started + timeout
+        self.cancelled = False
+
+    def limit(self, timeout: Optional[float]) -> None:
+        """
+        Ограничение сверху; более длинный таймаут дедлайн не продлевает
+        """
+        if timeout is None:
+            return
+        expires_at = self.started + timeout
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or (self.expires_at is not None and time.monotonic() >= self.expires_at)
+
+def request_deadline(request) -> Optional[Deadline]:
+    return getattr(request.state, "deadline", None)
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """
+    Таймаут клиента в секундах, ограниченный MAX_REQUEST_TIMEOUT
+    """
+    if value is None:
+        return None
+    timeout = float(value)
+    if not timeout > 0:
+        raise ValueError(value)
+    return min(timeout, settings.MAX_REQUEST_TIMEOUT)
+
+class DeadlineMiddleware:
+    """
+    ASGI-middleware: дедлайн из заголовка X-Request-Timeout в request.state
+    и отмена дедлайна при отключении клиента до конца ответа
+    """
+
+    def __init__(self, app, header: str = "X-Request-Timeout"):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = next((v.decode("latin-1") for k, v in scope["headers"] if k == self.header), None)
+        try:
+            timeout = parse_timeout(value)
+        except ValueError:
+            response = JSONResponse({"detail": f"Invalid {self.header.decode()} header"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        deadline = Deadline(timeout)
+        scope.setdefault("state", {})["deadline"] = deadline
+        messages: asyncio.Queue = asyncio.Queue()
+        response_done = False
+
+        async def pump():
+            # Сообщения клиента читаются заранее, чтобы заметить отключение
+            # и во время долгого запроса к базе в пуле потоков
+            while True:
+                try:
+                    message = await receive()
+                except Exception:
+                    message = {"type": "http.disconnect"}
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not response_done:
+                        deadline.cancel()
+                    return
+
+        async def wrapped_send(message):
+            nonlocal response_done
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        task = asyncio.ensure_future(pump())
+        try:
+            await self.app(scope, messages.get, wrapped_send)
+        finally:
+            task.cancel()
+
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded) -> JSONResponse:
+    return JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)
+
+def _connection_deadline(info: dict) -> Optional[Deadline]:
+    # Состояние запроса читается при каждой проверке: дедлайн может
+    # появиться или сократиться уже после начала транзакции
+    session_info = info.get("session_info")
+    state = session_info.get("request_state") if session_info is not None else None
+    return getattr(state, "deadline", None)
+
+@event.listens_for(Engine, "connect")
+def _install_interrupt_handler(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    info = connection_record.info
+
+    def interrupt() -> int:
+        deadline = _connection_deadline(info)
+        return 1 if deadline is not None and deadline.expired else 0
+
+    # Вызывается каждые N инструкций виртуальной машины SQLite; ненулевой
+    # результат прерывает текущий оператор
+    dbapi_connection.set_progress_handler(interrupt, settings.DEADLINE_CHECK_INSTRUCTIONS)
+
+@event.listens_for(Session, "after_begin")
+def _bind_session(session, transaction, connection):
+    connection.info["session_info"] = session.info
+
+@event.listens_for(Engine, "checkin")
+def _release_session(dbapi_connection, connection_record):
+    connection_record.info.pop("session_info", None)
+
+@event.listens_for(Engine, "handle_error")
+def _translate_interrupt(context):
+    if context.connection is None or not isinstance(context.original_exception, sqlite3.OperationalError):
+        return None
+    deadline = _connection_deadline(context.connection.info)
+    if deadline is not None and deadline.expired and str(context.original_exception) == "interrupted":
+        return DeadlineExceeded(deadline)
+    return None
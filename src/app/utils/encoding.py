@@ -0,0 +1,223 @@
+import gzip
+import io
+import json
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_MEDIA_TYPES = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    ARROW_MEDIA_TYPE: "arrow",
+}
+
+# Порядок предпочтения при равном q
+_ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+def available_encodings() -> List[str]:
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+def _parse_header(value: str) -> List[tuple]:
+    items = []
+    for position, part in enumerate(value.split(",")):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q, position))
+    return items
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Выбор алгоритма сжатия по заголовку Accept-Encoding
+    """
+    offered = {token: q for token, q, _ in _parse_header(accept_encoding)}
+    wildcard = offered.get("*", 0.0)
+    supported = available_encodings()
+    candidates = []
+    for rank, encoding in enumerate(e for e in _ENCODING_PREFERENCE if e in supported):
+        q = offered.get(encoding, wildcard)
+        if q > 0:
+            candidates.append((-q, rank, encoding))
+    return min(candidates)[2] if candidates else None
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level or 6, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=level or 4)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level or 3).compress(body)
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
+
+def negotiate_media_type(accept: str, tabular: bool) -> str:
+    """
+    Выбор формата ответа по заголовку Accept: json, msgpack или arrow.
+    Незнакомые типы (text/html и т. п.) получают JSON, как и раньше;
+    406 — только если явно запрошен наш формат, который здесь не отдаётся.
+    """
+    if not accept:
+        return "json"
+    best = None
+    refused = False
+    for token, q, position in _parse_header(accept):
+        if q <= 0:
+            continue
+        if token in ("*/*", "application/*"):
+            fmt = "json"
+        else:
+            fmt = _MEDIA_TYPES.get(token)
+        if (fmt == "msgpack" and msgpack is None) or (fmt == "arrow" and (pyarrow is None or not tabular)):
+            refused = True
+            continue
+        if fmt is not None and (best is None or (-q, position) < best[0]):
+            best = ((-q, position), fmt)
+    if best is None and not refused:
+        return "json"
+    if best is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="None of the requested media types can be produced"
+        )
+    return best[1]
+
+def _flatten_for_arrow(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Вложенные JSON-поля (data_metadata, details) неоднородны, храним их строкой
+    return [
+        {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+        for row in rows
+    ]
+
+def encode_msgpack(payload: Any) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
+
+def encode_arrow(rows: List[Dict[str, Any]]) -> bytes:
+    table = pyarrow.Table.from_pylist(_flatten_for_arrow(rows))
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def negotiated_response(
+    request: Request,
+    payload: Any,
+    model: Optional[Type[BaseModel]] = None,
+    tabular: bool = False
+) -> Any:
+    """
+    Возвращает payload как есть для JSON (его сериализует FastAPI по
+    response_model) либо готовый Response в MessagePack/Arrow.
+    """
+    fmt = negotiate_media_type(request.headers.get("accept", ""), tabular)
+    if fmt == "json":
+        return payload
+
+    if model is not None:
+        adapter = TypeAdapter(List[model]) if tabular else TypeAdapter(model)
+        payload = adapter.dump_python(
+            adapter.validate_python(payload, from_attributes=True),
+            mode="python" if fmt == "arrow" else "json"
+        )
+    elif fmt == "msgpack":
+        payload = jsonable_encoder(payload)
+    if fmt == "arrow":
+        return Response(content=encode_arrow(payload), media_type=ARROW_MEDIA_TYPE)
+    return Response(content=encode_msgpack(payload), media_type=MSGPACK_MEDIA_TYPE)
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware сжатия ответов (zstd/br/gzip) по Accept-Encoding.
+    Ответы меньше minimum_size, уже сжатые ответы и потоки
+    text/event-stream передаются без изменений.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, skip_media_types: Sequence[str] = ("text/event-stream",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.skip_media_types = tuple(skip_media_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or content_type.startswith(self.skip_media_types):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=list(start_message["headers"]))
+            start_message["headers"] = headers.raw
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
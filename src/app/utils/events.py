@@ -0,0 +1,275 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models.models import BiometricData
+from ..schemas.schemas import BiometricDataResponse
+
+EVENT_CREATED = "created"
+EVENT_UPDATED = "updated"
+EVENT_DELETED = "deleted"
+
+class Subscription:
+    """
+    Подписка клиента на события организации с ограниченным буфером.
+    При переполнении буфера подписка закрывается (медленный потребитель).
+    """
+
+    def __init__(self, organization_id: int, maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.organization_id = organization_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = loop
+        self.closed = False
+        self.overflowed = False
+
+    def _put(self, item: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.closed = True
+
+    def deliver(self, item: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            # цикл событий клиента уже остановлен
+            self.closed = True
+
+class EventHub:
+    """
+    Внутрипроцессная раздача событий биометрических данных подписчикам
+    организации; через брокер события доходят до других воркеров.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.broker = None
+
+    def subscribe(self, organization_id: int, maxsize: int) -> Subscription:
+        subscription = Subscription(organization_id, maxsize, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(organization_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.closed = True
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.organization_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.organization_id]
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        self._listeners.append(listener)
+
+    def subscriber_count(self, organization_id: Optional[int] = None) -> int:
+        with self._lock:
+            if organization_id is not None:
+                return len(self._subscriptions.get(organization_id, ()))
+            return sum(len(s) for s in self._subscriptions.values())
+
+    def has_listeners(self) -> bool:
+        return bool(self._listeners)
+
+    def wants_snapshots(self) -> bool:
+        # Полные снимки нужны только подписчикам этого или других воркеров
+        if self.broker is not None:
+            return True
+        with self._lock:
+            return bool(self._subscriptions)
+
+    def publish(self, item: Dict[str, Any], remote: bool = False) -> None:
+        for listener in self._listeners:
+            listener(item)
+        if item.get("partial"):
+            # Событие без снимка записи нужно только внутренним слушателям
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(item["organization_id"], ()))
+        for subscription in subscriptions:
+            subscription.deliver(item)
+        if not remote and self.broker is not None:
+            self.broker.publish(item)
+
+class SQLiteEventBroker:
+    """
+    Локальная замена брокера сообщений: события пишутся в общий SQLite-файл,
+    а фоновый поток каждого воркера забирает чужие события и раздаёт их
+    своим подписчикам.
+    """
+
+    def __init__(self, path: str, hub: EventHub, poll_interval: float = 0.2, retention_seconds: float = 60.0):
+        self.path = path
+        self.hub = hub
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.origin = uuid.uuid4().hex
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, created REAL, payload TEXT)"
+        )
+        (self.last_id,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, item: Dict[str, Any]) -> None:
+        self._connect().execute(
+            "INSERT INTO events (origin, created, payload) VALUES (?, ?, ?)",
+            (self.origin, time.time(), json.dumps(item))
+        )
+
+    def poll_once(self) -> int:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, origin, payload FROM events WHERE id > ? ORDER BY id",
+            (self.last_id,)
+        ).fetchall()
+        delivered = 0
+        for row_id, origin, payload in rows:
+            self.last_id = row_id
+            if origin != self.origin:
+                self.hub.publish(json.loads(payload), remote=True)
+                delivered += 1
+        return delivered
+
+    def _run(self) -> None:
+        last_prune = 0.0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll_once()
+                if time.time() - last_prune > self.retention_seconds:
+                    last_prune = time.time()
+                    self._connect().execute(
+                        "DELETE FROM events WHERE created < ?", (last_prune - self.retention_seconds,)
+                    )
+            except sqlite3.Error:
+                continue
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="event-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+hub = EventHub()
+
+def snapshot(obj: BiometricData) -> Dict[str, Any]:
+    return BiometricDataResponse.model_validate(obj).model_dump(mode="json")
+
+def reading_snapshot(obj: BiometricData) -> Dict[str, Any]:
+    # Поля, которых достаточно внутренним слушателям (индекс последних показаний)
+    return {
+        "id": obj.id,
+        "user_id": obj.user_id,
+        "data_type": obj.data_type,
+        "value": obj.value,
+        "timestamp": obj.timestamp,
+    }
+
+def record_event(
+    session: Session,
+    event_type: str,
+    organization_id: int,
+    data: Dict[str, Any],
+    partial: bool = False
+) -> None:
+    """
+    Поставить событие в очередь сессии; оно будет опубликовано после commit
+    """
+    item = {
+        "type": event_type,
+        "organization_id": organization_id,
+        "data": data,
+    }
+    if partial:
+        item["partial"] = True
+    session.info.setdefault("biometric_events", []).append(item)
+
+def snapshot_builder() -> Optional[Callable[[BiometricData], Dict[str, Any]]]:
+    """
+    Построитель снимков для текущих получателей событий: полный снимок
+    для подписчиков и брокера, короткий для внутренних слушателей,
+    None — если событие некому доставить
+    """
+    if hub.wants_snapshots():
+        return snapshot
+    if hub.has_listeners():
+        return reading_snapshot
+    return None
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    build = snapshot_builder()
+    if build is None:
+        return
+    partial = build is reading_snapshot
+    for obj in session.new:
+        if isinstance(obj, BiometricData):
+            record_event(session, EVENT_CREATED, obj.organization_id, build(obj), partial)
+    for obj in session.dirty:
+        if isinstance(obj, BiometricData) and session.is_modified(obj, include_collections=False):
+            record_event(session, EVENT_UPDATED, obj.organization_id, build(obj), partial)
+    for obj in session.deleted:
+        if isinstance(obj, BiometricData):
+            record_event(session, EVENT_DELETED, obj.organization_id, build(obj), partial)
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    for item in session.info.pop("biometric_events", []):
+        hub.publish(item)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("biometric_events", None)
+
+def format_sse(item: Dict[str, Any]) -> str:
+    return f"event: {item['type']}\ndata: {json.dumps(item['data'])}\n\n"
+
+async def event_stream(subscription: Subscription, is_disconnected: Callable, heartbeat_seconds: float):
+    """
+    Генератор Server-Sent Events для подписки
+    """
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if subscription.overflowed:
+                yield "event: overflow\ndata: {}\n\n"
+                break
+            if subscription.closed:
+                break
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(item)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.models import BiometricData
+
+# Ключ клиента (Idempotency-Key) и хеш содержимого не пересекаются благодаря префиксу
+CLIENT_KEY_PREFIX = "k:"
+CONTENT_KEY_PREFIX = "c:"
+
+def _digest(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def client_key(user_id: int, key: str) -> str:
+    # Ключи клиентов разных пользователей не конфликтуют
+    return CLIENT_KEY_PREFIX + _digest(f"{user_id}:{key}")
+
+def content_key(user_id: int, data_type: Any, value: float, timestamp: datetime, data_metadata: Dict[str, Any]) -> str:
+    """
+    Хеш показания: одинаковые пользователь, тип, значение, время и метаданные
+    дают один ключ независимо от порядка ключей метаданных
+    """
+    return CONTENT_KEY_PREFIX + _digest(json.dumps(
+        [user_id, getattr(data_type, "value", data_type), float(value), timestamp.isoformat(), data_metadata],
+        sort_keys=True, separators=(",", ":"), default=str
+    ))
+
+def find_duplicate(db: Session, organization_id: int, key: str) -> Optional[BiometricData]:
+    """
+    Ранее принятая запись с тем же ключом — один поиск по уникальному индексу
+    """
+    return db.scalars(
+        select(BiometricData).where(BiometricData.organization_id == organization_id, BiometricData.ingest_key == key)
+    ).first()
+
+def payload_mismatch(original: BiometricData, payload_hash: Optional[str]) -> bool:
+    """
+    Ключ клиента повторно использован с другим содержимым; у записей,
+    сохранённых до появления ingest_hash, сравнивать не с чем
+    """
+    return payload_hash is not None and original.ingest_hash is not None and original.ingest_hash != payload_hash
+
+def existing_keys(db: Session, organization_id: int, keys: Iterable[str], chunk: int = 500) -> Dict[str, int]:
+    """
+    Ключ -> id для уже сохранённых ключей пакета
+    """
+    keys = list(dict.fromkeys(keys))
+    found: Dict[str, int] = {}
+    for start in range(0, len(keys), chunk):
+        found.update(db.execute(
+            select(BiometricData.ingest_key, BiometricData.id).where(
+                BiometricData.organization_id == organization_id,
+                BiometricData.ingest_key.in_(keys[start:start + chunk])
+            )
+        ).all())
+    return found
@@ -0,0 +1,66 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from ..models.models import BulkJob
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Клиент видит только это сообщение; подробности ошибки остаются в логе сервера
+JOB_ERROR_MESSAGE = "Bulk operation failed"
+
+def finish_job(job: BulkJob, error: Optional[str] = None) -> None:
+    job.status = JOB_FAILED if error else JOB_COMPLETED
+    job.error = error
+    job.finished_at = datetime.utcnow()
+
+def job_to_dict(job: BulkJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "operation": job.operation,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+class JobRegistry:
+    """
+    Задачи массовых операций в основной базе: статус доступен из любого
+    воркера; завершённые задачи хранятся ограниченное время
+    """
+
+    def __init__(self, retention_seconds: float = 3600.0):
+        self.retention_seconds = retention_seconds
+
+    def create(self, db: Session, operation: str, organization_id: Optional[int], total: int = 0) -> BulkJob:
+        self._prune(db)
+        job = BulkJob(
+            id=uuid.uuid4().hex,
+            operation=operation,
+            organization_id=organization_id,
+            status=JOB_PENDING,
+            total=total,
+            processed=0,
+            created_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        return job
+
+    def get(self, db: Session, job_id: str) -> Optional[BulkJob]:
+        return db.get(BulkJob, job_id)
+
+    def _prune(self, db: Session) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        db.execute(delete(BulkJob).where(BulkJob.finished_at < cutoff), execution_options={"synchronize_session": False})
+
+jobs = JobRegistry()
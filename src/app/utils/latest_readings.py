@@ -0,0 +1,198 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import database
+from ..models.models import BiometricData, BiometricDataType
+from .events import EVENT_CREATED, EVENT_DELETED, EVENT_UPDATED, hub
+from .warmup import warmup
+
+# (user_id, data_type)
+ReadingKey = Tuple[int, str]
+
+class LatestReading(NamedTuple):
+    data_id: int
+    organization_id: int
+    value: float
+    timestamp: datetime
+
+def _newer(candidate: LatestReading, current: LatestReading) -> bool:
+    return (candidate.timestamp, candidate.data_id) > (current.timestamp, current.data_id)
+
+def _latest_query(*conditions):
+    """
+    Последнее показание на (user_id, data_type): одна выборка с оконной функцией
+    """
+    rank = func.row_number().over(
+        partition_by=(BiometricData.user_id, BiometricData.data_type),
+        order_by=(BiometricData.timestamp.desc(), BiometricData.id.desc())
+    ).label("rank")
+    ranked = select(
+        BiometricData.user_id,
+        BiometricData.data_type,
+        BiometricData.id,
+        BiometricData.organization_id,
+        BiometricData.value,
+        BiometricData.timestamp,
+        rank
+    ).where(*conditions).subquery()
+    return select(ranked).where(ranked.c.rank == 1)
+
+def _key(user_id: int, data_type) -> ReadingKey:
+    return user_id, BiometricDataType(data_type).value
+
+class LatestReadingIndex:
+    """
+    Внутрипроцессный индекс последнего показания на (user_id, data_type).
+    Прогревается одним групповым запросом и обновляется по событиям hub,
+    включая события других воркеров через брокер. Если последнее
+    показание удалено или сдвинуто назад по времени, ключ помечается
+    устаревшим и перечитывается из базы при следующем обращении.
+    До окончания фонового прогрева (шаг warmup) ключи читаются из базы.
+    Импорт через manage.py событий не публикует: его данные появятся
+    в индексе после перезапуска. Без брокера событий индекс работает,
+    только если воркер один (LATEST_READINGS_SINGLE_WORKER), иначе
+    каждое обращение читает базу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[ReadingKey, LatestReading] = {}
+        self._stale: Set[ReadingKey] = set()
+        # Без прогрева отсутствие ключа не означает отсутствие данных
+        self._complete = False
+        self._mutations = 0
+        # Ключи, изменённые во время прогрева; None — прогрев не идёт
+        self._warming: Optional[Set[ReadingKey]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stale.clear()
+            self._complete = False
+            self._mutations += 1
+
+    @staticmethod
+    def enabled() -> bool:
+        # Записи других воркеров видны только через брокер: иначе индекс устаревал бы бессрочно
+        return hub.broker is not None or settings.LATEST_READINGS_SINGLE_WORKER
+
+    def warm(self, db: Session) -> int:
+        if not self.enabled():
+            return 0
+        # Прогрев идёт параллельно с запросами: ключи, изменённые во время
+        # выборки, перечитываются из базы при следующем обращении
+        with self._lock:
+            self._warming = set()
+        query = _latest_query()
+        entries = {}
+        try:
+            for rows in database.fan_out(db, lambda session: session.execute(query).all()):
+                for user_id, data_type, data_id, organization_id, value, timestamp, _ in rows:
+                    entries[_key(user_id, data_type)] = LatestReading(data_id, organization_id, value, timestamp)
+        finally:
+            with self._lock:
+                touched, self._warming = self._warming, None
+        with self._lock:
+            self._entries = entries
+            self._stale = set()
+            for key in touched:
+                self._invalidate(key)
+            self._complete = True
+            self._mutations += 1
+        return len(entries)
+
+    def forget(self, organization_id: int, user_ids: Iterable[int] = ()) -> None:
+        """
+        Удаление показаний организации и её пользователей после удаления
+        организации; ссылки из других организаций к этому моменту сняты
+        """
+        user_ids = set(user_ids)
+        with self._lock:
+            for key, reading in list(self._entries.items()):
+                if reading.organization_id == organization_id or key[0] in user_ids:
+                    del self._entries[key]
+            self._stale = {key for key in self._stale if key[0] not in user_ids}
+            self._mutations += 1
+
+    def get(self, db: Session, user_id: int, data_type) -> Optional[LatestReading]:
+        key = _key(user_id, data_type)
+        if not self.enabled():
+            return self._read(db, key)
+        with self._lock:
+            if key not in self._stale and (self._complete or key in self._entries):
+                return self._entries.get(key)
+            mutations = self._mutations
+        return self._load(db, key, mutations)
+
+    def _read(self, db: Session, key: ReadingKey) -> Optional[LatestReading]:
+        user_id, data_type = key
+        row = db.execute(_latest_query(
+            BiometricData.user_id == user_id, BiometricData.data_type == BiometricDataType(data_type)
+        )).first()
+        return LatestReading(row.id, row.organization_id, row.value, row.timestamp) if row else None
+
+    def _load(self, db: Session, key: ReadingKey, mutations: int) -> Optional[LatestReading]:
+        reading = self._read(db, key)
+        with self._lock:
+            # Событие во время чтения могло сделать результат устаревшим
+            if self._mutations == mutations:
+                if reading is None:
+                    self._entries.pop(key, None)
+                else:
+                    self._entries[key] = reading
+                self._stale.discard(key)
+        return reading
+
+    def for_user(self, db: Session, user_id: int) -> List[Tuple[str, LatestReading]]:
+        readings = []
+        for data_type in BiometricDataType:
+            reading = self.get(db, user_id, data_type)
+            if reading is not None:
+                readings.append((data_type.value, reading))
+        return readings
+
+    def apply_event(self, item: Dict[str, Any]) -> None:
+        data = item["data"]
+        key = _key(data["user_id"], data["data_type"])
+        timestamp = data["timestamp"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        reading = LatestReading(data["id"], item["organization_id"], data["value"], timestamp)
+
+        with self._lock:
+            self._mutations += 1
+            if self._warming is not None:
+                self._warming.add(key)
+            if key in self._stale:
+                return
+            current = self._entries.get(key)
+            if item["type"] == EVENT_DELETED:
+                if current is not None and current.data_id == reading.data_id:
+                    self._invalidate(key)
+            elif item["type"] in (EVENT_CREATED, EVENT_UPDATED):
+                if current is None:
+                    # Для неизвестного ключа без прогрева более позднее показание может быть в базе
+                    if self._complete and item["type"] == EVENT_CREATED:
+                        self._entries[key] = reading
+                    elif self._complete:
+                        self._invalidate(key)
+                elif current.data_id == reading.data_id and reading.timestamp < current.timestamp:
+                    self._invalidate(key)
+                elif current.data_id == reading.data_id or _newer(reading, current):
+                    self._entries[key] = reading
+
+    def _invalidate(self, key: ReadingKey) -> None:
+        self._entries.pop(key, None)
+        self._stale.add(key)
+
+latest_readings = LatestReadingIndex()
+hub.add_listener(latest_readings.apply_event)
+warmup.add_step("latest_readings", latest_readings.warm)
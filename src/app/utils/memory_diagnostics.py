@@ -0,0 +1,339 @@
+import gc
+import json
+import os
+import re
+import sys
+import threading
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+
+from ..config import settings
+from ..database.database import Base
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+SNAPSHOT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+SNAPSHOT_KEY_TYPES = ("lineno", "filename", "traceback")
+
+def start_tracing(frames: Optional[int] = None) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or settings.MEMORY_TRACE_FRAMES)
+
+def stop_tracing() -> None:
+    tracemalloc.stop()
+
+def rss_bytes() -> Optional[int]:
+    """
+    Текущий RSS процесса; без /proc — максимальный RSS из getrusage
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return max_rss_bytes()
+
+def max_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def live_objects() -> Dict[str, Any]:
+    """
+    Живые ORM-объекты по моделям, открытые сессии с размером identity map
+    и pandas DataFrame (если pandas загружен) — обход всех объектов gc
+    """
+    models = {mapper.class_: mapper.class_.__name__ for mapper in Base.registry.mappers}
+    pandas = sys.modules.get("pandas")
+    orm: Dict[str, int] = {}
+    sessions = identity_map = dataframes = dataframe_bytes = 0
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in models:
+            orm[models[cls]] = orm.get(models[cls], 0) + 1
+        elif isinstance(obj, Session):
+            sessions += 1
+            identity_map += len(obj.identity_map)
+        elif pandas is not None and cls is pandas.DataFrame:
+            dataframes += 1
+            dataframe_bytes += int(obj.memory_usage(index=True).sum())
+    return {
+        "orm_objects": dict(sorted(orm.items())),
+        "sessions": sessions,
+        "identity_map_objects": identity_map,
+        "dataframes": dataframes,
+        "dataframe_bytes": dataframe_bytes,
+    }
+
+class RouteMemoryStats:
+    """
+    Память по маршрутам: число запросов, рост максимального RSS процесса
+    и, при включённом tracemalloc, пик выделенной памяти за запрос.
+    Пик сбрасывается, только когда других запросов нет, поэтому при
+    параллельных запросах он оценивает память сверху. Потоковые ответы
+    измеряются до начала потока и дальше в число активных не входят,
+    иначе подписка на события навсегда запретила бы сброс пика.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._active = 0
+
+    def start(self) -> Dict[str, Any]:
+        with self._lock:
+            tracing = tracemalloc.is_tracing()
+            if tracing and self._active == 0:
+                tracemalloc.reset_peak()
+            self._active += 1
+            return {
+                "traced": tracemalloc.get_traced_memory()[0] if tracing else None,
+                "max_rss": max_rss_bytes(),
+                "active": True,
+            }
+
+    def _release(self, started: Dict[str, Any]) -> None:
+        # Вызывается под self._lock
+        if started["active"]:
+            started["active"] = False
+            self._active -= 1
+            if started["traced"] is not None and tracemalloc.is_tracing():
+                started["peak"] = max(0, tracemalloc.get_traced_memory()[1] - started["traced"])
+
+    def detach(self, started: Dict[str, Any]) -> None:
+        """
+        Начался потоковый ответ: пик фиксируется сейчас, запрос больше не активен
+        """
+        with self._lock:
+            self._release(started)
+
+    def finish(self, route: str, started: Dict[str, Any]) -> None:
+        with self._lock:
+            self._release(started)
+            peak = started.get("peak")
+            max_rss = max_rss_bytes()
+            rss_growth = max_rss - started["max_rss"] if max_rss is not None and started["max_rss"] is not None else 0
+
+            stats = self._routes.setdefault(route, {
+                "requests": 0, "traced_requests": 0, "peak_bytes_max": 0, "peak_bytes_sum": 0, "rss_growth_bytes": 0
+            })
+            stats["requests"] += 1
+            stats["rss_growth_bytes"] += rss_growth
+            if peak is not None:
+                stats["traced_requests"] += 1
+                stats["peak_bytes_sum"] += peak
+                stats["peak_bytes_max"] = max(stats["peak_bytes_max"], peak)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                route: {
+                    **stats,
+                    "peak_bytes_avg": stats["peak_bytes_sum"] / stats["traced_requests"] if stats["traced_requests"] else None,
+                }
+                for route, stats in sorted(self._routes.items(), key=lambda item: -item[1]["peak_bytes_max"])
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+route_memory = RouteMemoryStats()
+
+def _route_template(scope) -> str:
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        if getattr(route, "endpoint", None) is endpoint and endpoint is not None:
+            return f"{scope['method']} {route.path}"
+    return f"{scope['method']} <unmatched>"
+
+class MemoryMiddleware:
+    """
+    ASGI-middleware учёта памяти по шаблонам маршрутов (без id в пути)
+    """
+
+    def __init__(self, app, stats: RouteMemoryStats):
+        self.app = app
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = self.stats.start()
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("text/event-stream"):
+                    self.stats.detach(started)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.stats.finish(_route_template(scope), started)
+
+class SnapshotStore:
+    """
+    Каталог снимков tracemalloc: <id>.tracemalloc (Snapshot.dump) и <id>.json
+    с описанием; хранится не больше max_files последних снимков
+    """
+
+    def __init__(self, directory: str, max_files: int = 20):
+        self.directory = directory
+        self.max_files = max_files
+
+    def path(self, snapshot_id: str) -> Optional[str]:
+        if not SNAPSHOT_ID_PATTERN.match(snapshot_id):
+            return None
+        path = os.path.join(self.directory, snapshot_id + ".tracemalloc")
+        return path if os.path.exists(path) else None
+
+    def take(self) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        info = {
+            "id": uuid.uuid4().hex,
+            "created_at": datetime.utcnow().isoformat(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "rss_bytes": rss_bytes(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot.dump(os.path.join(self.directory, info["id"] + ".tracemalloc"))
+        with open(os.path.join(self.directory, info["id"] + ".json"), "w") as f:
+            json.dump(info, f)
+        self._prune()
+        return info
+
+    def load(self, snapshot_id: str) -> Optional[tracemalloc.Snapshot]:
+        path = self.path(snapshot_id)
+        if path is None:
+            return None
+        # Собственные выделения tracemalloc в статистику не попадают
+        return tracemalloc.Snapshot.load(path).filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        items = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    items.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(items, key=lambda item: item["created_at"], reverse=True)
+
+    def top(self, snapshot_id: str, key_type: str = "lineno", limit: int = 25) -> Optional[List[Dict[str, Any]]]:
+        snapshot = self.load(snapshot_id)
+        if snapshot is None:
+            return None
+        return [
+            {"location": _location(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(key_type)[:limit]
+        ]
+
+    def diff(self, snapshot_id: str, base_id: str, key_type: str = "lineno", limit: int = 25) -> Optional[List[Dict[str, Any]]]:
+        """
+        Рост выделений от снимка base_id к snapshot_id, самые крупные первыми
+        """
+        snapshot, base = self.load(snapshot_id), self.load(base_id)
+        if snapshot is None or base is None:
+            return None
+        return [
+            {
+                "location": _location(stat.traceback),
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(base, key_type)[:limit]
+        ]
+
+    def _prune(self) -> None:
+        for item in self.list()[self.max_files:]:
+            for suffix in (".tracemalloc", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, item["id"] + suffix))
+                except OSError:
+                    pass
+
+def _location(traceback: tracemalloc.Traceback) -> str:
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+snapshot_store = SnapshotStore(settings.MEMORY_SNAPSHOT_DIR, settings.MEMORY_SNAPSHOT_MAX_FILES)
+
+def memory_report() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+    return {
+        "tracing": tracing,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "rss_bytes": rss_bytes(),
+        "max_rss_bytes": max_rss_bytes(),
+        **live_objects(),
+        "routes": route_memory.snapshot(),
+    }
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_metrics(report: Dict[str, Any]) -> str:
+    """
+    Отчёт в текстовом формате Prometheus
+    """
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples) -> None:
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(str(val))}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    metric("bio_memory_rss_bytes", "gauge", "Resident set size of the worker", [({}, report["rss_bytes"])])
+    metric("bio_memory_max_rss_bytes", "gauge", "Peak resident set size of the worker", [({}, report["max_rss_bytes"])])
+    metric("bio_memory_traced_bytes", "gauge", "Memory traced by tracemalloc", [({}, report["traced_bytes"])])
+    metric("bio_memory_traced_peak_bytes", "gauge", "Peak memory traced by tracemalloc", [({}, report["traced_peak_bytes"])])
+    metric("bio_orm_live_objects", "gauge", "Live ORM instances per model",
+           [({"model": model}, count) for model, count in report["orm_objects"].items()])
+    metric("bio_orm_sessions", "gauge", "Live SQLAlchemy sessions", [({}, report["sessions"])])
+    metric("bio_orm_identity_map_objects", "gauge", "Objects held by session identity maps",
+           [({}, report["identity_map_objects"])])
+    metric("bio_pandas_dataframes", "gauge", "Live pandas DataFrames", [({}, report["dataframes"])])
+    metric("bio_pandas_dataframe_bytes", "gauge", "Memory of live pandas DataFrames", [({}, report["dataframe_bytes"])])
+
+    routes = report["routes"]
+    metric("bio_route_requests_total", "counter", "Requests per route",
+           [({"route": route}, stats["requests"]) for route, stats in routes.items()])
+    metric("bio_route_rss_growth_bytes_total", "counter", "Peak RSS growth observed during requests per route",
+           [({"route": route}, stats["rss_growth_bytes"]) for route, stats in routes.items()])
+    metric("bio_route_peak_traced_bytes_max", "gauge", "Largest per-request traced memory peak per route",
+           [({"route": route}, stats["peak_bytes_max"]) for route, stats in routes.items() if stats["traced_requests"]])
+    metric("bio_route_peak_traced_bytes_sum", "counter", "Sum of per-request traced memory peaks per route",
+           [({"route": route}, stats["peak_bytes_sum"]) for route, stats in routes.items() if stats["traced_requests"]])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import bindparam, select, type_coerce, update
+from sqlalchemy.orm import Session
+from sqlalchemy.types import LargeBinary
+
+from ..database.types import codec, msgpack, zstandard
+from ..models.models import BiometricData, MetadataDictionary, Organization
+
+DEFAULT_DICTIONARY_SIZE = 16 * 1024
+DEFAULT_DICTIONARY_SAMPLES = 5000
+
+@dataclass
+class CompactionStats:
+    rows_scanned: int = 0
+    rows_rewritten: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+_table = BiometricData.__table__
+_rewrite_statement = (
+    update(_table)
+    .where(_table.c.id == bindparam("data_id"))
+    .values(data_metadata=bindparam("encoded", type_=LargeBinary))
+)
+
+def train_dictionary(
+    db: Session,
+    organization_id: int,
+    size: int = DEFAULT_DICTIONARY_SIZE,
+    max_samples: int = DEFAULT_DICTIONARY_SAMPLES
+) -> Optional[MetadataDictionary]:
+    """
+    Обучение zstd-словаря по последним значениям data_metadata организации.
+    None, если msgpack/zstandard недоступны или данных для обучения мало.
+    """
+    if msgpack is None or zstandard is None:
+        return None
+    db.info["organization_id"] = organization_id
+    values = db.scalars(
+        select(BiometricData.data_metadata)
+        .where(BiometricData.organization_id == organization_id, BiometricData.data_metadata.isnot(None))
+        .order_by(BiometricData.id.desc())
+        .limit(max_samples)
+    ).all()
+    samples = [msgpack.packb(value, use_bin_type=True) for value in values]
+    try:
+        trained = zstandard.train_dictionary(size, samples)
+    except zstandard.ZstdError:
+        return None
+
+    dictionary = MetadataDictionary(organization_id=organization_id, data=trained.as_bytes(), sample_count=len(samples))
+    db.add(dictionary)
+    db.commit()
+    codec.register(dictionary.id, dictionary.data, organization_id)
+    return dictionary
+
+def compact_metadata(
+    db: Session,
+    organization_id: int,
+    batch_size: int = 1000,
+    progress: Optional[Callable[[CompactionStats], None]] = None
+) -> CompactionStats:
+    """
+    Перезапись data_metadata организации в текущий формат CompactJSON:
+    текст JSON старых строк и значения со старым словарём. Идемпотентна,
+    каждый батч — отдельная транзакция.
+    """
+    stats = CompactionStats()
+    db.info["organization_id"] = organization_id
+    raw_column = type_coerce(BiometricData.data_metadata, LargeBinary)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(BiometricData.id, raw_column)
+            .where(BiometricData.organization_id == organization_id, BiometricData.id > last_id)
+            .order_by(BiometricData.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return stats
+        last_id = rows[-1][0]
+
+        changes = []
+        for data_id, raw in rows:
+            stats.rows_scanned += 1
+            if codec.is_current(raw, organization_id):
+                continue
+            encoded = codec.encode(codec.decode(raw), organization_id)
+            stats.bytes_before += len(raw.encode() if isinstance(raw, str) else raw)
+            stats.bytes_after += len(encoded)
+            changes.append({"data_id": data_id, "encoded": encoded})
+        if changes:
+            # Уже закодированные значения пишутся в обход CompactJSON
+            db.execute(
+                _rewrite_statement,
+                changes,
+                bind_arguments={"mapper": BiometricData.__mapper__}
+            )
+            stats.rows_rewritten += len(changes)
+        db.commit()
+        if progress:
+            progress(stats)
+
+def organizations_to_compact(db: Session, organization_id: Optional[int] = None) -> List[int]:
+    if organization_id is not None:
+        return [organization_id]
+    return db.scalars(select(Organization.id).order_by(Organization.id)).all()
@@ -0,0 +1,199 @@
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from ..models.models import BiometricData, BiometricMetadataValue, BulkJob, MetadataKey, MetadataValueType
+from .jobs import JOB_ERROR_MESSAGE, JOB_RUNNING, finish_job
+
+logger = logging.getLogger(__name__)
+
+# key:value или key=value — равенство; для числовых ключей также >=, <=, >, <
+FILTER_PATTERN = re.compile(r"^(?P<key>[A-Za-z0-9_.\-]+)(?P<op>>=|<=|>|<|=|:)(?P<value>.*)$")
+
+_NUMBER_OPERATORS = {
+    ">=": lambda column, value: column >= value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    "<": lambda column, value: column < value,
+}
+
+def declared_keys(db: Session, organization_id: Optional[int]) -> Dict[str, MetadataValueType]:
+    if organization_id is None:
+        return {}
+    rows = db.query(MetadataKey.key, MetadataKey.value_type).filter(
+        MetadataKey.organization_id == organization_id
+    ).all()
+    return {key: value_type for key, value_type in rows}
+
+def extract(metadata: Any, key: str) -> Any:
+    value = metadata
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def index_values(
+    keys: Dict[str, MetadataValueType],
+    data_id: int,
+    organization_id: int,
+    metadata: Any
+) -> List[Dict[str, Any]]:
+    """
+    Строки побочной таблицы для одной записи; значения неподходящего
+    типа и вложенные объекты не индексируются
+    """
+    rows = []
+    for key, value_type in keys.items():
+        value = extract(metadata, key)
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        row = {"data_id": data_id, "organization_id": organization_id, "key": key,
+               "value_text": None, "value_number": None}
+        if value_type == MetadataValueType.NUMBER:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            row["value_number"] = float(value)
+        else:
+            row["value_text"] = str(value)
+        rows.append(row)
+    return rows
+
+def _connection(session: Session):
+    return session.connection(bind_arguments={"mapper": BiometricMetadataValue.__mapper__})
+
+def reindex(
+    session: Session,
+    organization_id: int,
+    items: Iterable[Tuple[int, Any]],
+    keys: Optional[Dict[str, MetadataValueType]] = None
+) -> None:
+    """
+    Перестроение индекса метаданных для (data_id, data_metadata)
+    """
+    items = list(items)
+    if keys is None:
+        keys = declared_keys(session, organization_id)
+    if not items or not keys:
+        return
+    connection = _connection(session)
+    connection.execute(
+        delete(BiometricMetadataValue).where(BiometricMetadataValue.data_id.in_([data_id for data_id, _ in items]))
+    )
+    rows = [row for data_id, metadata in items for row in index_values(keys, data_id, organization_id, metadata)]
+    if rows:
+        connection.execute(insert(BiometricMetadataValue), rows)
+
+def unindex(session: Session, data_ids: Iterable[int]) -> None:
+    data_ids = list(data_ids)
+    if data_ids:
+        _connection(session).execute(
+            delete(BiometricMetadataValue).where(BiometricMetadataValue.data_id.in_(data_ids))
+        )
+
+def backfill_key(
+    db: Session,
+    job: BulkJob,
+    organization_id: int,
+    key: str,
+    value_type: MetadataValueType,
+    chunk_size: int = 1000
+) -> int:
+    """
+    Индексация существующих записей организации по новому ключу задачей
+    массовых операций: прогресс фиксируется вместе с каждым чанком.
+    Записи, которые успела проиндексировать параллельная вставка,
+    переиндексируются без дублей. Возвращает число значений в индексе.
+    """
+    job.status = JOB_RUNNING
+    db.info.setdefault("organization_id", organization_id)
+    keys = {key: value_type}
+    indexed = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.execute(
+                select(BiometricData.id, BiometricData.data_metadata)
+                .where(BiometricData.organization_id == organization_id, BiometricData.id > last_id)
+                .order_by(BiometricData.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            connection = _connection(db)
+            connection.execute(delete(BiometricMetadataValue).where(
+                BiometricMetadataValue.key == key,
+                BiometricMetadataValue.data_id.in_([data_id for data_id, _ in rows])
+            ))
+            values = [value for data_id, metadata in rows for value in index_values(keys, data_id, organization_id, metadata)]
+            if values:
+                connection.execute(insert(BiometricMetadataValue), values)
+                indexed += len(values)
+            job.processed += len(rows)
+            db.commit()
+        finish_job(job)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Metadata backfill job %s failed", job.id)
+        finish_job(job, error=JOB_ERROR_MESSAGE)
+        db.commit()
+    return indexed
+
+def metadata_conditions(db: Session, organization_id: int, filters: List[str]) -> list:
+    """
+    Условия WHERE для фильтров вида key=value / key>=number по объявленным
+    ключам: каждое — поиск по индексу побочной таблицы
+    """
+    if not filters:
+        return []
+    keys = declared_keys(db, organization_id)
+    conditions = []
+    for item in filters:
+        match = FILTER_PATTERN.match(item)
+        if match is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid metadata filter: {item}")
+        key, op, raw = match.group("key"), match.group("op"), match.group("value")
+        if key not in keys:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Metadata key '{key}' is not declared for filtering"
+            )
+        subquery = select(BiometricMetadataValue.data_id).where(
+            BiometricMetadataValue.organization_id == organization_id,
+            BiometricMetadataValue.key == key
+        )
+        if keys[key] == MetadataValueType.NUMBER:
+            try:
+                number = float(raw)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Metadata key '{key}' is numeric")
+            compare = _NUMBER_OPERATORS.get(op, lambda column, value: column == value)
+            subquery = subquery.where(compare(BiometricMetadataValue.value_number, number))
+        elif op in _NUMBER_OPERATORS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Metadata key '{key}' supports only equality")
+        else:
+            subquery = subquery.where(BiometricMetadataValue.value_text == raw)
+        conditions.append(BiometricData.id.in_(subquery))
+    return conditions
+
+@event.listens_for(Session, "after_flush")
+def _maintain_index(session, flush_context):
+    changed: Dict[int, List[Tuple[int, Any]]] = {}
+    for obj in session.new:
+        if isinstance(obj, BiometricData):
+            changed.setdefault(obj.organization_id, []).append((obj.id, obj.data_metadata))
+    for obj in session.dirty:
+        if isinstance(obj, BiometricData) and inspect(obj).attrs.data_metadata.history.has_changes():
+            changed.setdefault(obj.organization_id, []).append((obj.id, obj.data_metadata))
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, BiometricData)]
+
+    if deleted:
+        unindex(session, deleted)
+    for organization_id, items in changed.items():
+        reindex(session, organization_id, items)
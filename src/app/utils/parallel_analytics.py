@@ -0,0 +1,266 @@
+"""
+Аналитика по всем организациям для администраторов: работа делится
+на задачи (организация, интервал времени), процессы пула считают по
+ним частичные агрегаты NumPy, а главный процесс объединяет их по мере
+готовности. Память воркера ограничена размером порции строк.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database.database import fan_out, shard_router
+from ..models.models import BiometricData
+from .sketches import HyperLogLog
+
+@dataclass
+class AnalyticsTask:
+    organization_id: int
+    start: datetime
+    end: datetime
+    # База воркера; None — сессия вызывающего (последовательный режим)
+    database_url: Optional[str] = None
+
+@dataclass
+class Moments:
+    """
+    count/mean/M2 с объединением по Чану — дисперсия без второго прохода
+    """
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = float("inf")
+    max: float = float("-inf")
+
+    def add_array(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        other = Moments(len(values), float(values.mean()), float(((values - values.mean()) ** 2).sum()),
+                        float(values.min()), float(values.max()))
+        self.merge(other)
+
+    def merge(self, other: "Moments") -> None:
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+@dataclass
+class PartialAggregate:
+    tasks: int = 0
+    moments: Dict[str, Moments] = field(default_factory=dict)
+    # Сериализованные HyperLogLog пользователей по типам данных
+    users: Dict[str, bytes] = field(default_factory=dict)
+    by_organization: Dict[int, int] = field(default_factory=dict)
+    daily: Dict[str, int] = field(default_factory=dict)
+
+    def merge(self, other: "PartialAggregate") -> None:
+        self.tasks += other.tasks
+        for data_type, moments in other.moments.items():
+            self.moments.setdefault(data_type, Moments()).merge(moments)
+        for data_type, registers in other.users.items():
+            if data_type in self.users:
+                users = HyperLogLog.from_bytes(self.users[data_type])
+                users.merge(HyperLogLog.from_bytes(registers))
+                self.users[data_type] = users.to_bytes()
+            else:
+                self.users[data_type] = registers
+        for organization_id, count in other.by_organization.items():
+            self.by_organization[organization_id] = self.by_organization.get(organization_id, 0) + count
+        for day, count in other.daily.items():
+            self.daily[day] = self.daily.get(day, 0) + count
+
+def compute_partial(db: Session, task: AnalyticsTask, fetch_size: int) -> PartialAggregate:
+    partial = PartialAggregate(tasks=1)
+    users: Dict[str, HyperLogLog] = {}
+    query = (
+        select(BiometricData.data_type, BiometricData.value, BiometricData.user_id, BiometricData.timestamp)
+        .where(
+            BiometricData.organization_id == task.organization_id,
+            BiometricData.timestamp >= task.start,
+            BiometricData.timestamp < task.end
+        )
+        .execution_options(yield_per=fetch_size)
+    )
+    for rows in db.execute(query).partitions():
+        data_types = np.array([getattr(row[0], "value", row[0]) for row in rows])
+        values = np.array([row[1] for row in rows], dtype=np.float64)
+        # user_id обнуляется при удалении чужой организации: такие строки
+        # считаются в объёме и статистике, но не среди пользователей
+        known_users = np.array([row[2] is not None for row in rows])
+        user_ids = np.array([row[2] or 0 for row in rows], dtype=np.int64)
+        days = np.array([row[3] for row in rows], dtype="datetime64[D]")
+        for data_type in np.unique(data_types):
+            mask = data_types == data_type
+            partial.moments.setdefault(str(data_type), Moments()).add_array(values[mask])
+            users.setdefault(str(data_type), HyperLogLog()).update(np.unique(user_ids[mask & known_users]).tolist())
+        unique_days, counts = np.unique(days, return_counts=True)
+        for day, count in zip(unique_days, counts):
+            key = str(day)
+            partial.daily[key] = partial.daily.get(key, 0) + int(count)
+        partial.by_organization[task.organization_id] = partial.by_organization.get(task.organization_id, 0) + len(rows)
+    partial.users = {data_type: sketch.to_bytes() for data_type, sketch in users.items()}
+    return partial
+
+_worker_engines: Dict[str, Any] = {}
+
+def run_task(task: AnalyticsTask, fetch_size: int) -> PartialAggregate:
+    """
+    Точка входа воркера: движок на каждый URL создаётся один раз за процесс
+    """
+    engine = _worker_engines.get(task.database_url)
+    if engine is None:
+        engine = _worker_engines[task.database_url] = create_engine(task.database_url)
+    with Session(bind=engine) as session:
+        return compute_partial(session, task, fetch_size)
+
+def database_url_for(organization_id: int) -> str:
+    if shard_router.enabled:
+        return shard_router.url_template.format(shard=shard_router.shard_for(organization_id))
+    return settings.DATABASE_URL
+
+def plan_tasks(
+    db: Session,
+    chunk_days: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    database_url: Callable[[int], Optional[str]] = database_url_for
+) -> List[AnalyticsTask]:
+    """
+    Задачи по организациям и интервалам chunk_days в пределах их данных
+    """
+    def ranges(session: Session):
+        return session.execute(
+            select(BiometricData.organization_id, func.min(BiometricData.timestamp), func.max(BiometricData.timestamp))
+            .group_by(BiometricData.organization_id)
+        ).all()
+
+    tasks = []
+    step = timedelta(days=chunk_days)
+    for shard_ranges in fan_out(db, ranges):
+        for organization_id, first, last in shard_ranges:
+            if organization_id is None or first is None:
+                continue
+            lower = max(first, start) if start else first
+            upper = min(last + timedelta(microseconds=1), end) if end else last + timedelta(microseconds=1)
+            while lower < upper:
+                tasks.append(AnalyticsTask(organization_id, lower, min(lower + step, upper), database_url(organization_id)))
+                lower += step
+    return tasks
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def analytics_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Пул процессов, общий для запросов: создаётся при первом обращении
+    (запуск процессов spawn дорог) и закрывается при остановке приложения
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context(settings.ADMIN_ANALYTICS_START_METHOD)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+def shutdown_analytics_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+def iter_partials(
+    tasks: List[AnalyticsTask],
+    workers: int,
+    fetch_size: int,
+    db: Optional[Session] = None,
+    executor: Optional[Executor] = None
+) -> Iterator[PartialAggregate]:
+    """
+    Частичные агрегаты в порядке готовности; в работе не больше 2 * workers
+    задач, чтобы не копить результаты. workers=0 — последовательно в db.
+    """
+    if workers <= 0:
+        for task in tasks:
+            if shard_router.enabled:
+                db.info["organization_id"] = task.organization_id
+            yield compute_partial(db, task, fetch_size)
+        return
+
+    if executor is None:
+        executor = analytics_pool(workers)
+    pending = set()
+    try:
+        queue = iter(tasks)
+        for task in queue:
+            pending.add(executor.submit(run_task, task, fetch_size))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    except BrokenProcessPool:
+        # Упавший процесс ломает весь пул: следующий запрос создаст новый
+        shutdown_analytics_pool()
+        raise
+    finally:
+        # Пул общий: при досрочном выходе отменяются только свои задачи
+        for future in pending:
+            future.cancel()
+
+def summarize(partial: PartialAggregate) -> Dict[str, Any]:
+    data_types = {}
+    for data_type, moments in sorted(partial.moments.items()):
+        users = HyperLogLog.from_bytes(partial.users[data_type]) if data_type in partial.users else None
+        data_types[data_type] = {
+            "count": moments.count,
+            "mean": moments.mean,
+            "std": moments.std,
+            "min": moments.min,
+            "max": moments.max,
+            "active_users": round(users.estimate()) if users else 0,
+        }
+    return {
+        "total_records": sum(moments.count for moments in partial.moments.values()),
+        "organizations": len(partial.by_organization),
+        "tasks": partial.tasks,
+        "data_types": data_types,
+        "by_organization": dict(sorted(partial.by_organization.items())),
+        "daily_activity": dict(sorted(partial.daily.items())),
+    }
+
+def system_analytics(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    workers: Optional[int] = None,
+    chunk_days: Optional[int] = None,
+    fetch_size: Optional[int] = None
+) -> Dict[str, Any]:
+    workers = settings.ADMIN_ANALYTICS_WORKERS if workers is None else workers
+    tasks = plan_tasks(db, chunk_days or settings.ADMIN_ANALYTICS_CHUNK_DAYS, start, end)
+    total = PartialAggregate()
+    for partial in iter_partials(tasks, workers, fetch_size or settings.ADMIN_ANALYTICS_FETCH_SIZE, db):
+        total.merge(partial)
+    return summarize(total)
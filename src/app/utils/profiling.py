@@ -0,0 +1,188 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.responses import JSONResponse
+
+from ..config import settings
+from ..database import database
+from ..models.models import User, UserRole
+from .auth import check_permissions, verify_token
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class ProfileStore:
+    """
+    Каталог артефактов профилирования: <id>.pstats и <id>.json с описанием
+    запроса; хранится не больше max_files последних профилей
+    """
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+
+    def path(self, profile_id: str, suffix: str = ".pstats") -> Optional[str]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + suffix)
+        return path if os.path.exists(path) else None
+
+    def save(self, profile_id: str, profiler: cProfile.Profile, info: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, profile_id + ".pstats"))
+        with open(os.path.join(self.directory, profile_id + ".json"), "w") as f:
+            json.dump({"id": profile_id, **info}, f)
+        self._prune()
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        items = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    items.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(items, key=lambda item: item["created_at"], reverse=True)
+
+    def summary(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _prune(self) -> None:
+        for item in self.list()[self.max_files:]:
+            for suffix in (".pstats", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, item["id"] + suffix))
+                except OSError:
+                    pass
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+
+def _requested(scope) -> bool:
+    if Headers(scope=scope).get("x-profile", "").lower() in ("1", "true"):
+        return True
+    return QueryParams(scope.get("query_string", b"")).get("profile", "").lower() in ("1", "true")
+
+def _is_admin(scope) -> bool:
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        return False
+    # Роль берётся из базы, а не из токена: права могли быть отозваны
+    db = database.SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == payload["sub"]).first()
+        return user is not None and check_permissions(user.role, UserRole.ADMIN)
+    finally:
+        db.close()
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware профилирования запросов через cProfile.
+    Администратор включает профиль заголовком X-Profile: 1 или параметром
+    ?profile=1 и получает id артефакта в заголовке X-Profile-Id;
+    дополнительно sample_rate доля всех запросов профилируется в фоне.
+    cProfile видит только поток event loop: синхронные зависимости и
+    обработчики из threadpool в профиль не попадают, а работа параллельных
+    запросов в том же loop — попадает. Одновременно активен один профиль:
+    явный запрос во время чужого профиля получает 409. У потоковых ответов
+    (text/event-stream) профиль заканчивается на начале потока.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float = 0.0):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if _requested(scope):
+            if not await run_in_threadpool(_is_admin, scope):
+                response = JSONResponse({"detail": "Not enough permissions"}, status_code=403)
+                await response(scope, receive, send)
+                return
+            if self._active:
+                response = JSONResponse({"detail": "Another request is being profiled"}, status_code=409)
+                await response(scope, receive, send)
+                return
+            await self._profile(scope, receive, send, sampled=False)
+            return
+
+        if self.sample_rate and random.random() < self.sample_rate and not self._active:
+            await self._profile(scope, receive, send, sampled=True)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def _profile(self, scope, receive, send, sampled: bool) -> None:
+        # Флаг ставится без await после проверки, поэтому гонки в одном loop нет
+        self._active = True
+        profile_id = uuid.uuid4().hex
+        status_code = None
+        streaming = False
+        finished = False
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+
+        async def finish() -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            profiler.disable()
+            self._active = False
+            info = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status_code": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "sampled": sampled,
+                "streaming": streaming,
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            await run_in_threadpool(self.store.save, profile_id, profiler, info)
+
+        async def send_wrapper(message):
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(raw=list(message["headers"]))
+                streaming = headers.get("content-type", "").startswith("text/event-stream")
+                if not sampled:
+                    headers["X-Profile-Id"] = profile_id
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+            if streaming and not finished:
+                # Поток может длиться часами: профиль не держит его и не блокирует другие
+                await finish()
+
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await finish()
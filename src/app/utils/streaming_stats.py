@@ -0,0 +1,116 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.models import BiometricDataType, BiometricStats
+
+# (user_id, data_type) -> строка статистики
+StatsKey = Tuple[int, BiometricDataType]
+# (user_id, organization_id, data_type, value)
+Observation = Tuple[int, int, BiometricDataType, float]
+
+# Верхняя граница оценки: JSON не допускает бесконечностей
+MAX_ANOMALY_SCORE = 1000.0
+
+def variance(stats: BiometricStats) -> float:
+    return stats.m2 / (stats.count - 1) if stats.count > 1 else 0.0
+
+def anomaly_score(stats: Optional[BiometricStats], value: float) -> Optional[float]:
+    """
+    z-оценка значения относительно накопленной статистики; None,
+    пока наблюдений меньше ANOMALY_MIN_SAMPLES
+    """
+    if stats is None or stats.count < settings.ANOMALY_MIN_SAMPLES:
+        return None
+    std = math.sqrt(variance(stats))
+    if std == 0:
+        return 0.0 if value == stats.mean else MAX_ANOMALY_SCORE
+    return min(abs(value - stats.mean) / std, MAX_ANOMALY_SCORE)
+
+def add_value(stats: BiometricStats, value: float) -> None:
+    # Welford: обновление среднего и суммы квадратов отклонений за O(1)
+    count = (stats.count or 0) + 1
+    mean = stats.mean or 0.0
+    delta = value - mean
+    mean += delta / count
+    stats.m2 = (stats.m2 or 0.0) + delta * (value - mean)
+    stats.mean = mean
+    stats.count = count
+    stats.min = value if stats.min is None else min(stats.min, value)
+    stats.max = value if stats.max is None else max(stats.max, value)
+    alpha = settings.STATS_EWMA_ALPHA
+    stats.ewma = value if stats.ewma is None else alpha * value + (1 - alpha) * stats.ewma
+
+def remove_value(stats: BiometricStats, value: float) -> None:
+    """
+    Обратный шаг Welford для удалённых или изменённых показаний.
+    min/max и EWMA не откатываются: они остаются оценками по всей истории.
+    """
+    if not stats.count:
+        return
+    if stats.count == 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    count = stats.count - 1
+    mean = (stats.count * stats.mean - value) / count
+    stats.m2 = max(0.0, stats.m2 - (value - mean) * (value - stats.mean))
+    stats.mean = mean
+    stats.count = count
+
+def load_stats(db: Session, keys: Iterable[StatsKey]) -> Dict[StatsKey, BiometricStats]:
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = db.query(BiometricStats).filter(
+        BiometricStats.user_id.in_({user_id for user_id, _ in keys}),
+        BiometricStats.data_type.in_({data_type for _, data_type in keys})
+    ).all()
+    return {(row.user_id, row.data_type): row for row in rows if (row.user_id, row.data_type) in keys}
+
+def apply_observations(
+    db: Session,
+    added: List[Observation] = (),
+    removed: List[Observation] = ()
+) -> List[Optional[float]]:
+    """
+    Пакетное обновление статистик: одна выборка строк на пакет,
+    изменения записываются при flush. Возвращает оценки аномальности
+    для добавленных значений в том же порядке.
+    """
+    keys = [(user_id, data_type) for user_id, _, data_type, _ in list(added) + list(removed)]
+    # Сессии без autoflush: строки статистики, созданные в этой же транзакции, должны быть видны запросу
+    db.flush()
+    cache = load_stats(db, keys)
+
+    for user_id, _, data_type, value in removed:
+        stats = cache.get((user_id, data_type))
+        if stats is not None:
+            remove_value(stats, value)
+
+    scores = []
+    for user_id, organization_id, data_type, value in added:
+        stats = cache.get((user_id, data_type))
+        scores.append(anomaly_score(stats, value))
+        if stats is None:
+            stats = BiometricStats(
+                user_id=user_id, organization_id=organization_id, data_type=data_type,
+                count=0, mean=0.0, m2=0.0
+            )
+            db.add(stats)
+            cache[(user_id, data_type)] = stats
+        add_value(stats, value)
+    return scores
+
+def observe_reading(db: Session, data) -> Optional[float]:
+    """
+    Учёт нового показания: оценка аномальности записывается в data.anomaly_score
+    """
+    (data.anomaly_score,) = apply_observations(
+        db, added=[(data.user_id, data.organization_id, data.data_type, data.value)]
+    )
+    return data.anomaly_score
+
+def forget_reading(db: Session, data) -> None:
+    apply_observations(db, removed=[(data.user_id, data.organization_id, data.data_type, data.value)])
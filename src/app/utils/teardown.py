@@ -0,0 +1,256 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import delete, exists, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import database
+from ..models.models import (
+    AccessLog, AccessLogHourly, BiometricChange, BiometricData, BiometricMetadataValue, BiometricStats, BulkJob,
+    ImportCheckpoint, MetadataDictionary, MetadataKey, Organization, OrganizationTeardown, UsageSketch, User
+)
+from .caches import TTLCache, invalidate_organization
+from .latest_readings import latest_readings
+from .sketches import usage_buffer
+
+TEARDOWN_PENDING = "pending"
+TEARDOWN_RUNNING = "running"
+TEARDOWN_COMPLETED = "completed"
+TEARDOWN_FAILED = "failed"
+
+# Порядок важен: сначала зависимые строки, пользователи — последними
+TEARDOWN_PHASES = [
+    ("metadata_values", BiometricMetadataValue),
+    ("changes", BiometricChange),
+    ("biometric_data", BiometricData),
+    ("access_logs", AccessLog),
+    ("access_log_hourly", AccessLogHourly),
+    ("biometric_stats", BiometricStats),
+    ("usage_sketches", UsageSketch),
+    ("metadata_keys", MetadataKey),
+    ("metadata_dictionaries", MetadataDictionary),
+    ("import_checkpoints", ImportCheckpoint),
+    ("bulk_jobs", BulkJob),
+    ("users", User),
+]
+
+# Строки других организаций со ссылкой на удаляемых пользователей: записи и
+# журнал доступа остаются без ссылки, статистика пользователя удаляется
+USER_REFERENCES = [
+    (BiometricData, False),
+    (AccessLog, False),
+    (BiometricStats, True),
+]
+
+class LeaseLost(Exception):
+    """
+    Аренда задачи истекла и её забрал другой воркер
+    """
+
+# organization_id -> идёт ли удаление; start_teardown обновляет запись сразу,
+# остальные воркеры видят удаление не позже чем через TTL
+teardown_state_cache = TTLCache(settings.TEARDOWN_STATE_TTL, settings.ORGANIZATION_CACHE_SIZE)
+
+def teardown_active(db: Session, organization_id: int) -> bool:
+    return db.scalar(select(exists().where(
+        OrganizationTeardown.organization_id == organization_id,
+        OrganizationTeardown.status.in_([TEARDOWN_PENDING, TEARDOWN_RUNNING])
+    )))
+
+def organization_departing(db: Session, organization_id: int) -> bool:
+    """
+    teardown_active с кешем: проверяется на каждом аутентифицированном запросе
+    """
+    departing = teardown_state_cache.get(organization_id)
+    if departing is None:
+        departing = teardown_active(db, organization_id)
+        teardown_state_cache.set(organization_id, departing)
+    return departing
+
+def start_teardown(db: Session, organization_id: int) -> OrganizationTeardown:
+    """
+    Регистрирует задачу удаления организации; повторный вызов
+    возвращает уже активную задачу
+    """
+    active = db.query(OrganizationTeardown).filter(
+        OrganizationTeardown.organization_id == organization_id,
+        OrganizationTeardown.status.in_([TEARDOWN_PENDING, TEARDOWN_RUNNING])
+    ).first()
+    if active:
+        return active
+    teardown = OrganizationTeardown(organization_id=organization_id, status=TEARDOWN_PENDING, deleted_counts={})
+    db.add(teardown)
+    db.commit()
+    db.refresh(teardown)
+    teardown_state_cache.set(organization_id, True)
+    return teardown
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.TEARDOWN_LEASE_SECONDS)
+
+def claim_teardown(db: Session, teardown_id: int, owner: str) -> bool:
+    """
+    Захват задачи условным UPDATE: задачу без владельца или с истёкшей
+    арендой получает только один воркер
+    """
+    result = db.execute(
+        update(OrganizationTeardown)
+        .where(
+            OrganizationTeardown.id == teardown_id,
+            OrganizationTeardown.status != TEARDOWN_COMPLETED,
+            or_(OrganizationTeardown.owner.is_(None), OrganizationTeardown.lease_expires_at < datetime.utcnow())
+        )
+        .values(owner=owner, lease_expires_at=_lease_until(), status=TEARDOWN_RUNNING, error=None),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def _commit_progress(db: Session, teardown: OrganizationTeardown, owner: str) -> None:
+    # Продление аренды в той же транзакции, что и прогресс
+    renewed = db.execute(
+        update(OrganizationTeardown)
+        .where(OrganizationTeardown.id == teardown.id, OrganizationTeardown.owner == owner)
+        .values(lease_expires_at=_lease_until()),
+        execution_options={"synchronize_session": False}
+    )
+    if renewed.rowcount != 1:
+        raise LeaseLost(teardown.id)
+    db.commit()
+
+def _count(teardown: OrganizationTeardown, key: str, number: int) -> None:
+    counts = dict(teardown.deleted_counts or {})
+    counts[key] = counts.get(key, 0) + number
+    teardown.deleted_counts = counts
+
+def _detach_user_references(db: Session, teardown: OrganizationTeardown, user_ids: List[int]) -> None:
+    organization_id = teardown.organization_id
+
+    def detach(session: Session) -> int:
+        detached = 0
+        for model, remove in USER_REFERENCES:
+            other_organizations = or_(model.organization_id != organization_id, model.organization_id.is_(None))
+            while True:
+                ids = session.scalars(
+                    select(model.id).where(model.user_id.in_(user_ids), other_organizations)
+                    .limit(settings.TEARDOWN_BATCH_SIZE)
+                ).all()
+                if not ids:
+                    break
+                statement = delete(model) if remove else update(model).values(user_id=None)
+                session.execute(statement.where(model.id.in_(ids)), execution_options={"synchronize_session": False})
+                session.commit()
+                detached += len(ids)
+        return detached
+
+    # Ссылки могут быть в шардах других организаций
+    detached = sum(database.fan_out(db, detach))
+    if detached:
+        _count(teardown, "detached_references", detached)
+
+def _delete_in_batches(
+    db: Session,
+    teardown: OrganizationTeardown,
+    phase: str,
+    model,
+    owner: str,
+    before_delete: Optional[Callable[[Session, OrganizationTeardown, List[int]], None]] = None
+) -> None:
+    primary_key = model.__mapper__.primary_key[0]
+    while True:
+        ids = db.scalars(
+            select(primary_key).where(model.organization_id == teardown.organization_id).limit(settings.TEARDOWN_BATCH_SIZE)
+        ).all()
+        if not ids:
+            return
+        if before_delete is not None:
+            before_delete(db, teardown, ids)
+        db.execute(delete(model).where(primary_key.in_(ids)), execution_options={"synchronize_session": False})
+        _count(teardown, phase, len(ids))
+        # Прогресс фиксируется вместе с удалённым батчем: после сбоя
+        # задача продолжает с того же места
+        _commit_progress(db, teardown, owner)
+        if settings.TEARDOWN_PAUSE_SECONDS:
+            time.sleep(settings.TEARDOWN_PAUSE_SECONDS)
+
+def _run_phases(db: Session, teardown: OrganizationTeardown, owner: str, sweep: bool = False) -> None:
+    for phase, model in TEARDOWN_PHASES:
+        teardown.phase = "sweep" if sweep else phase
+        _commit_progress(db, teardown, owner)
+        before_delete = _detach_user_references if model is User else None
+        _delete_in_batches(db, teardown, phase, model, owner, before_delete)
+
+def _wait_for_cached_state(teardown: OrganizationTeardown) -> None:
+    # Воркеры, закешировавшие «удаления нет», пускают записи ещё TTL после старта
+    remaining = (teardown.created_at - datetime.utcnow()).total_seconds() + teardown_state_cache.ttl
+    if remaining > 0:
+        time.sleep(remaining)
+
+def run_teardown(teardown_id: int) -> bool:
+    """
+    Удаление организации и зависимых строк ограниченными батчами с паузами,
+    чтобы блокировка базы не удерживалась долго.
+    Возвращает False, если задачу выполняет другой воркер.
+    """
+    owner = uuid.uuid4().hex
+    db = database.SessionLocal()
+    try:
+        if not claim_teardown(db, teardown_id, owner):
+            teardown = db.get(OrganizationTeardown, teardown_id)
+            return teardown is None or teardown.status == TEARDOWN_COMPLETED
+        teardown = db.get(OrganizationTeardown, teardown_id)
+        db.info["organization_id"] = teardown.organization_id
+        # Новые записи заблокированы, а накопленное в буфере удаляется вместе со скетчами
+        usage_buffer.discard(teardown.organization_id)
+        user_ids = db.scalars(select(User.id).where(User.organization_id == teardown.organization_id)).all()
+        try:
+            _run_phases(db, teardown, owner)
+            # Повторный проход забирает строки запросов, начатых до старта удаления
+            # или пропущенных устаревшим кешем состояния
+            _wait_for_cached_state(teardown)
+            _run_phases(db, teardown, owner, sweep=True)
+            teardown.phase = "organization"
+            db.execute(delete(Organization).where(Organization.id == teardown.organization_id))
+            teardown.status = TEARDOWN_COMPLETED
+            _commit_progress(db, teardown, owner)
+            invalidate_organization(teardown.organization_id)
+            teardown_state_cache.invalidate(teardown.organization_id)
+            latest_readings.forget(teardown.organization_id, user_ids)
+        except LeaseLost:
+            db.rollback()
+        except Exception as exc:
+            db.rollback()
+            teardown.status = TEARDOWN_FAILED
+            teardown.error = str(exc)
+            teardown.owner = None
+            db.commit()
+        return True
+    finally:
+        db.close()
+
+def _resume(teardown_id: int) -> None:
+    # Пока задачу выполняет другой воркер, ждём истечения его аренды
+    while not run_teardown(teardown_id):
+        time.sleep(settings.TEARDOWN_LEASE_SECONDS / 2)
+
+def resume_teardowns() -> List[int]:
+    """
+    Перезапуск задач, прерванных остановкой или падением процесса;
+    задачи с действующей арендой другого воркера не дублируются
+    """
+    db = database.SessionLocal()
+    try:
+        ids = db.scalars(
+            select(OrganizationTeardown.id).where(
+                OrganizationTeardown.status.in_([TEARDOWN_PENDING, TEARDOWN_RUNNING])
+            )
+        ).all()
+    finally:
+        db.close()
+    for teardown_id in ids:
+        threading.Thread(target=_resume, args=(teardown_id,), name=f"teardown-{teardown_id}", daemon=True).start()
+    return ids
@@ -0,0 +1,80 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models.models import BiometricData, BiometricDataType
+
+def encode_cursor(timestamp: datetime, data_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{data_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Позиция (timestamp, id) последней выданной записи; ValueError для чужого курсора
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, data_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(data_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(cursor) from exc
+
+def read_timeline(
+    db: Session,
+    organization_id: int,
+    user_id: int,
+    data_type: BiometricDataType,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100,
+    descending: bool = False,
+    include_metadata: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str], bool]:
+    """
+    Страница истории пользователя по типу данных в порядке (timestamp, id).
+    Выбираются только колонки индекса ix_biometric_data_timeline_position, поэтому
+    таблица не читается; data_metadata подгружается отдельным запросом
+    по id страницы, только если она запрошена.
+    """
+    position = tuple_(BiometricData.timestamp, BiometricData.id)
+    query = select(BiometricData.id, BiometricData.timestamp, BiometricData.value).where(
+        BiometricData.organization_id == organization_id,
+        BiometricData.user_id == user_id,
+        BiometricData.data_type == data_type
+    )
+    if start is not None:
+        query = query.where(BiometricData.timestamp >= start)
+    if end is not None:
+        query = query.where(BiometricData.timestamp < end)
+    if after is not None:
+        query = query.where(position < after if descending else position > after)
+    if descending:
+        query = query.order_by(BiometricData.timestamp.desc(), BiometricData.id.desc())
+    else:
+        query = query.order_by(BiometricData.timestamp, BiometricData.id)
+
+    rows = db.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    metadata = {}
+    if include_metadata and rows:
+        metadata = dict(db.execute(
+            select(BiometricData.id, BiometricData.data_metadata)
+            .where(BiometricData.id.in_([row.id for row in rows]))
+        ).all())
+
+    items = [
+        {
+            "id": row.id,
+            "timestamp": row.timestamp,
+            "value": row.value,
+            "data_metadata": metadata.get(row.id) if include_metadata else None,
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    return items, next_cursor, has_more
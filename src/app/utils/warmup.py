@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..database import database
+from ..models.models import AccessLog
+from .deadlines import Deadline
+
+WARMUP_PENDING = "pending"
+WARMUP_RUNNING = "running"
+WARMUP_READY = "ready"
+WARMUP_TIMED_OUT = "timed_out"
+
+def recent_activity(db: Session, days: int) -> Tuple[List[int], List[int]]:
+    """
+    Пользователи и организации по числу обращений за последние days дней,
+    самые активные первыми
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+
+    def counts(session: Session):
+        return session.execute(
+            select(AccessLog.user_id, AccessLog.organization_id, func.count())
+            .where(AccessLog.timestamp >= since)
+            .group_by(AccessLog.user_id, AccessLog.organization_id)
+        ).all()
+
+    users: Counter = Counter()
+    organizations: Counter = Counter()
+    for rows in database.fan_out(db, counts):
+        for user_id, organization_id, count in rows:
+            if user_id is not None:
+                users[user_id] += count
+            if organization_id is not None:
+                organizations[organization_id] += count
+    return [user_id for user_id, _ in users.most_common()], [org_id for org_id, _ in organizations.most_common()]
+
+class Warmup:
+    """
+    Прогрев кешей после старта: шаги выполняются по очереди в пуле потоков,
+    каждый в своей сессии. Готовность наступает, когда шаги закончились
+    или истёк таймаут; упавший шаг готовность не блокирует.
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[Session], Any]]] = []
+        self.reset()
+
+    def reset(self) -> None:
+        self.status = WARMUP_PENDING
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def add_step(self, name: str, fn: Callable[[Session], Any]) -> None:
+        self.steps.append((name, fn))
+
+    @property
+    def ready(self) -> bool:
+        return self.status in (WARMUP_READY, WARMUP_TIMED_OUT)
+
+    def _run_step(self, name: str, fn: Callable[[Session], Any], session_factory, deadline: Deadline) -> None:
+        db = session_factory()
+        # Дедлайн прогрева прерывает запросы SQLite так же, как дедлайн запроса
+        db.info["request_state"] = SimpleNamespace(deadline=deadline)
+        try:
+            self.results[name] = fn(db)
+        except Exception as exc:
+            self.errors[name] = str(exc)
+        finally:
+            db.close()
+
+    async def run(self, session_factory: Optional[Callable[[], Session]] = None, timeout: Optional[float] = None) -> None:
+        session_factory = session_factory or database.SessionLocal
+        timeout = settings.WARMUP_TIMEOUT if timeout is None else timeout
+        self.reset()
+        self.status = WARMUP_RUNNING
+        self.started = time.monotonic()
+        deadline = Deadline(timeout)
+
+        async def run_steps():
+            for name, fn in self.steps:
+                await run_in_threadpool(self._run_step, name, fn, session_factory, deadline)
+
+        try:
+            await asyncio.wait_for(run_steps(), timeout)
+            self.status = WARMUP_READY
+        except asyncio.TimeoutError:
+            deadline.cancel()
+            self.status = WARMUP_TIMED_OUT
+        finally:
+            self.finished = time.monotonic()
+
+    def skip(self) -> None:
+        self.reset()
+        self.status = WARMUP_READY
+
+    def snapshot(self) -> Dict[str, Any]:
+        duration = None
+        if self.started is not None:
+            duration = (self.finished or time.monotonic()) - self.started
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "duration_seconds": duration,
+            "steps": self.results,
+            "errors": self.errors,
+        }
+
+warmup = Warmup()
@@ -0,0 +1,90 @@
+"""
+Сравнение размера ответа и сквозной задержки для форматов
+JSON/MessagePack/Arrow в сочетании со сжатием gzip/br/zstd.
+
+Запуск из каталога src:  python -m benchmarks.bench_encoding --rows 10000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.database import Base, get_db, get_read_db
+from app.main import app
+from app.models.models import BiometricData, BiometricDataType, Organization, User, UserRole
+from app.utils.auth import create_access_token
+from app.utils.encoding import ARROW_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, available_encodings, msgpack, pyarrow
+
+FORMATS = {"json": "application/json"}
+if msgpack is not None:
+    FORMATS["msgpack"] = MSGPACK_MEDIA_TYPE
+if pyarrow is not None:
+    FORMATS["arrow"] = ARROW_MEDIA_TYPE
+
+def _setup(rows: int):
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    organization = Organization(name="Bench", contact_email="bench@org.com")
+    db.add(organization)
+    db.commit()
+    user = User(email="bench@example.com", hashed_password="-", role=UserRole.ORGANIZATION,
+                organization_id=organization.id)
+    db.add(user)
+    db.commit()
+    start = datetime(2024, 1, 1)
+    db.execute(insert(BiometricData), [
+        {
+            "user_id": user.id,
+            "organization_id": organization.id,
+            "data_type": list(BiometricDataType)[i % len(BiometricDataType)],
+            "value": i * 0.37,
+            "timestamp": start + timedelta(seconds=i),
+            "data_metadata": {"device": f"terminal-{i % 20}", "quality": "high", "firmware": "2.4.1"},
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+
+    def override():
+        yield db
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    token = create_access_token({"sub": user.email, "role": user.role})
+    return TestClient(app), {"Authorization": f"Bearer {token}"}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.config import settings
+    settings.ADMISSION_CONTROL_ENABLED = False
+    client, auth = _setup(args.rows)
+
+    print(f"{'format':<8} {'encoding':<9} {'bytes':>12} {'median ms':>10}")
+    for fmt, media_type in FORMATS.items():
+        for encoding in ["identity"] + available_encodings():
+            headers = {**auth, "Accept": media_type, "Accept-Encoding": encoding}
+            timings = []
+            size = 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                # stream=True не распаковывает тело, чтобы измерить байты в сети
+                with client.stream("GET", "/api/v1/biometric/", headers=headers) as response:
+                    size = sum(len(chunk) for chunk in response.iter_raw())
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{fmt:<8} {encoding:<9} {size:>12} {statistics.median(timings):>10.1f}")
+
+if __name__ == "__main__":
+    main()
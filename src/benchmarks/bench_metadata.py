@@ -0,0 +1,99 @@
+"""
+Сравнение хранения data_metadata: текст JSON, CompactJSON (msgpack + zstd)
+и CompactJSON со словарём организации — размер файла базы, скорость вставки
+и задержка чтения.
+
+Запуск из каталога src:  python -m benchmarks.bench_metadata --rows 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import JSON, Column, Integer, MetaData, Table, create_engine, insert, select
+
+from app.database.types import CompactJSON, codec, compression_scope, msgpack, zstandard
+
+ORGANIZATION_ID = 1
+DICTIONARY_ID = 1
+
+def _metadata(rng: random.Random, i: int) -> dict:
+    return {
+        "device": {
+            "vendor": rng.choice(["Acme Biometrics", "Globex Sensors", "Initech Devices"]),
+            "model": rng.choice(["FP-2000 Pro", "FaceCam X3", "IrisScan 7"]),
+            "firmware": f"4.{rng.randint(0, 3)}.{rng.randint(0, 20)}",
+            "serial": f"SN-{rng.randint(100000, 999999)}",
+        },
+        "capture": {
+            "quality": rng.randint(40, 100),
+            "sensor": rng.choice(["optical", "capacitive", "thermal"]),
+            "resolution_dpi": 500,
+            "duration_ms": round(rng.uniform(80, 400), 1),
+            "attempt": rng.randint(1, 3),
+        },
+        "location": {"site": rng.choice(["HQ", "Branch-North", "Branch-South"]), "terminal": f"T-{i % 40:03d}"},
+        "app_version": "2.14.0",
+    }
+
+def _bench(label: str, column_type, values: list, lookups: int, organization_id=None) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        table = Table("bench", MetaData(), Column("id", Integer, primary_key=True), Column("data", column_type))
+        table.metadata.create_all(engine)
+
+        started = time.perf_counter()
+        with compression_scope(organization_id), engine.begin() as connection:
+            for offset in range(0, len(values), 1000):
+                connection.execute(insert(table), [{"data": v} for v in values[offset:offset + 1000]])
+        insert_seconds = time.perf_counter() - started
+        with engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+        size = os.path.getsize(path)
+
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            rows = connection.execute(select(table.c.data)).scalars().all()
+            scan_seconds = time.perf_counter() - started
+            assert rows[0] == values[0]
+
+            ids = random.Random(1).sample(range(1, len(values) + 1), min(lookups, len(values)))
+            timings = []
+            for data_id in ids:
+                started = time.perf_counter()
+                connection.execute(select(table.c.data).where(table.c.id == data_id)).scalar_one()
+                timings.append(time.perf_counter() - started)
+        engine.dispose()
+
+    print(
+        f"{label:<14} size={size / 1024:9.1f} KiB  insert={len(values) / insert_seconds:9.0f} rows/s  "
+        f"scan={scan_seconds * 1000:8.1f} ms  lookup p50={statistics.median(timings) * 1e6:7.1f} us"
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--dictionary-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    values = [_metadata(rng, i) for i in range(args.rows)]
+
+    codec.clear()
+    _bench("json", JSON, values, args.lookups)
+    _bench("compact", CompactJSON, values, args.lookups)
+
+    if msgpack is not None and zstandard is not None:
+        samples = [msgpack.packb(v, use_bin_type=True) for v in values[:5000]]
+        trained = zstandard.train_dictionary(args.dictionary_size, samples)
+        # Словарь регистрируется напрямую, без таблицы metadata_dictionaries
+        codec.register(DICTIONARY_ID, trained.as_bytes(), ORGANIZATION_ID)
+        _bench("compact+dict", CompactJSON, values, args.lookups, ORGANIZATION_ID)
+    codec.clear()
+
+if __name__ == "__main__":
+    main()
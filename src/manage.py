@@ -0,0 +1,188 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+from app.database.database import SessionLocal, create_schema, engine
+
+def import_biometric(args: argparse.Namespace) -> int:
+    from app.utils.bulk_import import import_biometric_file
+
+    def report(stats):
+        print(
+            f"read={stats.rows_read} imported={stats.rows_imported} "
+            f"rejected={stats.rows_rejected} duplicate={stats.rows_duplicate} rate={stats.rows_per_second:.0f} rows/s",
+            file=sys.stderr
+        )
+
+    create_schema(engine)
+    db = SessionLocal()
+    try:
+        stats = import_biometric_file(
+            db,
+            args.path,
+            organization_id=args.organization_id,
+            default_user_id=args.user_id,
+            fmt=args.format,
+            batch_size=args.batch_size,
+            batches_per_transaction=args.batches_per_transaction,
+            checkpoint=args.checkpoint,
+            drop_indexes=args.drop_indexes,
+            progress=report
+        )
+    finally:
+        db.close()
+
+    for error in stats.errors:
+        print(f"row {error['row']}: {error['error']}", file=sys.stderr)
+    print(
+        f"Imported {stats.rows_imported} rows, rejected {stats.rows_rejected}, "
+        f"skipped {stats.rows_duplicate} duplicates "
+        f"in {stats.elapsed:.1f}s ({stats.rows_per_second:.0f} rows/s)"
+    )
+    return 0
+
+def calibrate_hashing(args: argparse.Namespace) -> int:
+    from app.utils.auth import calibrate_password_policy
+
+    result = calibrate_password_policy(
+        scheme=args.scheme,
+        target_seconds=args.target_ms / 1000,
+        argon2_memory_cost=args.memory_kib,
+        argon2_parallelism=args.parallelism
+    )
+    for cost, seconds in sorted(result["measurements"].items()):
+        print(f"cost={cost}: {seconds * 1000:.1f} ms", file=sys.stderr)
+    print(f"# {result['hash_seconds'] * 1000:.1f} ms per hash (target {args.target_ms:.0f} ms)")
+    for name, value in result["settings"].items():
+        print(f"{name}={value}")
+    return 0
+
+def compact_metadata(args: argparse.Namespace) -> int:
+    from app.utils.metadata_compaction import compact_metadata as compact, organizations_to_compact, train_dictionary
+
+    create_schema(engine)
+    db = SessionLocal()
+    try:
+        total_before = total_after = 0
+        for organization_id in organizations_to_compact(db, args.organization_id):
+            if args.train_dictionaries:
+                dictionary = train_dictionary(db, organization_id, size=args.dictionary_size)
+                if dictionary is None:
+                    print(f"organization {organization_id}: not enough data for a dictionary", file=sys.stderr)
+            stats = compact(db, organization_id, batch_size=args.batch_size)
+            total_before += stats.bytes_before
+            total_after += stats.bytes_after
+            print(
+                f"organization {organization_id}: scanned={stats.rows_scanned} "
+                f"rewritten={stats.rows_rewritten} bytes {stats.bytes_before} -> {stats.bytes_after}"
+            )
+        if args.vacuum and engine.dialect.name == "sqlite":
+            with engine.connect() as connection:
+                connection.exec_driver_sql("VACUUM")
+    finally:
+        db.close()
+    print(f"data_metadata bytes rewritten: {total_before} -> {total_after}")
+    return 0
+
+def compact_access_logs(args: argparse.Namespace) -> int:
+    from app.config import settings
+    from app.database.database import shard_router
+    from app.utils.access_log_compaction import compact_access_logs as compact
+    from app.utils.metadata_compaction import organizations_to_compact
+
+    create_schema(engine)
+    older_than_days = args.older_than_days if args.older_than_days is not None else settings.ACCESS_LOG_RETENTION_DAYS
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    db = SessionLocal()
+    try:
+        organization_ids = list(organizations_to_compact(db, args.organization_id))
+        if args.organization_id is None and not shard_router.enabled:
+            # Записи без организации (например, администраторов) есть только без шардирования
+            organization_ids.append(None)
+        total = 0
+        for organization_id in organization_ids:
+            stats = compact(
+                db, organization_id, cutoff, args.archive_dir or settings.ACCESS_LOG_ARCHIVE_DIR,
+                batch_size=args.batch_size or settings.ACCESS_LOG_COMPACTION_BATCH_SIZE
+            )
+            total += stats.rows_archived
+            print(
+                f"organization {organization_id}: archived={stats.rows_archived} "
+                f"archives={stats.archives_written} hours={stats.hours_updated}"
+            )
+    finally:
+        db.close()
+    print(f"access log rows compacted: {total}")
+    return 0
+
+def admin_analytics(args: argparse.Namespace) -> int:
+    from app.utils.parallel_analytics import system_analytics
+
+    db = SessionLocal()
+    try:
+        result = system_analytics(
+            db, args.start, args.end,
+            workers=args.workers, chunk_days=args.chunk_days, fetch_size=args.fetch_size
+        )
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Biometric Data Management API maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import-biometric", help="Bulk import historical biometric data")
+    importer.add_argument("path", help="CSV, NDJSON or Parquet file")
+    importer.add_argument("--organization-id", type=int, required=True)
+    importer.add_argument("--user-id", type=int, help="User for rows without a user_id column")
+    importer.add_argument("--format", choices=["csv", "ndjson", "parquet"])
+    importer.add_argument("--batch-size", type=int, default=5000)
+    importer.add_argument("--batches-per-transaction", type=int, default=10)
+    importer.add_argument("--checkpoint", help="Checkpoint name used to resume after a failure")
+    importer.add_argument("--drop-indexes", action="store_true",
+                          help="Drop biometric_data indexes during the import and rebuild them afterwards")
+    importer.set_defaults(func=import_biometric)
+
+    calibrate = commands.add_parser("calibrate-hashing", help="Recommend password hashing parameters for this machine")
+    calibrate.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    calibrate.add_argument("--target-ms", type=float, default=250.0, help="Target time for one hash")
+    calibrate.add_argument("--memory-kib", type=int, default=65536, help="argon2 memory cost")
+    calibrate.add_argument("--parallelism", type=int, default=4, help="argon2 parallelism")
+    calibrate.set_defaults(func=calibrate_hashing)
+
+    compact_cmd = commands.add_parser("compact-metadata", help="Rewrite data_metadata in the compact binary format")
+    compact_cmd.add_argument("--organization-id", type=int, help="Only this organization (default: all)")
+    compact_cmd.add_argument("--train-dictionaries", action="store_true",
+                             help="Train a zstd dictionary per organization before rewriting")
+    compact_cmd.add_argument("--dictionary-size", type=int, default=16 * 1024)
+    compact_cmd.add_argument("--batch-size", type=int, default=1000)
+    compact_cmd.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database afterwards")
+    compact_cmd.set_defaults(func=compact_metadata)
+
+    access_cmd = commands.add_parser("compact-access-logs",
+                                     help="Archive old access log rows and fold them into hourly aggregates")
+    access_cmd.add_argument("--older-than-days", type=int, default=None,
+                            help="Age of rows to compact (default: ACCESS_LOG_RETENTION_DAYS)")
+    access_cmd.add_argument("--organization-id", type=int, help="Only this organization (default: all)")
+    access_cmd.add_argument("--archive-dir", help="Directory for archives (default: ACCESS_LOG_ARCHIVE_DIR)")
+    access_cmd.add_argument("--batch-size", type=int, default=None)
+    access_cmd.set_defaults(func=compact_access_logs)
+
+    analytics_cmd = commands.add_parser("admin-analytics",
+                                        help="System-wide biometric analytics across all organizations")
+    analytics_cmd.add_argument("--start", type=datetime.fromisoformat, help="ISO timestamp, inclusive")
+    analytics_cmd.add_argument("--end", type=datetime.fromisoformat, help="ISO timestamp, exclusive")
+    analytics_cmd.add_argument("--workers", type=int, default=None,
+                               help="Worker processes (default: ADMIN_ANALYTICS_WORKERS, 0 runs in-process)")
+    analytics_cmd.add_argument("--chunk-days", type=int, default=None)
+    analytics_cmd.add_argument("--fetch-size", type=int, default=None)
+    analytics_cmd.set_defaults(func=admin_analytics)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
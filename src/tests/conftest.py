@@ -3,18 +3,24 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-from passlib.context import CryptContext
 from datetime import datetime
 from typing import Dict, Any, List
 from tests.dashboard import generate_test_dashboard
 
 from app.main import app
-from app.database.database import Base, get_db
+from app.database.database import Base, get_db, get_read_db
 from app.models.models import User, UserRole, Organization, BiometricDataType, BiometricData
-from app.utils.auth import create_access_token, get_password_hash
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.utils.auth import create_access_token, get_password_hash, set_password_policy
+from app.utils.admission import reset_limiter_store
+from app.utils.latest_readings import latest_readings
+from app.utils.caches import organization_cache, principal_cache
+from app.utils.coalescing import result_cache
+from app.utils.sketches import usage_buffer
+from app.utils.teardown import teardown_state_cache
+
+# Cheap password hashing policy for tests
+TEST_PASSWORD_POLICY = {"scheme": "bcrypt", "bcrypt_rounds": 4}
+set_password_policy(**TEST_PASSWORD_POLICY)
 
 # Create test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -24,6 +30,8 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Single process: teardowns need not wait for other workers' cached teardown state
+teardown_state_cache.ttl = 0.0
 
 # Store test results
 test_results: Dict[str, Any] = {
@@ -37,6 +45,13 @@ def db():
     # Create tables in test database
     Base.metadata.create_all(bind=engine)
     
+    latest_readings.clear()
+    principal_cache.clear()
+    organization_cache.clear()
+    result_cache.clear()
+    usage_buffer.clear()
+    teardown_state_cache.clear()
+    
     # Create session
     db = TestingSessionLocal()
     try:
@@ -55,6 +70,8 @@ def client(db):
             db.close()
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    reset_limiter_store()
     return TestClient(app=app)
 
 @pytest.fixture(scope="function")
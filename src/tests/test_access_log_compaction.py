@@ -0,0 +1,139 @@
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta
+
+from fastapi import status
+from sqlalchemy import event
+
+from app.models.models import AccessLog, AccessLogArchive, AccessLogHourly
+from app.utils import access_log_compaction
+from app.utils.access_log_compaction import access_counts, compact_access_logs, fold_hourly, verify_archive, write_archive
+from app.utils.analytics import analyze_access_patterns
+from app.utils.auth import create_access_token
+
+API_PREFIX = "/api/v1"
+
+def _seed(db, user_id, organization_id):
+    old = datetime(2024, 1, 1, 10)
+    rows = [
+        AccessLog(user_id=user_id, organization_id=organization_id, action=action,
+                  details={"n": i}, timestamp=old + timedelta(minutes=25 * i))
+        for i, action in enumerate(["read", "read", "create", "read", "update"])
+    ]
+    rows.append(AccessLog(user_id=user_id, organization_id=organization_id, action="read",
+                          details={}, timestamp=datetime.utcnow()))
+    db.add_all(rows)
+    db.commit()
+    return [
+        {"id": row.id, "organization_id": row.organization_id, "user_id": row.user_id,
+         "action": row.action, "timestamp": row.timestamp, "details": row.details}
+        for row in rows
+    ]
+
+def test_compaction_archives_and_aggregates(db, test_user, test_organization, tmp_path):
+    org_id = test_organization.id
+    logs = _seed(db, test_user.id, org_id)
+    cutoff = datetime.utcnow() - timedelta(days=1)
+
+    stats = compact_access_logs(db, org_id, cutoff, str(tmp_path), batch_size=2)
+    assert stats.rows_archived == 5
+    assert stats.archives_written == 3
+
+    # Only the recent row stays raw
+    assert [row.id for row in db.query(AccessLog).all()] == [logs[-1]["id"]]
+    hourly = {(row.action, row.hour): row.count for row in db.query(AccessLogHourly).all()}
+    assert hourly == {
+        ("read", datetime(2024, 1, 1, 10)): 2,
+        ("create", datetime(2024, 1, 1, 10)): 1,
+        ("read", datetime(2024, 1, 1, 11)): 1,
+        ("update", datetime(2024, 1, 1, 11)): 1,
+    }
+
+    archives = db.query(AccessLogArchive).order_by(AccessLogArchive.first_id).all()
+    assert sum(archive.row_count for archive in archives) == 5
+    archived = []
+    for archive in archives:
+        assert verify_archive(archive)
+        with open(archive.path + ".sha256", encoding="utf-8") as f:
+            assert f.read().split()[0] == archive.sha256
+        with gzip.open(archive.path, "rt", encoding="utf-8") as f:
+            archived += [json.loads(line) for line in f]
+    assert [row["id"] for row in archived] == [log["id"] for log in logs[:5]]
+    assert archived[0]["details"] == {"n": 0}
+
+    # Tampering is detected
+    with open(archives[0].path, "ab") as f:
+        f.write(b"x")
+    assert not verify_archive(archives[0])
+
+    # Re-running finds nothing left to compact
+    assert compact_access_logs(db, org_id, cutoff, str(tmp_path)).rows_archived == 0
+
+def test_analytics_read_aggregates_and_raw_tail(client, db, test_user, test_org_user, test_organization, tmp_path):
+    org_id = test_organization.id
+    logs = _seed(db, test_user.id, org_id)
+    token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    before = client.get(f"{API_PREFIX}/biometric/access-analytics/", headers=headers)
+    assert before.status_code == status.HTTP_200_OK
+    compact_access_logs(db, org_id, datetime.utcnow() - timedelta(days=1), str(tmp_path))
+    after = client.get(f"{API_PREFIX}/biometric/access-analytics/", headers=headers)
+
+    assert after.json() == before.json()
+    assert after.json()["total_accesses"] == 6
+    assert after.json()["access_by_action"] == {"read": 4, "create": 1, "update": 1}
+    assert after.json()["access_timeline"]["2024-01-01T10:00:00"] == 3
+    assert analyze_access_patterns(logs)["total_accesses"] == 6
+
+def test_raw_tail_is_grouped_in_the_database(db, test_user, test_organization):
+    logs = _seed(db, test_user.id, test_organization.id)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        counts = access_counts(db)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    assert counts == fold_hourly((log["organization_id"], log["action"], log["timestamp"]) for log in logs)
+    assert any("FROM access_logs" in statement and "GROUP BY" in statement for statement in statements)
+
+def test_compaction_merges_into_existing_hours(db, test_user, test_organization, tmp_path):
+    org_id = test_organization.id
+    cutoff = datetime.utcnow() - timedelta(days=1)
+    for _ in range(2):
+        db.add(AccessLog(user_id=test_user.id, organization_id=org_id, action="read",
+                         details={}, timestamp=datetime(2024, 1, 1, 10, 30)))
+        db.commit()
+        compact_access_logs(db, org_id, cutoff, str(tmp_path))
+
+    rows = db.query(AccessLogHourly).all()
+    assert [(row.action, row.count) for row in rows] == [("read", 2)]
+
+def test_archives_are_never_overwritten(db, test_user, test_organization, tmp_path, monkeypatch):
+    _seed(db, test_user.id, test_organization.id)
+    rows = db.query(AccessLog).order_by(AccessLog.id).limit(3).all()
+
+    # Ids repeat after deletion or across shards: the same ids get a new file
+    first, _ = write_archive(str(tmp_path), test_organization.id, rows)
+    second, _ = write_archive(str(tmp_path), test_organization.id, rows)
+    assert first != second
+
+    class FixedUUID:
+        hex = "0" * 32
+
+    monkeypatch.setattr(access_log_compaction.uuid, "uuid4", lambda: FixedUUID)
+    monkeypatch.setattr(access_log_compaction, "datetime", type("Frozen", (), {"utcnow": staticmethod(lambda: datetime(2024, 1, 1))}))
+    path, _ = write_archive(str(tmp_path), test_organization.id, rows)
+    content = open(path, "rb").read()
+    with pytest.raises(FileExistsError):
+        write_archive(str(tmp_path), test_organization.id, [rows[0], rows[2]])
+    assert open(path, "rb").read() == content
+    assert not list(tmp_path.glob("*.tmp"))
+
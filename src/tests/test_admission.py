@@ -0,0 +1,97 @@
+import pytest
+from fastapi import status
+
+from app.config import settings
+from app.utils.admission import FileLimiterStore, MemoryLimiterStore
+from app.utils.auth import create_access_token
+
+API_PREFIX = "/api/v1"
+
+def test_rate_limit_returns_429_with_retry_after(client, test_user, test_biometric_data, monkeypatch):
+    monkeypatch.setattr(settings, "ORG_RATE_LIMIT_BURST", 6.0)
+    monkeypatch.setattr(settings, "ORG_RATE_LIMIT_PER_SECOND", 0.5)
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # list costs 5 tokens, so the second call in the same second is rejected
+    assert client.get(f"{API_PREFIX}/biometric/", headers=headers).status_code == status.HTTP_200_OK
+    response = client.get(f"{API_PREFIX}/biometric/", headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # cheap reads still fit into the remaining budget
+    response = client.get(f"{API_PREFIX}/biometric/{test_biometric_data.id}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+def test_concurrency_limit_returns_503(client, test_user, test_organization, monkeypatch):
+    from app.utils.admission import get_limiter_store
+
+    monkeypatch.setattr(settings, "ORG_MAX_CONCURRENT_REQUESTS", 1)
+    store = get_limiter_store()
+    lease = store.acquire_slot(f"org:{test_organization.id}", 1, 60)
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+
+    response = client.get(f"{API_PREFIX}/biometric/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+    store.release_slot(f"org:{test_organization.id}", lease)
+    response = client.get(f"{API_PREFIX}/biometric/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+
+@pytest.mark.parametrize("make_store", [
+    lambda tmp_path: MemoryLimiterStore(),
+    lambda tmp_path: FileLimiterStore(str(tmp_path / "limits.db")),
+])
+def test_limiter_store_token_bucket(make_store, tmp_path):
+    store = make_store(tmp_path)
+    assert store.take_tokens("org:1", 3, rate=1.0, burst=5) == 0
+    retry_after = store.take_tokens("org:1", 3, rate=1.0, burst=5)
+    assert 0 < retry_after <= 1.1
+    assert store.take_tokens("org:2", 3, rate=1.0, burst=5) == 0
+
+def test_file_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = FileLimiterStore(path), FileLimiterStore(path)
+
+    lease = first.acquire_slot("org:1", 1, 60)
+    assert lease is not None
+    assert second.acquire_slot("org:1", 1, 60) is None
+    first.release_slot("org:1", lease)
+    assert second.acquire_slot("org:1", 1, 60) is not None
+
+    # expired leases left behind by a crashed worker are reclaimed
+    assert first.acquire_slot("org:2", 1, -1) is not None
+    assert second.acquire_slot("org:2", 1, 60) is not None
+
+def test_store_is_not_called_on_the_event_loop(client, test_user, monkeypatch):
+    import asyncio
+    from app.utils import admission
+
+    calls = []
+
+    class RecordingStore(MemoryLimiterStore):
+        def _record(self):
+            try:
+                asyncio.get_running_loop()
+                calls.append("loop")
+            except RuntimeError:
+                calls.append("thread")
+
+        def acquire_slot(self, *args):
+            self._record()
+            return super().acquire_slot(*args)
+
+        def take_tokens(self, *args):
+            self._record()
+            return super().take_tokens(*args)
+
+        def release_slot(self, *args):
+            self._record()
+            return super().release_slot(*args)
+
+    monkeypatch.setattr(admission, "_store", RecordingStore())
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    response = client.get(f"{API_PREFIX}/biometric/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == ["thread"] * 3
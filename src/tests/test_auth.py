@@ -1,7 +1,14 @@
 import pytest
 from fastapi import status
-from app.models.models import UserRole
-from app.utils.auth import create_access_token, get_password_hash
+from app.models.models import User, UserRole
+from app.utils.auth import (
+    build_password_context,
+    calibrate_password_policy,
+    create_access_token,
+    get_password_hash,
+    set_password_policy,
+    verify_and_update_password
+)
 
 API_PREFIX = "/api/v1"
 
@@ -96,4 +103,57 @@ def test_get_current_user_wrong_role(client, test_user):
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
-    assert response.json()["detail"] == "Could not validate credentials" 
\ No newline at end of file
+    assert response.json()["detail"] == "Could not validate credentials" 
+
+@pytest.fixture
+def restore_password_policy():
+    from tests.conftest import TEST_PASSWORD_POLICY
+    yield
+    set_password_policy(**TEST_PASSWORD_POLICY)
+
+def test_login_rehashes_out_of_policy_hash(client, db, test_user, restore_password_policy):
+    email = test_user.email
+    assert test_user.hashed_password.startswith("$2b$04$")
+
+    set_password_policy("bcrypt", bcrypt_rounds=5)
+    response = client.post(f"{API_PREFIX}/token", data={"username": email, "password": "testpassword"})
+    assert response.status_code == status.HTTP_200_OK
+
+    user = db.query(User).filter(User.email == email).one()
+    assert user.hashed_password.startswith("$2b$05$")
+    rehashed = user.hashed_password
+
+    # Hash already matches the policy: nothing is rewritten
+    response = client.post(f"{API_PREFIX}/token", data={"username": email, "password": "testpassword"})
+    assert response.status_code == status.HTTP_200_OK
+    assert db.query(User).filter(User.email == email).one().hashed_password == rehashed
+
+def test_wrong_password_does_not_rehash(client, db, test_user, restore_password_policy):
+    email, original = test_user.email, test_user.hashed_password
+    set_password_policy("bcrypt", bcrypt_rounds=5)
+    response = client.post(f"{API_PREFIX}/token", data={"username": email, "password": "wrong"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert db.query(User).filter(User.email == email).one().hashed_password == original
+
+def test_argon2_policy_upgrades_bcrypt_hashes(restore_password_policy):
+    legacy = get_password_hash("secret")
+    set_password_policy("argon2", argon2_time_cost=1, argon2_memory_cost=1024, argon2_parallelism=1)
+
+    verified, new_hash = verify_and_update_password("secret", legacy)
+    assert verified and new_hash.startswith("$argon2id$")
+    assert verify_and_update_password("secret", new_hash) == (True, None)
+
+    # Changing argon2 parameters also marks existing hashes for update
+    set_password_policy("argon2", argon2_time_cost=2, argon2_memory_cost=1024, argon2_parallelism=1)
+    assert verify_and_update_password("secret", new_hash)[1].startswith("$argon2id$v=19$m=1024,t=2")
+
+def test_unknown_scheme_is_rejected():
+    with pytest.raises(ValueError):
+        build_password_context("md5_crypt")
+
+def test_calibration_respects_target():
+    result = calibrate_password_policy("bcrypt", target_seconds=0.02, max_cost=8)
+    rounds = result["settings"]["BCRYPT_ROUNDS"]
+    assert 4 <= rounds <= 8
+    assert result["hash_seconds"] == result["measurements"][rounds]
+    assert rounds == 4 or result["hash_seconds"] <= 0.02
@@ -2,7 +2,7 @@ import pytest
 from datetime import datetime
 from fastapi import status
 
-from app.models.models import BiometricDataType, Organization, User, UserRole, BiometricData
+from app.models.models import BiometricDataType, Organization, User, UserRole, BiometricData, AccessLog
 from app.utils.auth import create_access_token
 
 API_PREFIX = "/api/v1"
@@ -167,4 +167,46 @@ def test_get_biometric_data_wrong_organization(client, test_user, test_organizat
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == status.HTTP_403_FORBIDDEN
-    assert response.json()["detail"] == "Not authorized to access this data" 
\ No newline at end of file
+    assert response.json()["detail"] == "Not authorized to access this data" 
+
+def test_batch_get_biometric_data(client, test_user, test_biometric_data, db):
+    other_org = Organization(name="Other Organization", contact_email="other@org.com")
+    db.add(other_org)
+    db.commit()
+    foreign = BiometricData(
+        user_id=test_user.id,
+        organization_id=other_org.id,
+        data_type=BiometricDataType.FACE,
+        value=1.0,
+        timestamp=datetime.utcnow(),
+        data_metadata={}
+    )
+    db.add(foreign)
+    db.commit()
+    data_id, foreign_id = test_biometric_data.id, foreign.id
+
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    response = client.post(
+        f"{API_PREFIX}/biometric/batch-get/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"ids": [data_id, foreign_id, 9999, data_id]}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [item["id"] for item in data["found"]] == [data_id]
+    assert data["missing"] == [foreign_id, 9999]
+
+    logs = db.query(AccessLog).filter(AccessLog.action == "read").all()
+    assert [log.details["data_id"] for log in logs] == [data_id]
+
+def test_batch_get_biometric_data_too_many_ids(client, test_user, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "MULTI_GET_MAX_IDS", 2)
+
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    response = client.post(
+        f"{API_PREFIX}/biometric/batch-get/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"ids": [1, 2, 3]}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
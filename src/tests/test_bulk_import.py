@@ -0,0 +1,136 @@
+import json
+import pytest
+
+from app.models.models import BiometricData, BiometricDataType, ImportCheckpoint, Organization, User, UserRole
+from app.utils.bulk_import import import_biometric_file, validate_batch
+
+def _write_csv(path, rows):
+    lines = ["user_id,data_type,value,timestamp,data_metadata"]
+    for row in rows:
+        lines.append(",".join(str(v) for v in row))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def test_validate_batch_rejects_invalid_rows(test_user, test_organization):
+    records, rejected = validate_batch(
+        [
+            {"data_type": "face", "value": 1.5, "timestamp": "2024-01-01T00:00:00", "data_metadata": "{}"},
+            {"data_type": "unknown", "value": 1.5, "timestamp": "2024-01-01T00:00:00"},
+            {"data_type": "iris", "value": "not-a-number", "timestamp": "2024-01-01T00:00:00"},
+        ],
+        organization_id=test_organization.id,
+        default_user_id=test_user.id
+    )
+    assert len(records) == 1
+    assert records[0]["data_type"] == BiometricDataType.FACE
+    assert records[0]["organization_id"] == test_organization.id
+    assert [r["row"] for r in rejected] == [1, 2]
+
+def test_import_csv(db, test_user, test_organization, tmp_path):
+    source = tmp_path / "readings.csv"
+    _write_csv(source, [
+        (test_user.id, "fingerprint", 1.0, "2024-01-01T00:00:00", '"{""device"": ""a""}"'),
+        (test_user.id, "face", 2.0, "2024-01-02T00:00:00", ""),
+        (test_user.id, "bogus", 3.0, "2024-01-03T00:00:00", ""),
+    ])
+
+    stats = import_biometric_file(db, str(source), organization_id=test_organization.id, batch_size=2)
+
+    assert stats.rows_read == 3
+    assert stats.rows_imported == 2
+    assert stats.rows_rejected == 1
+    rows = db.query(BiometricData).order_by(BiometricData.id).all()
+    assert [r.value for r in rows] == [1.0, 2.0]
+    assert rows[0].data_metadata == {"device": "a"}
+
+def test_import_ndjson_with_dropped_indexes(db, test_user, test_organization, tmp_path):
+    source = tmp_path / "readings.ndjson"
+    source.write_text("\n".join(json.dumps({
+        "data_type": "voice",
+        "value": float(i),
+        "timestamp": f"2024-01-01T00:00:{i:02d}",
+        "data_metadata": {"i": i}
+    }) for i in range(10)), encoding="utf-8")
+
+    stats = import_biometric_file(
+        db, str(source), organization_id=test_organization.id,
+        default_user_id=test_user.id, batch_size=3, drop_indexes=True
+    )
+
+    assert stats.rows_imported == 10
+    assert db.query(BiometricData).count() == 10
+
+def test_import_resumes_from_checkpoint(db, test_user, test_organization, tmp_path):
+    source = tmp_path / "readings.csv"
+    _write_csv(source, [
+        (test_user.id, "palm", float(i), f"2024-01-01T00:00:{i:02d}", "") for i in range(6)
+    ])
+
+    def fail_after_first_commit(stats):
+        raise RuntimeError("simulated crash")
+
+    with pytest.raises(RuntimeError):
+        import_biometric_file(
+            db, str(source), organization_id=test_organization.id, batch_size=2,
+            batches_per_transaction=1, checkpoint="readings",
+            progress=fail_after_first_commit
+        )
+    assert db.query(ImportCheckpoint).one().rows_read == 2
+
+    stats = import_biometric_file(
+        db, str(source), organization_id=test_organization.id, batch_size=2,
+        batches_per_transaction=1, checkpoint="readings"
+    )
+
+    assert stats.rows_read == 6
+    assert stats.rows_imported == 6
+    values = sorted(r.value for r in db.query(BiometricData).all())
+    assert values == [float(i) for i in range(6)]
+
+def test_checkpoint_commits_with_its_rows(db, test_user, test_organization, tmp_path, monkeypatch):
+    source = tmp_path / "readings.csv"
+    _write_csv(source, [(test_user.id, "palm", float(i), f"2024-01-01T00:00:{i:02d}", "") for i in range(4)])
+    commits = 0
+    original_commit = db.commit
+
+    def crash_on_second_commit():
+        nonlocal commits
+        commits += 1
+        if commits == 2:
+            raise RuntimeError("simulated crash")
+        original_commit()
+
+    monkeypatch.setattr(db, "commit", crash_on_second_commit)
+    with pytest.raises(RuntimeError):
+        import_biometric_file(db, str(source), organization_id=test_organization.id, batch_size=2,
+                              batches_per_transaction=1, checkpoint="readings")
+    monkeypatch.undo()
+
+    # Neither the second batch nor its checkpoint were committed
+    assert db.query(ImportCheckpoint).one().rows_read == 2
+    assert db.query(BiometricData).count() == 2
+
+    stats = import_biometric_file(db, str(source), organization_id=test_organization.id, batch_size=2,
+                                  batches_per_transaction=1, checkpoint="readings")
+    assert (stats.rows_imported, stats.rows_duplicate) == (4, 0)
+    assert db.query(BiometricData).count() == 4
+
+def test_import_rejects_users_of_other_organizations(db, test_user, test_organization, tmp_path):
+    other_organization = Organization(name="Other", contact_email="other@org.com")
+    db.add(other_organization)
+    db.commit()
+    outsider = User(email="outsider@example.com", role=UserRole.USER, organization_id=other_organization.id)
+    db.add(outsider)
+    db.commit()
+
+    source = tmp_path / "readings.csv"
+    _write_csv(source, [
+        (test_user.id, "face", 1.0, "2024-01-01T00:00:00", ""),
+        (outsider.id, "face", 2.0, "2024-01-01T00:00:01", ""),
+        (9999, "face", 3.0, "2024-01-01T00:00:02", ""),
+    ])
+    stats = import_biometric_file(db, str(source), organization_id=test_organization.id)
+
+    assert (stats.rows_imported, stats.rows_rejected) == (1, 2)
+    assert [error["row"] for error in stats.errors] == [1, 2]
+    assert "does not belong to organization" in stats.errors[0]["error"]
+    assert db.query(BiometricData.user_id).all() == [(test_user.id,)]
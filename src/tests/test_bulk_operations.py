@@ -0,0 +1,130 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+
+from app.config import settings
+from app.models.models import AccessLog, BiometricData, BiometricDataType, BulkJob
+from app.utils.auth import create_access_token
+
+API_PREFIX = "/api/v1"
+
+@pytest.fixture
+def readings(db, test_user, test_organization):
+    rows = [
+        BiometricData(
+            user_id=test_user.id,
+            organization_id=test_organization.id,
+            data_type=BiometricDataType.FACE if i % 2 else BiometricDataType.VOICE,
+            value=float(i),
+            timestamp=datetime(2024, 1, i + 1),
+            data_metadata={}
+        )
+        for i in range(10)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+def _headers(user):
+    token = create_access_token({"sub": user.email, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+def test_bulk_update_by_filter(client, db, test_org_user, readings, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_OPERATION_CHUNK_SIZE", 2)
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-update/",
+        headers=_headers(test_org_user),
+        json={"data_type": "face", "changes": {"value": 0.5}}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    job = response.json()
+    assert job["status"] == "completed"
+    assert job["total"] == job["processed"] == 5
+
+    db.expire_all()
+    values = {row.value for row in db.query(BiometricData).filter(BiometricData.data_type == BiometricDataType.FACE)}
+    assert values == {0.5}
+    assert db.query(AccessLog).filter(AccessLog.action == "bulk_update").count() == 5
+
+def test_bulk_delete_by_ids_and_time_range(client, db, test_org_user, readings):
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=_headers(test_org_user),
+        json={"ids": readings[:6], "start": "2024-01-03T00:00:00"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["processed"] == 4
+    assert db.query(BiometricData).count() == 6
+    assert db.query(AccessLog).filter(AccessLog.action == "bulk_delete").count() == 4
+
+def test_large_bulk_delete_runs_in_background(client, db, test_org_user, readings, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr(settings, "BULK_OPERATION_SYNC_LIMIT", 3)
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=_headers(test_org_user),
+        json={"data_type": "voice"}
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()["job_id"]
+
+    response = client.get(f"{API_PREFIX}/biometric/bulk-jobs/{job_id}", headers=_headers(test_org_user))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "completed"
+    assert response.json()["processed"] == 5
+    assert db.query(BiometricData).count() == 5
+
+def test_bulk_operations_require_a_selection(client, test_org_user, readings):
+    response = client.post(f"{API_PREFIX}/biometric/bulk-delete/", headers=_headers(test_org_user), json={})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_bulk_operations_require_organization_role(client, test_user, readings):
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=_headers(test_user),
+        json={"ids": readings}
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_bulk_ids_are_capped(client, test_org_user, readings, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_OPERATION_MAX_IDS", 3)
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=_headers(test_org_user),
+        json={"ids": readings[:4]}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_failed_sync_job_returns_server_error(client, db, test_org_user, readings, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("secret internal detail")
+
+    headers = _headers(test_org_user)
+    monkeypatch.setattr("app.utils.bulk_operations.unindex", broken)
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=headers,
+        json={"data_type": "voice"}
+    )
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert "secret" not in response.text
+    assert db.query(BiometricData).count() == 10
+
+    job = db.query(BulkJob).one()
+    assert (job.status, job.error) == ("failed", "Bulk operation failed")
+    response = client.get(f"{API_PREFIX}/biometric/bulk-jobs/{job.id}", headers=headers)
+    assert response.json()["status"] == "failed"
+    assert "secret" not in response.text
+
+def test_job_state_is_shared_through_the_database(client, db, test_org_user, readings):
+    response = client.post(
+        f"{API_PREFIX}/biometric/bulk-delete/",
+        headers=_headers(test_org_user),
+        json={"ids": readings[:2]}
+    )
+    job_id = response.json()["job_id"]
+    # Another worker answers from the same row
+    row = db.get(BulkJob, job_id)
+    assert (row.status, row.processed, row.total) == ("completed", 2, 2)
@@ -0,0 +1,131 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+
+from app.config import settings
+from app.models.models import BiometricChange, BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+
+API_PREFIX = "/api/v1"
+
+def _headers(user):
+    token = create_access_token({"sub": user.email, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+def _create(client, headers, value):
+    response = client.post(
+        f"{API_PREFIX}/biometric/",
+        headers=headers,
+        json={"data_type": "fingerprint", "value": value, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["id"]
+
+def _changes(client, headers, since=0, limit=500):
+    response = client.get(f"{API_PREFIX}/biometric/changes/?since={since}&limit={limit}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+def test_changes_since_cursor(client, test_user):
+    headers = _headers(test_user)
+    first = _create(client, headers, 1.0)
+    second = _create(client, headers, 2.0)
+
+    page = _changes(client, headers)
+    assert [(c["type"], c["data_id"]) for c in page["changes"]] == [("upsert", first), ("upsert", second)]
+    assert page["changes"][0]["data"]["value"] == 1.0
+    assert page["has_more"] is False
+    cursor = page["next_cursor"]
+
+    # Nothing new since the cursor
+    assert _changes(client, headers, since=cursor) == {"changes": [], "next_cursor": cursor, "has_more": False}
+
+    client.put(f"{API_PREFIX}/biometric/{first}", headers=headers, json={"value": 5.0})
+    client.delete(f"{API_PREFIX}/biometric/{second}", headers=headers)
+
+    page = _changes(client, headers, since=cursor)
+    assert [(c["type"], c["data_id"]) for c in page["changes"]] == [("upsert", first), ("delete", second)]
+    assert page["changes"][0]["data"]["value"] == 5.0
+    assert page["changes"][1]["data"] is None
+    assert page["next_cursor"] > cursor
+
+def test_only_latest_change_per_record_is_kept(client, db, test_user):
+    headers = _headers(test_user)
+    data_id = _create(client, headers, 1.0)
+    for value in (2.0, 3.0, 4.0):
+        client.put(f"{API_PREFIX}/biometric/{data_id}", headers=headers, json={"value": value})
+
+    assert db.query(BiometricChange).filter(BiometricChange.data_id == data_id).count() == 1
+    changes = _changes(client, headers)["changes"]
+    assert len(changes) == 1 and changes[0]["data"]["value"] == 4.0
+
+def test_pages_are_bounded(client, test_user, monkeypatch):
+    monkeypatch.setattr(settings, "CHANGE_FEED_MAX_PAGE_SIZE", 2)
+    headers = _headers(test_user)
+    ids = [_create(client, headers, float(i)) for i in range(5)]
+
+    seen, cursor, pages = [], 0, 0
+    while True:
+        page = _changes(client, headers, since=cursor, limit=100)
+        assert len(page["changes"]) <= 2
+        seen += [c["data_id"] for c in page["changes"]]
+        cursor = page["next_cursor"]
+        pages += 1
+        if not page["has_more"]:
+            break
+    assert seen == ids
+    assert pages == 3
+
+def test_changes_are_scoped_to_organization(client, db, test_user, test_organization):
+    from app.models.models import Organization, User, UserRole
+    from app.utils.auth import get_password_hash
+
+    _create(client, _headers(test_user), 1.0)
+    other_org = Organization(name="Other Organization")
+    db.add(other_org)
+    db.commit()
+    other = User(email="other@example.com", hashed_password=get_password_hash("password"),
+                 role=UserRole.USER, organization_id=other_org.id)
+    db.add(other)
+    db.commit()
+
+    assert _changes(client, _headers(other))["changes"] == []
+
+def test_bulk_operations_record_changes(client, db, test_user, test_org_user, test_organization):
+    rows = [
+        BiometricData(user_id=test_user.id, organization_id=test_organization.id,
+                      data_type=BiometricDataType.VOICE, value=float(i), timestamp=datetime(2024, 1, i + 1),
+                      data_metadata={})
+        for i in range(4)
+    ]
+    db.add_all(rows)
+    db.commit()
+    ids = [row.id for row in rows]
+    headers = _headers(test_org_user)
+    cursor = _changes(client, headers)["next_cursor"]
+
+    client.post(f"{API_PREFIX}/biometric/bulk-update/", headers=headers,
+                json={"ids": ids[:2], "changes": {"value": 9.0}})
+    client.post(f"{API_PREFIX}/biometric/bulk-delete/", headers=headers, json={"ids": ids[2:]})
+
+    changes = _changes(client, headers, since=cursor)["changes"]
+    assert [(c["type"], c["data_id"]) for c in changes] == [
+        ("upsert", ids[0]), ("upsert", ids[1]), ("delete", ids[2]), ("delete", ids[3])
+    ]
+    assert {c["data"]["value"] for c in changes[:2]} == {9.0}
+
+def test_bulk_import_records_changes(db, test_user, test_organization, tmp_path):
+    import json
+    from app.utils.bulk_import import import_biometric_file
+    from app.utils.change_feed import read_changes
+
+    source = tmp_path / "readings.ndjson"
+    source.write_text("\n".join(json.dumps({
+        "data_type": "voice", "value": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}"
+    }) for i in range(5)), encoding="utf-8")
+    import_biometric_file(db, str(source), organization_id=test_organization.id,
+                          default_user_id=test_user.id, batch_size=2)
+
+    changes, next_cursor, has_more = read_changes(db, test_organization.id, 0, 10)
+    assert sorted(c["data"].value for c in changes) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert next_cursor == changes[-1]["seq"] and has_more is False
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from app.api import biometric
+from app.main import app
+from app.utils.auth import create_access_token
+from app.utils.coalescing import SingleFlight, biometric_data_version, single_flight
+
+API_PREFIX = "/api/v1"
+
+def test_identical_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        time.sleep(0.1)
+        return {"answer": 42}
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run(("analytics", 1), compute) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert results == [{"answer": 42}] * 5
+    assert len(calls) == 1
+    assert (flight.executed, flight.shared) == (1, 4)
+    assert flight.inflight() == 0
+
+def test_different_keys_and_errors_are_not_shared():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.run(("analytics", 1, 1), lambda: 1),
+            flight.run(("analytics", 1, 2), lambda: 2),
+            flight.run(("analytics", 2, 1), fail),
+            flight.run(("analytics", 2, 1), fail),
+            return_exceptions=True
+        )
+
+    first, second, error, shared_error = asyncio.run(scenario())
+    assert (first, second) == (1, 2)
+    assert isinstance(error, ValueError) and shared_error is error
+    assert flight.executed == 3
+
+    # A finished computation is not reused
+    assert asyncio.run(flight.run(("analytics", 1, 1), lambda: 3)) == 3
+
+def test_concurrent_reports_are_coalesced(client, db, test_org_user, monkeypatch):
+    calls = []
+
+    def slow_sketches(session, organization_id, period_days, data_type=None):
+        # The shared computation runs in its own session, not in the leader's request session
+        assert session is not db
+        calls.append(organization_id)
+        time.sleep(0.2)
+        return []
+
+    monkeypatch.setattr(biometric, "_usage_sketches", slow_sketches)
+    token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+    executed = single_flight.executed
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.get(f"{API_PREFIX}/biometric/usage-report/?period_days=7",
+                         headers={"Authorization": f"Bearer {token}"})
+                for _ in range(4)
+            ))
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [200] * 4
+    assert len({response.text for response in responses}) == 1
+    assert len(calls) == 1
+    assert single_flight.executed == executed + 1
+
+def test_data_version_follows_writes(client, db, test_user):
+    from datetime import datetime
+
+    organization_id = test_user.organization_id
+    version = biometric_data_version(db, organization_id)
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    client.post(
+        f"{API_PREFIX}/biometric/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"data_type": "face", "value": 1.0, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+    )
+    assert biometric_data_version(db, organization_id) > version
@@ -0,0 +1,163 @@
+import json
+import pytest
+from datetime import datetime
+from fastapi import status
+from sqlalchemy import insert, select, type_coerce
+from sqlalchemy.types import LargeBinary
+
+from app.database import database
+from app.database.types import (
+    FORMAT_MSGPACK,
+    FORMAT_MSGPACK_ZSTD,
+    FORMAT_MSGPACK_ZSTD_DICT,
+    codec,
+    compression_scope,
+    current_organization,
+)
+from app.models.models import BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+from app.utils.metadata_compaction import compact_metadata, train_dictionary
+from tests.conftest import TestingSessionLocal
+
+API_PREFIX = "/api/v1"
+
+def _device_metadata(i):
+    return {
+        "device": {"vendor": "Acme Biometrics", "model": "FP-2000 Pro", "firmware": f"4.2.{i % 7}"},
+        "capture": {"quality": 80 + i % 20, "sensor": "optical", "resolution_dpi": 500, "finger": "right_index"},
+        "location": {"site": "HQ", "terminal": f"T-{i % 12:03d}"},
+    }
+
+@pytest.fixture(autouse=True)
+def fresh_codec(monkeypatch):
+    # Dictionaries are looked up through database.SessionLocal
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    codec.clear()
+    yield
+    codec.clear()
+
+def _raw(db, data_id):
+    return db.scalar(select(type_coerce(BiometricData.data_metadata, LargeBinary)).where(BiometricData.id == data_id))
+
+def test_codec_roundtrip_and_legacy_values():
+    small = {"a": 1}
+    large = _device_metadata(3)
+    assert codec.encode(small)[0] == FORMAT_MSGPACK
+    assert codec.encode(large)[0] == FORMAT_MSGPACK_ZSTD
+    assert len(codec.encode(large)) < len(json.dumps(large))
+    for value in (small, large, [1, "two", None, 3.5], {}):
+        assert codec.decode(codec.encode(value)) == value
+
+    # Text JSON written before the column became binary
+    assert codec.decode(json.dumps(large)) == large
+    assert codec.decode(json.dumps(large).encode()) == large
+
+def test_api_roundtrip_stores_compact_value(client, db, test_user):
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    metadata = _device_metadata(1)
+    response = client.post(
+        f"{API_PREFIX}/biometric/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"data_type": "fingerprint", "value": 1.0, "timestamp": datetime.utcnow().isoformat(), "data_metadata": metadata}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data_id = response.json()["id"]
+    assert response.json()["data_metadata"] == metadata
+
+    assert _raw(db, data_id)[0] == FORMAT_MSGPACK_ZSTD
+    response = client.get(f"{API_PREFIX}/biometric/{data_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["data_metadata"] == metadata
+
+def test_migration_and_trained_dictionary(db, test_user, test_organization):
+    org_id = test_organization.id
+    rows = [
+        {
+            "user_id": test_user.id, "organization_id": org_id, "data_type": BiometricDataType.FINGERPRINT,
+            "value": float(i), "timestamp": datetime.utcnow(), "data_metadata": _device_metadata(i),
+        }
+        for i in range(400)
+    ]
+    db.execute(insert(BiometricData), rows)
+    db.commit()
+    # Simulate rows written while the column held JSON text
+    legacy_id = db.scalar(select(BiometricData.id).order_by(BiometricData.id))
+    db.connection().exec_driver_sql(
+        "UPDATE biometric_data SET data_metadata = ? WHERE id = ?", (json.dumps(rows[0]["data_metadata"]), legacy_id)
+    )
+    db.commit()
+    assert db.get(BiometricData, legacy_id).data_metadata == rows[0]["data_metadata"]
+
+    stats = compact_metadata(db, org_id, batch_size=150)
+    assert (stats.rows_scanned, stats.rows_rewritten) == (400, 1)
+    assert compact_metadata(db, org_id).rows_rewritten == 0
+
+    dictionary = train_dictionary(db, org_id, size=4096)
+    assert dictionary is not None
+    stats = compact_metadata(db, org_id)
+    assert stats.rows_rewritten == 400
+    assert stats.bytes_after < stats.bytes_before / 2
+
+    raw = _raw(db, legacy_id)
+    assert raw[0] == FORMAT_MSGPACK_ZSTD_DICT
+    # Another process sees the dictionary only through the table
+    codec.clear()
+    db.expire_all()
+    assert [row.data_metadata for row in db.query(BiometricData).order_by(BiometricData.id)] == [
+        row["data_metadata"] for row in rows
+    ]
+
+    # New writes in the organization's session use its dictionary
+    db.info["organization_id"] = org_id
+    data = BiometricData(
+        user_id=test_user.id, organization_id=org_id, data_type=BiometricDataType.FINGERPRINT,
+        value=1.0, timestamp=datetime.utcnow(), data_metadata=_device_metadata(5)
+    )
+    db.add(data)
+    db.commit()
+    assert _raw(db, data.id)[0] == FORMAT_MSGPACK_ZSTD_DICT
+    with compression_scope(None):
+        assert codec.encode(_device_metadata(5))[0] == FORMAT_MSGPACK_ZSTD
+
+def test_flush_reads_dictionary_with_its_session(db, test_user, test_organization, monkeypatch):
+    org_id = test_organization.id
+    rows = [
+        {
+            "user_id": test_user.id, "organization_id": org_id, "data_type": BiometricDataType.FINGERPRINT,
+            "value": float(i), "timestamp": datetime.utcnow(), "data_metadata": _device_metadata(i),
+        }
+        for i in range(400)
+    ]
+    db.execute(insert(BiometricData), rows)
+    db.commit()
+    train_dictionary(db, org_id, size=4096)
+    codec.clear()
+
+    def no_session():
+        raise AssertionError("flush opened a separate session")
+
+    monkeypatch.setattr(database, "SessionLocal", no_session)
+    db.info["organization_id"] = org_id
+    data = BiometricData(
+        user_id=test_user.id, organization_id=org_id, data_type=BiometricDataType.FINGERPRINT,
+        value=1.0, timestamp=datetime.utcnow(), data_metadata=_device_metadata(5)
+    )
+    db.add(data)
+    db.commit()
+    assert _raw(db, data.id)[0] == FORMAT_MSGPACK_ZSTD_DICT
+
+def test_failed_flush_resets_compression_scope(db, test_user, test_organization):
+    db.info["organization_id"] = test_organization.id
+    db.add(BiometricData(
+        id=1, user_id=test_user.id, organization_id=test_organization.id, data_type=BiometricDataType.FACE,
+        value=1.0, timestamp=datetime.utcnow(), data_metadata={}
+    ))
+    db.commit()
+    db.add(BiometricData(
+        id=1, user_id=test_user.id, organization_id=test_organization.id, data_type=BiometricDataType.FACE,
+        value=2.0, timestamp=datetime.utcnow(), data_metadata={}
+    ))
+    with pytest.raises(Exception):
+        db.commit()
+    db.rollback()
+    assert current_organization() is None
+
@@ -0,0 +1,286 @@
+import pytest
+from datetime import datetime
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.database import Base, ReplicaRouter
+from app.models.models import AccessLog, Organization
+
+def _memory_sessionmaker():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def replica_setup(monkeypatch):
+    primary = _memory_sessionmaker()
+    replica = _memory_sessionmaker()
+    router = ReplicaRouter(primary, [replica], sticky_seconds=5.0)
+    monkeypatch.setattr("app.database.database.replica_router", router)
+    return router, primary, replica
+
+def test_reads_go_to_replica_without_writes(replica_setup):
+    router, primary, replica = replica_setup
+    assert router.read_session_factory("client-a") is replica
+    assert router.read_session_factory(None) is replica
+
+def test_read_your_writes_stickiness(replica_setup):
+    router, primary, replica = replica_setup
+    db = primary()
+    db.info["sticky_key"] = "client-a"
+    db.add(Organization(name="Org", contact_email="org@example.com"))
+    db.commit()
+    db.close()
+
+    assert router.read_session_factory("client-a") is primary
+    assert router.read_session_factory("client-b") is replica
+
+    router.sticky_seconds = 0
+    assert router.read_session_factory("client-a") is replica
+
+def test_audit_writes_are_not_sticky(replica_setup):
+    router, primary, replica = replica_setup
+    db = primary()
+    db.info["sticky_key"] = "client-a"
+    db.add(AccessLog(user_id=1, organization_id=1, action="read", details={}, timestamp=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    assert router.read_session_factory("client-a") is replica
+
+def test_without_replicas_reads_use_primary():
+    primary = _memory_sessionmaker()
+    router = ReplicaRouter(primary, [], sticky_seconds=5.0)
+    assert router.read_session_factory("client-a") is primary
+
+@pytest.fixture
+def sharding(tmp_path, monkeypatch):
+    from app.database.database import ShardRouter
+
+    router = ShardRouter("per_org", f"sqlite:///{tmp_path}/org_{{shard}}.db", shard_count=4)
+    monkeypatch.setattr("app.database.database.shard_router", router)
+    return router
+
+def _shard_rows(router, organization_id, model):
+    from sqlalchemy.orm import Session
+
+    with Session(bind=router.engine_for(organization_id)) as session:
+        return session.query(model).all()
+
+def test_hash_sharding_places_organizations():
+    from app.database.database import ShardRouter
+
+    router = ShardRouter("hash", "sqlite:///:memory:", shard_count=4)
+    assert [router.shard_for(org_id) for org_id in (1, 4, 6)] == [1, 0, 2]
+    assert router.shards([1, 6]) == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        ShardRouter("range", "sqlite:///:memory:", shard_count=4)
+
+def test_sharded_session_routes_organization_tables(sharding):
+    from app.database.database import ShardedSession
+
+    primary = _memory_sessionmaker()
+    Sharded = sessionmaker(autocommit=False, autoflush=False, bind=primary.kw["bind"], class_=ShardedSession)
+    db = Sharded()
+    org = Organization(name="Org", contact_email="org@example.com")
+    db.add(org)
+    db.commit()
+    org_id = org.id
+
+    db.info["organization_id"] = org_id
+    db.add(AccessLog(user_id=1, organization_id=org_id, action="create", details={}))
+    db.commit()
+    assert db.query(AccessLog).count() == 1
+    db.close()
+
+    with primary() as session:
+        assert session.query(Organization).count() == 1
+        assert session.query(AccessLog).count() == 0
+    assert len(_shard_rows(sharding, org_id, AccessLog)) == 1
+
+    with Sharded() as session:
+        with pytest.raises(RuntimeError):
+            session.query(AccessLog).all()
+
+def test_sharded_requests_and_fan_out(sharding, db, test_user, test_admin, test_organization):
+    from app.main import app
+    from app.database.database import SHARD_ID_BITS, ShardedSession, get_db, get_read_db
+    from app.models.models import BiometricData, User, UserRole
+    from app.utils.auth import create_access_token, get_password_hash
+    from fastapi.testclient import TestClient
+    from tests.conftest import engine
+
+    other_org = Organization(name="Other", contact_email="other@org.com")
+    db.add(other_org)
+    db.commit()
+    other_user = User(
+        email="other@example.com", hashed_password=get_password_hash("pw"),
+        role=UserRole.USER, organization_id=other_org.id
+    )
+    unassigned_admin = User(
+        email="root@example.com", hashed_password=get_password_hash("pw"), role=UserRole.ADMIN
+    )
+    db.add_all([other_user, unassigned_admin])
+    db.commit()
+    org_ids = (test_organization.id, other_org.id)
+    tokens = [
+        create_access_token({"sub": user.email, "role": user.role})
+        for user in (test_user, other_user, test_admin, unassigned_admin)
+    ]
+
+    Sharded = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=ShardedSession)
+
+    def override_get_db(request: Request):
+        session = Sharded()
+        session.info["request_state"] = request.state
+        try:
+            yield session
+        finally:
+            session.close()
+
+    overrides = {get_db: override_get_db, get_read_db: override_get_db}
+    saved = {key: app.dependency_overrides.get(key) for key in overrides}
+    app.dependency_overrides.update(overrides)
+    try:
+        client = TestClient(app)
+        created = []
+        for token in tokens[:2]:
+            response = client.post(
+                "/api/v1/biometric/",
+                headers={"Authorization": f"Bearer {token}"},
+                json={"data_type": "face", "value": 1.0, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+            )
+            assert response.status_code == 200
+            created.append(response.json()["id"])
+        # Every shard allocates ids from its own range
+        assert [data_id >> SHARD_ID_BITS for data_id in created] == list(org_ids)
+
+        response = client.get("/api/v1/biometric/", headers={"Authorization": f"Bearer {tokens[1]}"})
+        assert [item["organization_id"] for item in response.json()] == [org_ids[1]]
+
+        response = client.get(f"/api/v1/biometric/{created[0]}", headers={"Authorization": f"Bearer {tokens[1]}"})
+        assert response.status_code == 403
+        response = client.get(f"/api/v1/biometric/{created[1] + 1}", headers={"Authorization": f"Bearer {tokens[1]}"})
+        assert response.status_code == 404
+
+        response = client.get(f"/api/v1/biometric/{created[0]}", headers={"Authorization": f"Bearer {tokens[3]}"})
+        assert response.status_code == 403
+        assert response.json()["detail"] == "User must be associated with an organization"
+
+        response = client.get("/api/v1/biometric/access-logs/", headers={"Authorization": f"Bearer {tokens[2]}"})
+        assert response.status_code == 200
+        logs = response.json()
+        assert sorted(log["organization_id"] for log in logs) == sorted(org_ids)
+        assert len({log["id"] for log in logs}) == len(logs)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                app.dependency_overrides.pop(key, None)
+            else:
+                app.dependency_overrides[key] = value
+
+    for org_id in org_ids:
+        assert len(_shard_rows(sharding, org_id, BiometricData)) == 1
+    assert db.query(BiometricData).count() == 0
+
+# Schema of the tables as they were before columns were added to the models
+BASELINE_SCHEMA = [
+    "CREATE TABLE organizations (id INTEGER NOT NULL, name VARCHAR, contact_email VARCHAR, "
+    "created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id))",
+    "CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR, hashed_password VARCHAR, role VARCHAR(12), "
+    "organization_id INTEGER, created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(organization_id) REFERENCES organizations (id))",
+    "CREATE TABLE biometric_data (id INTEGER NOT NULL, user_id INTEGER, organization_id INTEGER, "
+    "data_type VARCHAR(11), value FLOAT, timestamp DATETIME, data_metadata VARCHAR, created_at DATETIME, "
+    "updated_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id), "
+    "FOREIGN KEY(organization_id) REFERENCES organizations (id))",
+    "CREATE TABLE access_logs (id INTEGER NOT NULL, user_id INTEGER, organization_id INTEGER, action VARCHAR, "
+    "details VARCHAR, timestamp DATETIME, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id), "
+    "FOREIGN KEY(organization_id) REFERENCES organizations (id))",
+    "INSERT INTO organizations (id, name, contact_email) VALUES (1, 'Legacy', 'legacy@org.com')",
+    "INSERT INTO users (id, email, hashed_password, role, organization_id) "
+    "VALUES (1, 'legacy@example.com', 'x', 'USER', 1)",
+    "INSERT INTO biometric_data (id, user_id, organization_id, data_type, value, timestamp, data_metadata, "
+    "created_at, updated_at) VALUES (1, 1, 1, 'FACE', 1.5, '2024-01-01 00:00:00.000000', '{\"device\": \"a\"}', "
+    "'2024-01-01 00:00:00.000000', '2024-01-01 00:00:00.000000')",
+]
+
+def _baseline_engine(path):
+    import sqlite3
+
+    connection = sqlite3.connect(path)
+    for statement in BASELINE_SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+def test_app_boots_on_baseline_database(tmp_path, monkeypatch):
+    from sqlalchemy import inspect
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.config import settings
+    from app.database.database import create_schema, get_db, get_read_db
+    from app.utils.auth import create_access_token
+
+    engine = _baseline_engine(str(tmp_path / "baseline.db"))
+    with engine.begin() as connection:
+        # Timeline index as first shipped, keyed without id
+        connection.exec_driver_sql(
+            "CREATE INDEX ix_biometric_data_timeline ON biometric_data "
+            "(organization_id, user_id, data_type, timestamp, value)"
+        )
+    create_schema(engine)
+    columns = {column["name"] for column in inspect(engine).get_columns("biometric_data")}
+    assert {"anomaly_score", "ingest_key", "ingest_hash"} <= columns
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("biometric_data")}
+    assert "ix_biometric_data_timeline_position" in indexes
+    # Idempotent ingest relies on the unique index to settle concurrent retries
+    assert indexes["uq_biometric_data_ingest_key"]["unique"]
+    assert indexes["uq_biometric_data_ingest_key"]["column_names"] == ["organization_id", "ingest_key"]
+    assert "ix_biometric_data_timeline" not in indexes
+    # Running it again on a migrated database changes nothing
+    create_schema(engine)
+
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setattr("app.database.database.SessionLocal", Session)
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", False)
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, override_get_db)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'legacy@example.com', 'role': 'user'})}"}
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/biometric/", headers=headers, json={
+            "data_type": "face", "value": 2.0, "timestamp": "2024-01-02T00:00:00", "data_metadata": {}
+        })
+        assert response.status_code == 200
+        response = client.get("/api/v1/biometric/", headers=headers)
+        assert sorted(item["value"] for item in response.json()) == [1.5, 2.0]
+        # Rows written before the migration keep their JSON text metadata
+        response = client.put("/api/v1/biometric/1", headers=headers, json={"value": 3.0})
+        assert response.json()["data_metadata"] == {"device": "a"}
+        response = client.post("/api/v1/biometric/batch-get/", headers=headers, json={"ids": [1, 2]})
+        assert response.json()["missing"] == []
+
+def test_shards_are_migrated(tmp_path):
+    from sqlalchemy import inspect
+    from app.database.database import ShardRouter
+
+    _baseline_engine(str(tmp_path / "org_1.db"))
+    router = ShardRouter("per_org", f"sqlite:///{tmp_path}/org_{{shard}}.db", shard_count=4)
+    columns = {column["name"] for column in inspect(router.engine(1)).get_columns("biometric_data")}
+    assert {"anomaly_score", "ingest_key"} <= columns
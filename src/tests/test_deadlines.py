@@ -0,0 +1,162 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Request, status
+from sqlalchemy import text
+
+from app.api import biometric
+from app.config import settings
+from app.database.database import get_read_db
+from app.main import app
+from app.utils.auth import create_access_token
+from app.utils.coalescing import SingleFlight
+from app.utils.deadlines import Deadline, DeadlineExceeded, DeadlineMiddleware, parse_timeout
+
+API_PREFIX = "/api/v1"
+
+# Counts far enough to take minutes unless interrupted
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+    "SELECT count(*) FROM (SELECT x FROM c LIMIT 1000000000)"
+)
+
+def test_expired_deadline_interrupts_statement(db):
+    db.info["request_state"] = SimpleNamespace(deadline=Deadline(0.05))
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        db.execute(SLOW_QUERY)
+    assert time.monotonic() - started < 5
+    db.rollback()
+
+    # Without a deadline statements run as before
+    db.info.pop("request_state")
+    assert db.execute(text("SELECT 1")).scalar() == 1
+
+def test_cancelled_deadline_interrupts_statement(db):
+    deadline = Deadline()
+    db.info["request_state"] = SimpleNamespace(deadline=deadline)
+    deadline.cancel()
+    with pytest.raises(DeadlineExceeded):
+        db.execute(SLOW_QUERY)
+    db.rollback()
+    db.info.pop("request_state")
+
+def test_route_returns_504_after_client_timeout(client, db, test_org_user, monkeypatch):
+    def read_db(request: Request):
+        db.info["request_state"] = request.state
+        yield db
+
+    app.dependency_overrides[get_read_db] = read_db
+    monkeypatch.setattr(biometric, "_all_access_logs", lambda session: session.execute(SLOW_QUERY).all())
+    token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+
+    started = time.monotonic()
+    response = client.get(
+        f"{API_PREFIX}/biometric/access-logs/",
+        headers={"Authorization": f"Bearer {token}", "X-Request-Timeout": "0.2"}
+    )
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert response.json() == {"detail": "Request deadline exceeded"}
+    assert time.monotonic() - started < 5
+    db.info.pop("request_state", None)
+
+def test_client_disconnect_cancels_route_query(client, db, test_org_user, monkeypatch):
+    def read_db(request: Request):
+        db.info["request_state"] = request.state
+        yield db
+
+    app.dependency_overrides[get_read_db] = read_db
+    monkeypatch.setattr(biometric, "read_changes", lambda session, *args: session.execute(SLOW_QUERY).all())
+    token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "root_path": "",
+        "path": f"{API_PREFIX}/biometric/changes/", "raw_path": f"{API_PREFIX}/biometric/changes/".encode(),
+        "query_string": b"", "headers": [(b"authorization", f"Bearer {token}".encode())],
+        "client": ("testclient", 50000), "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # The client goes away while the query runs
+        await asyncio.sleep(0.2)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    started = time.monotonic()
+    asyncio.run(app(scope, receive, send))
+    assert time.monotonic() - started < 5
+    assert sent[0]["status"] == status.HTTP_504_GATEWAY_TIMEOUT
+    db.info.pop("request_state", None)
+
+def test_invalid_timeout_header(client, test_org_user):
+    token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+    for value in ("soon", "0", "-1"):
+        response = client.get(
+            f"{API_PREFIX}/biometric/access-logs/",
+            headers={"Authorization": f"Bearer {token}", "X-Request-Timeout": value}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_route_policy_caps_client_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_REQUEST_TIMEOUT", 60.0)
+    assert parse_timeout("3600") == 60.0
+
+    deadline = Deadline(60.0)
+    deadline.limit(settings.REQUEST_TIMEOUTS["read"])
+    deadline.limit(None)
+    deadline.limit(1000.0)
+    assert deadline.expires_at == pytest.approx(deadline.started + settings.REQUEST_TIMEOUTS["read"])
+
+def test_client_disconnect_cancels_deadline():
+    seen = []
+
+    async def endpoint(scope, receive, send):
+        deadline = scope["state"]["deadline"]
+        for _ in range(100):
+            if deadline.cancelled:
+                break
+            await asyncio.sleep(0.01)
+        seen.append(deadline.cancelled)
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "headers": []}
+    asyncio.run(DeadlineMiddleware(endpoint)(scope, receive, send))
+    assert seen == [True]
+
+def test_coalesced_followers_retry_after_leader_deadline():
+    flight = SingleFlight()
+    deadline = Deadline()
+    deadline.cancel()
+
+    def leader():
+        time.sleep(0.05)
+        raise DeadlineExceeded(deadline)
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.run("key", leader, retry_on=(DeadlineExceeded,)),
+            flight.run("key", lambda: "ok", retry_on=(DeadlineExceeded,)),
+            return_exceptions=True
+        )
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, DeadlineExceeded)
+    assert second == "ok"
+    assert flight.executed == 2
@@ -0,0 +1,124 @@
+import gzip
+import json
+import msgpack
+import pyarrow
+import pyarrow.ipc
+import pytest
+import zstandard
+from datetime import datetime
+from fastapi import status
+
+from app.models.models import BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+from app.utils.encoding import negotiate_encoding, negotiate_media_type, available_encodings
+
+API_PREFIX = "/api/v1"
+
+@pytest.fixture
+def many_readings(db, test_user, test_organization):
+    db.add_all([
+        BiometricData(
+            user_id=test_user.id,
+            organization_id=test_organization.id,
+            data_type=BiometricDataType.FACE,
+            value=float(i),
+            timestamp=datetime(2024, 1, 1),
+            data_metadata={"device": "terminal-1", "quality": "high"}
+        )
+        for i in range(50)
+    ])
+    db.commit()
+
+def _headers(user, **extra):
+    token = create_access_token({"sub": user.email, "role": user.role})
+    return {"Authorization": f"Bearer {token}", **extra}
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0.5, identity") == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0") is None
+    assert negotiate_encoding("*") == available_encodings()[0]
+
+def test_negotiate_media_type():
+    assert negotiate_media_type("", tabular=False) == "json"
+    assert negotiate_media_type("text/html, */*;q=0.8", tabular=True) == "json"
+    # Clients that never asked for a binary format keep getting JSON
+    assert negotiate_media_type("text/html", tabular=False) == "json"
+    assert negotiate_media_type("text/html, application/xml;q=0.9", tabular=True) == "json"
+
+def test_large_list_is_gzip_compressed(client, test_user, many_readings):
+    response = client.get(
+        f"{API_PREFIX}/biometric/",
+        headers=_headers(test_user, **{"Accept-Encoding": "gzip"})
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 50
+
+def test_declared_codecs_are_negotiated():
+    # brotli and zstandard are required dependencies, so every encoding is offered
+    assert available_encodings() == ["zstd", "br", "gzip"]
+
+def test_large_list_with_brotli_and_zstd(client, test_user, many_readings):
+    response = client.get(f"{API_PREFIX}/biometric/", headers=_headers(test_user, **{"Accept-Encoding": "br"}))
+    assert response.headers["content-encoding"] == "br"
+    # httpx decodes br itself when brotli is installed
+    assert len(response.json()) == 50
+
+    response = client.get(f"{API_PREFIX}/biometric/", headers=_headers(test_user, **{"Accept-Encoding": "zstd"}))
+    assert response.headers["content-encoding"] == "zstd"
+    body = zstandard.ZstdDecompressor().decompressobj().decompress(response.content)
+    assert len(json.loads(body)) == 50
+
+def test_small_response_is_not_compressed(client, test_user, test_biometric_data):
+    response = client.get(
+        f"{API_PREFIX}/biometric/{test_biometric_data.id}",
+        headers=_headers(test_user, **{"Accept-Encoding": "gzip"})
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert "content-encoding" not in response.headers
+
+def test_list_as_msgpack(client, test_user, many_readings):
+    response = client.get(
+        f"{API_PREFIX}/biometric/",
+        headers=_headers(test_user, Accept="application/msgpack")
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/msgpack"
+    rows = msgpack.unpackb(response.content)
+    assert len(rows) == 50
+    assert rows[0]["data_metadata"] == {"device": "terminal-1", "quality": "high"}
+
+def test_list_as_arrow(client, test_user, many_readings):
+    response = client.get(
+        f"{API_PREFIX}/biometric/",
+        headers=_headers(test_user, Accept="application/vnd.apache.arrow.stream")
+    )
+    assert response.status_code == status.HTTP_200_OK
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 50
+    assert sorted(table.column("value").to_pylist()) == [float(i) for i in range(50)]
+
+def test_arrow_is_not_acceptable_for_analytics(client, test_user, test_biometric_data):
+    response = client.get(
+        f"{API_PREFIX}/biometric/analytics/",
+        params={"data_type": BiometricDataType.FINGERPRINT.value},
+        headers=_headers(test_user, Accept="application/vnd.apache.arrow.stream")
+    )
+    assert response.status_code == status.HTTP_406_NOT_ACCEPTABLE
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/analytics/",
+        params={"data_type": BiometricDataType.FINGERPRINT.value},
+        headers=_headers(test_user, Accept="application/vnd.apache.arrow.stream, application/json;q=0.5")
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["count"] == 1
+
+def test_unknown_accept_falls_back_to_json(client, test_user, test_biometric_data):
+    response = client.get(f"{API_PREFIX}/biometric/", headers=_headers(test_user, Accept="text/html"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()) == 1
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import socket
+import threading
+import pytest
+import httpx
+import uvicorn
+from datetime import datetime
+
+from app.config import settings
+from app.main import app
+from app.models.models import BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+from app.utils.events import EventHub, SQLiteEventBroker, event_stream, hub
+from app.utils.latest_readings import latest_readings
+
+async def _next_event(subscription):
+    return await asyncio.wait_for(subscription.queue.get(), timeout=1)
+
+def test_commits_publish_created_updated_deleted(db, test_user, test_organization):
+    async def scenario():
+        subscription = hub.subscribe(test_organization.id, 10)
+        other = hub.subscribe(test_organization.id + 1, 10)
+        try:
+            data = BiometricData(
+                user_id=test_user.id,
+                organization_id=test_organization.id,
+                data_type=BiometricDataType.IRIS,
+                value=1.0,
+                timestamp=datetime.utcnow(),
+                data_metadata={}
+            )
+            db.add(data)
+            db.commit()
+            created = await _next_event(subscription)
+            assert created["type"] == "created"
+            assert created["data"]["id"] == data.id
+
+            data.value = 2.0
+            db.commit()
+            updated = await _next_event(subscription)
+            assert updated["type"] == "updated"
+            assert updated["data"]["value"] == 2.0
+
+            db.delete(data)
+            db.commit()
+            deleted = await _next_event(subscription)
+            assert deleted["type"] == "deleted"
+
+            await asyncio.sleep(0)
+            assert other.queue.empty()
+        finally:
+            hub.unsubscribe(subscription)
+            hub.unsubscribe(other)
+
+    asyncio.run(scenario())
+
+def test_rollback_discards_events(db, test_user, test_organization):
+    async def scenario():
+        subscription = hub.subscribe(test_organization.id, 10)
+        try:
+            db.add(BiometricData(
+                user_id=test_user.id,
+                organization_id=test_organization.id,
+                data_type=BiometricDataType.IRIS,
+                value=1.0,
+                timestamp=datetime.utcnow(),
+                data_metadata={}
+            ))
+            db.flush()
+            db.rollback()
+            await asyncio.sleep(0.01)
+            assert subscription.queue.empty()
+        finally:
+            hub.unsubscribe(subscription)
+
+    asyncio.run(scenario())
+
+def test_slow_consumer_is_disconnected():
+    async def scenario():
+        local_hub = EventHub()
+        subscription = local_hub.subscribe(1, 2)
+        for i in range(3):
+            local_hub.publish({"type": "created", "organization_id": 1, "data": {"id": i}})
+        await asyncio.sleep(0.01)
+        assert subscription.overflowed
+
+        async def connected():
+            return False
+
+        chunks = [chunk async for chunk in event_stream(subscription, connected, 1)]
+        assert chunks[-1].startswith("event: overflow")
+
+    asyncio.run(scenario())
+
+def test_broker_delivers_events_across_workers(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "events.db")
+        worker_a, worker_b = EventHub(), EventHub()
+        worker_a.broker = SQLiteEventBroker(path, worker_a)
+        worker_b.broker = SQLiteEventBroker(path, worker_b)
+        subscription_a = worker_a.subscribe(1, 10)
+        subscription_b = worker_b.subscribe(1, 10)
+
+        worker_a.publish({"type": "created", "organization_id": 1, "data": {"id": 7}})
+
+        assert worker_b.broker.poll_once() == 1
+        assert (await _next_event(subscription_b))["data"]["id"] == 7
+        # the origin worker does not receive its own event twice
+        assert worker_a.broker.poll_once() == 0
+        assert (await _next_event(subscription_a))["data"]["id"] == 7
+        assert subscription_a.queue.empty()
+
+    asyncio.run(scenario())
+
+def _reading(user_id, organization_id, value=1.0):
+    return BiometricData(
+        user_id=user_id,
+        organization_id=organization_id,
+        data_type=BiometricDataType.IRIS,
+        value=value,
+        timestamp=datetime.utcnow(),
+        data_metadata={}
+    )
+
+def test_snapshots_are_built_only_for_an_audience(db, test_user, test_organization, monkeypatch):
+    user_id, organization_id = test_user.id, test_organization.id
+
+    def no_snapshot(obj):
+        raise AssertionError("snapshot built without subscribers")
+
+    monkeypatch.setattr("app.utils.events.snapshot", no_snapshot)
+    latest_readings.warm(db)
+    data = _reading(user_id, organization_id, 5.0)
+    db.add(data)
+    db.flush()
+    # Without subscribers only the latest-reading index listens, and it gets the short form
+    (item,) = db.info["biometric_events"]
+    assert item["partial"] and "data_metadata" not in item["data"]
+    db.commit()
+    assert latest_readings.get(db, user_id, BiometricDataType.IRIS).value == 5.0
+
+    monkeypatch.setattr(hub, "_listeners", [])
+    db.add(_reading(user_id, organization_id))
+    db.flush()
+    assert "biometric_events" not in db.info
+    db.commit()
+
+@pytest.fixture
+def live_server(client):
+    # The test client buffers whole responses, so the endless stream is read from a real server
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        thread.join(0.01)
+    yield "http://127.0.0.1:%d" % sock.getsockname()[1]
+    server.should_exit = True
+    thread.join(5)
+    sock.close()
+
+def test_sse_endpoint_streams_committed_changes(live_server, db, test_user, test_organization, monkeypatch):
+    monkeypatch.setattr(settings, "EVENT_HEARTBEAT_SECONDS", 0.1)
+    user_id, organization_id = test_user.id, test_organization.id
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': test_user.email, 'role': test_user.role})}"}
+
+    with httpx.Client(base_url=live_server, timeout=5) as http:
+        with http.stream("GET", "/api/v1/biometric/events/", headers=headers) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            lines = response.iter_lines()
+            assert next(lines) == "retry: 3000"
+            assert hub.subscriber_count(organization_id) == 1
+
+            data = _reading(user_id, organization_id, 7.0)
+            db.add(data)
+            db.commit()
+            data_id = data.id
+
+            # Heartbeats may come first
+            event_line = next(line for line in lines if line.startswith("event:"))
+            assert event_line == "event: created"
+            payload = json.loads(next(lines)[len("data: "):])
+            assert (payload["id"], payload["value"]) == (data_id, 7.0)
+
+    # The heartbeat notices the closed connection and drops the subscription
+    for _ in range(50):
+        if hub.subscriber_count(organization_id) == 0:
+            break
+        threading.Event().wait(0.05)
+    assert hub.subscriber_count(organization_id) == 0
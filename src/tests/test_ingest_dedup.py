@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+from fastapi import status
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.models.models import AccessLog, BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+from app.utils.bulk_import import import_biometric_file
+from app.utils.ingest_dedup import content_key, find_duplicate
+
+API_PREFIX = "/api/v1"
+READING = {"data_type": "face", "value": 0.75, "timestamp": "2024-05-01T08:00:00", "data_metadata": {"a": 1, "b": 2}}
+
+def _headers(user, **extra):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email, 'role': user.role})}", **extra}
+
+def test_retried_upload_returns_original(client, db, test_user):
+    headers = _headers(test_user)
+    first = client.post(f"{API_PREFIX}/biometric/", headers=headers, json=READING)
+    # Same reading with metadata keys in another order
+    retry = client.post(f"{API_PREFIX}/biometric/", headers=headers,
+                        json={**READING, "data_metadata": {"b": 2, "a": 1}})
+
+    assert first.status_code == retry.status_code == status.HTTP_200_OK
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert db.query(BiometricData).count() == 1
+    assert db.query(AccessLog).filter(AccessLog.action == "create").count() == 1
+
+    changed = client.post(f"{API_PREFIX}/biometric/", headers=headers, json={**READING, "value": 0.8})
+    assert changed.json()["id"] != first.json()["id"]
+
+def test_idempotency_key(client, db, test_user, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_CONTENT_DEDUPLICATION", False)
+    headers = _headers(test_user)
+
+    # Without a key identical readings are stored when content deduplication is off
+    client.post(f"{API_PREFIX}/biometric/", headers=headers, json=READING)
+    client.post(f"{API_PREFIX}/biometric/", headers=headers, json=READING)
+    assert db.query(BiometricData).count() == 2
+
+    keyed = {**headers, "Idempotency-Key": "upload-1"}
+    first = client.post(f"{API_PREFIX}/biometric/", headers=keyed, json={**READING, "value": 1.0})
+    retry = client.post(f"{API_PREFIX}/biometric/", headers=keyed, json={**READING, "value": 1.0})
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert db.query(BiometricData).count() == 3
+
+    # A reused key with another payload is rejected instead of replayed
+    reused = client.post(f"{API_PREFIX}/biometric/", headers=keyed, json={**READING, "value": 2.0})
+    assert reused.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "Idempotent-Replayed" not in reused.headers
+    assert db.query(BiometricData).count() == 3
+
+def test_duplicate_lookup_is_one_index_probe(client, db, test_user):
+    user_id, organization_id = test_user.id, test_user.organization_id
+    client.post(f"{API_PREFIX}/biometric/", headers=_headers(test_user), json=READING)
+    key = db.query(BiometricData.ingest_key).scalar()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        assert find_duplicate(db, organization_id, key).user_id == user_id
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    (statement, parameters), = statements
+    plan = " ".join(row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+    assert "USING INDEX uq_biometric_data_ingest_key (organization_id=? AND ingest_key=?)" in plan
+
+def test_ingest_key_is_unique_per_organization(db, test_user):
+    organization_id = test_user.organization_id
+    reading = dict(user_id=test_user.id, organization_id=organization_id, data_type=BiometricDataType.FACE, value=1.0,
+                   timestamp=datetime(2024, 5, 1), data_metadata={}, ingest_key="k:same")
+    db.add(BiometricData(**reading))
+    db.commit()
+    db.add(BiometricData(**reading))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+    # Rows without a key are never considered duplicates
+    db.add_all([BiometricData(**{**reading, "ingest_key": None}) for _ in range(2)])
+    db.commit()
+    assert db.query(BiometricData).count() == 3
+
+def test_bulk_import_skips_known_and_repeated_rows(db, test_user, test_organization, tmp_path):
+    user_id, organization_id = test_user.id, test_organization.id
+    source = tmp_path / "readings.csv"
+    lines = ["user_id,data_type,value,timestamp,data_metadata"]
+    lines += [f"{user_id},voice,{i},2024-01-01T00:00:0{i},{{}}" for i in range(5)]
+    lines.append(f"{user_id},voice,0,2024-01-01T00:00:00,{{}}")
+    source.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    stats = import_biometric_file(db, str(source), organization_id=organization_id, batch_size=4)
+    assert (stats.rows_imported, stats.rows_duplicate) == (5, 1)
+
+    # Re-uploading the same file writes nothing
+    stats = import_biometric_file(db, str(source), organization_id=organization_id, batch_size=4, drop_indexes=True)
+    assert (stats.rows_imported, stats.rows_duplicate) == (0, 6)
+    assert db.query(BiometricData).count() == 5
+
+    row = db.query(BiometricData).order_by(BiometricData.id).first()
+    assert row.ingest_key == content_key(user_id, row.data_type, row.value, row.timestamp, {})
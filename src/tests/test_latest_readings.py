@@ -0,0 +1,151 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+from sqlalchemy import insert
+
+from app.config import settings
+from app.database import database
+from app.models.models import BiometricData, BiometricDataType
+from app.utils.auth import create_access_token
+from app.utils.events import EVENT_CREATED
+from app.utils.latest_readings import latest_readings
+
+API_PREFIX = "/api/v1"
+
+@pytest.fixture(autouse=True)
+def single_worker(monkeypatch):
+    monkeypatch.setattr(settings, "LATEST_READINGS_SINGLE_WORKER", True)
+
+def _headers(user):
+    token = create_access_token({"sub": user.email, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+def _create(client, headers, data_type, value, timestamp):
+    response = client.post(
+        f"{API_PREFIX}/biometric/",
+        headers=headers,
+        json={"data_type": data_type, "value": value, "timestamp": timestamp, "data_metadata": {}}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["id"]
+
+def _latest(client, headers, **params):
+    response = client.get(f"{API_PREFIX}/biometric/latest/", headers=headers, params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return {item["data_type"]: (item["data_id"], item["value"]) for item in response.json()}
+
+def _seed(db, user, organization):
+    rows = [
+        BiometricData(user_id=user.id, organization_id=organization.id, data_type=data_type,
+                      value=value, timestamp=timestamp, data_metadata={})
+        for data_type, value, timestamp in [
+            (BiometricDataType.FACE, 1.0, datetime(2024, 1, 1)),
+            (BiometricDataType.FACE, 2.0, datetime(2024, 1, 3)),
+            (BiometricDataType.FACE, 3.0, datetime(2024, 1, 2)),
+            (BiometricDataType.VOICE, 4.0, datetime(2024, 1, 1)),
+        ]
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+def test_warm_index_serves_latest_without_database(client, db, test_user, test_organization, monkeypatch):
+    ids = _seed(db, test_user, test_organization)
+    assert latest_readings.warm(db) == 2
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("index lookup hit the database")
+
+    monkeypatch.setattr(latest_readings, "_load", no_database)
+    headers = _headers(test_user)
+    assert _latest(client, headers) == {"face": (ids[1], 2.0), "voice": (ids[3], 4.0)}
+    assert _latest(client, headers, data_type="voice") == {"voice": (ids[3], 4.0)}
+    assert _latest(client, headers, data_type="iris") == {}
+
+def test_index_follows_writes(client, db, test_user, test_organization):
+    ids = _seed(db, test_user, test_organization)
+    latest_readings.warm(db)
+    headers = _headers(test_user)
+
+    # Older readings do not replace the latest one, newer ones do
+    _create(client, headers, "face", 5.0, "2023-12-31T00:00:00")
+    assert _latest(client, headers)["face"] == (ids[1], 2.0)
+    newest = _create(client, headers, "face", 6.0, "2024-02-01T00:00:00")
+    assert _latest(client, headers)["face"] == (newest, 6.0)
+
+    client.put(f"{API_PREFIX}/biometric/{newest}", headers=headers, json={"value": 7.0})
+    assert _latest(client, headers)["face"] == (newest, 7.0)
+
+    # Moving or deleting the latest reading falls back to the next one
+    client.put(f"{API_PREFIX}/biometric/{newest}", headers=headers, json={"timestamp": "2020-01-01T00:00:00"})
+    assert _latest(client, headers)["face"] == (ids[1], 2.0)
+    client.delete(f"{API_PREFIX}/biometric/{ids[1]}", headers=headers)
+    assert _latest(client, headers)["face"] == (ids[2], 3.0)
+
+    client.delete(f"{API_PREFIX}/biometric/{ids[3]}", headers=headers)
+    assert "voice" not in _latest(client, headers)
+
+def test_writes_during_warmup_are_reloaded(db, test_user, test_organization, monkeypatch):
+    ids = _seed(db, test_user, test_organization)
+    user_id, organization_id = test_user.id, test_organization.id
+    fan_out = database.fan_out
+    written = []
+
+    def write_during_query(session, query, *args):
+        results = fan_out(session, query, *args)
+        # A reading is committed after the warmup query has read the table
+        row = BiometricData(user_id=user_id, organization_id=organization_id, data_type=BiometricDataType.FACE,
+                            value=9.0, timestamp=datetime(2025, 1, 1), data_metadata={})
+        db.add(row)
+        db.commit()
+        written.append(row.id)
+        latest_readings.apply_event({"type": EVENT_CREATED, "organization_id": organization_id, "data": {
+            "id": row.id, "user_id": user_id, "data_type": "face", "value": 9.0, "timestamp": datetime(2025, 1, 1)
+        }})
+        return results
+
+    monkeypatch.setattr(database, "fan_out", write_during_query)
+    latest_readings.warm(db)
+    monkeypatch.setattr(database, "fan_out", fan_out)
+    assert latest_readings.get(db, user_id, "face").data_id == written[0]
+    assert latest_readings.get(db, user_id, "voice").data_id == ids[3]
+
+def test_organization_teardown_forgets_readings(client, db, test_user, test_organization, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+    from app.utils.teardown import run_teardown, start_teardown
+
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    _seed(db, test_user, test_organization)
+    latest_readings.warm(db)
+    assert len(latest_readings) == 2
+
+    run_teardown(start_teardown(db, test_organization.id).id)
+    assert len(latest_readings) == 0
+
+def test_cold_index_loads_from_database(client, db, test_user, test_organization):
+    ids = _seed(db, test_user, test_organization)
+    assert _latest(client, _headers(test_user)) == {"face": (ids[1], 2.0), "voice": (ids[3], 4.0)}
+
+def test_other_users_require_organization_role(client, db, test_user, test_org_user, test_organization):
+    ids = _seed(db, test_user, test_organization)
+    user_id = test_user.id
+
+    response = client.get(f"{API_PREFIX}/biometric/latest/?user_id={test_org_user.id}", headers=_headers(test_user))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert _latest(client, _headers(test_org_user), user_id=user_id)["face"] == (ids[1], 2.0)
+
+def test_index_requires_broker_with_several_workers(client, db, test_user, test_organization, monkeypatch):
+    monkeypatch.setattr(settings, "LATEST_READINGS_SINGLE_WORKER", False)
+    user_id, organization_id = test_user.id, test_organization.id
+    ids = _seed(db, test_user, test_organization)
+    assert latest_readings.warm(db) == 0
+    headers = _headers(test_user)
+    assert _latest(client, headers, data_type="face") == {"face": (ids[1], 2.0)}
+
+    # A write of another worker is not announced without a broker, yet it is seen
+    db.execute(insert(BiometricData).values(user_id=user_id, organization_id=organization_id,
+                                            data_type=BiometricDataType.FACE, value=5.0,
+                                            timestamp=datetime(2024, 2, 1), data_metadata={}))
+    db.commit()
+    assert _latest(client, headers, data_type="face")["face"][1] == 5.0
+    assert len(latest_readings) == 0
@@ -0,0 +1,133 @@
+import asyncio
+import tracemalloc
+
+import pytest
+from fastapi import status
+
+from app.models.models import User, UserRole
+from app.utils.auth import create_access_token
+from app.utils.memory_diagnostics import (
+    MemoryMiddleware, RouteMemoryStats, live_objects, prometheus_metrics, route_memory, snapshot_store,
+    start_tracing, stop_tracing
+)
+
+API_PREFIX = "/api/v1"
+
+@pytest.fixture
+def admin_headers(test_admin):
+    return {"Authorization": f"Bearer {create_access_token({'sub': test_admin.email, 'role': test_admin.role})}"}
+
+@pytest.fixture
+def tracing():
+    yield
+    stop_tracing()
+
+def test_live_objects_counts_orm_instances():
+    users = [User(email=f"u{i}@example.com", role=UserRole.USER) for i in range(5)]
+    assert live_objects()["orm_objects"]["User"] >= len(users)
+
+def test_route_peaks_use_templates(client, admin_headers, test_user, tracing):
+    route_memory.clear()
+    response = client.post(f"{API_PREFIX}/admin/memory/tracing", params={"enabled": True}, headers=admin_headers)
+    assert response.json() == {"tracing": True} and tracemalloc.is_tracing()
+
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    for data_id in (1, 2):
+        client.get(f"{API_PREFIX}/biometric/{data_id}", headers={"Authorization": f"Bearer {token}"})
+
+    report = client.get(f"{API_PREFIX}/admin/memory/", headers=admin_headers).json()
+    stats = report["routes"][f"GET {API_PREFIX}/biometric/{{data_id}}"]
+    assert stats["requests"] == stats["traced_requests"] == 2
+    assert stats["peak_bytes_max"] > 0
+    assert report["tracing"] and report["traced_bytes"] > 0
+    assert report["rss_bytes"] > 0
+
+    metrics = client.get(f"{API_PREFIX}/admin/memory/metrics", headers=admin_headers)
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert f'bio_route_requests_total{{route="GET {API_PREFIX}/biometric/{{data_id}}"}} 2' in metrics.text
+    assert "# TYPE bio_memory_rss_bytes gauge" in metrics.text
+
+def test_open_stream_does_not_pin_the_peak(tracing):
+    start_tracing()
+    stream_open, release = asyncio.Event(), asyncio.Event()
+
+    async def app(scope, receive, send):
+        streaming = scope["method"] == "GET"
+        content_type = b"text/event-stream" if streaming else b"application/json"
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        if streaming:
+            stream_open.set()
+            await release.wait()
+        elif scope["method"] == "POST":
+            buffer = bytearray(4 * 1024 * 1024)
+            del buffer
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def noop(message):
+        pass
+
+    async def scenario():
+        stats = RouteMemoryStats()
+        middleware = MemoryMiddleware(app, stats)
+        stream = asyncio.create_task(middleware({"type": "http", "method": "GET"}, None, noop))
+        await stream_open.wait()
+        await middleware({"type": "http", "method": "POST"}, None, noop)
+        # The heavy request's peak is not charged to requests that come after it
+        await middleware({"type": "http", "method": "PUT"}, None, noop)
+        release.set()
+        await stream
+        return stats.snapshot()
+
+    routes = asyncio.run(scenario())
+    assert routes["POST <unmatched>"]["peak_bytes_max"] >= 4 * 1024 * 1024
+    assert routes["PUT <unmatched>"]["peak_bytes_max"] < 1024 * 1024
+    assert routes["GET <unmatched>"]["requests"] == 1
+
+def test_snapshots_download_and_diff(client, admin_headers, tmp_path, monkeypatch, tracing):
+    monkeypatch.setattr(snapshot_store, "directory", str(tmp_path))
+    response = client.post(f"{API_PREFIX}/admin/memory/snapshots/", headers=admin_headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    client.post(f"{API_PREFIX}/admin/memory/tracing", params={"enabled": True}, headers=admin_headers)
+    base = client.post(f"{API_PREFIX}/admin/memory/snapshots/", headers=admin_headers).json()
+    retained = [bytearray(1024) for _ in range(2000)]
+    current = client.post(f"{API_PREFIX}/admin/memory/snapshots/", headers=admin_headers).json()
+
+    listed = client.get(f"{API_PREFIX}/admin/memory/snapshots/", headers=admin_headers).json()
+    assert {item["id"] for item in listed} == {base["id"], current["id"]}
+
+    raw = client.get(f"{API_PREFIX}/admin/memory/snapshots/{current['id']}", headers=admin_headers)
+    assert raw.status_code == status.HTTP_200_OK
+    path = tmp_path / "download.tracemalloc"
+    path.write_bytes(raw.content)
+    assert tracemalloc.Snapshot.load(str(path)).traces
+
+    diff = client.get(
+        f"{API_PREFIX}/admin/memory/snapshots/{current['id']}",
+        params={"base": base["id"], "limit": 5}, headers=admin_headers
+    ).json()
+    assert diff[0]["size_diff_bytes"] >= 1024 * 2000
+    assert "test_memory_diagnostics.py" in diff[0]["location"]
+    assert len(retained) == 2000
+
+    top = client.get(f"{API_PREFIX}/admin/memory/snapshots/{current['id']}",
+                     params={"format": "top", "key_type": "filename"}, headers=admin_headers).json()
+    assert top and {"location", "size_bytes", "count"} <= set(top[0])
+
+    missing = client.get(f"{API_PREFIX}/admin/memory/snapshots/{'0' * 32}", headers=admin_headers)
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+def test_memory_endpoints_require_admin(client, test_org_user):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': test_org_user.email, 'role': test_org_user.role})}"}
+    for path in ("/admin/memory/", "/admin/memory/metrics", "/admin/memory/snapshots/"):
+        assert client.get(f"{API_PREFIX}{path}", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+
+def test_prometheus_metrics_skip_missing_values():
+    text = prometheus_metrics({
+        "rss_bytes": 10, "max_rss_bytes": None, "traced_bytes": None, "traced_peak_bytes": None,
+        "orm_objects": {"User": 3}, "sessions": 1, "identity_map_objects": 3,
+        "dataframes": 0, "dataframe_bytes": 0, "routes": {},
+    })
+    assert "bio_memory_rss_bytes 10" in text
+    assert 'bio_orm_live_objects{model="User"} 3' in text
+    assert "bio_memory_traced_bytes" not in text
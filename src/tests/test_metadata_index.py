@@ -0,0 +1,141 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+from sqlalchemy import text
+
+from app.config import settings
+from app.models.models import BiometricMetadataValue
+from app.utils.auth import create_access_token
+from tests.conftest import TestingSessionLocal
+
+API_PREFIX = "/api/v1"
+
+def _create(client, token, value, metadata):
+    response = client.post(
+        f"{API_PREFIX}/biometric/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"data_type": "fingerprint", "value": value, "timestamp": datetime.utcnow().isoformat(), "data_metadata": metadata}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["id"]
+
+@pytest.fixture
+def tokens(test_user, test_org_user):
+    return (
+        create_access_token({"sub": test_user.email, "role": test_user.role}),
+        create_access_token({"sub": test_org_user.email, "role": test_org_user.role}),
+    )
+
+def test_declared_keys_filter_list_and_analytics(client, db, tokens):
+    user_token, org_token = tokens
+    org_headers = {"Authorization": f"Bearer {org_token}"}
+    # Rows written before the key is declared are backfilled
+    first = _create(client, user_token, 1.0, {"device": {"id": "A-1"}, "quality": 91})
+    second = _create(client, user_token, 2.0, {"device": {"id": "B-2"}, "quality": 55})
+
+    response = client.post(f"{API_PREFIX}/biometric/metadata-keys/", headers=org_headers,
+                           json={"key": "device.id"})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["indexed_values"] == 2
+    response = client.post(f"{API_PREFIX}/biometric/metadata-keys/", headers=org_headers,
+                           json={"key": "quality", "value_type": "number"})
+    assert response.json()["indexed_values"] == 2
+
+    third = _create(client, user_token, 3.0, {"device": {"id": "A-1"}, "quality": "n/a"})
+
+    def listed(*filters):
+        query = "&".join(f"meta={f}" for f in filters)
+        response = client.get(f"{API_PREFIX}/biometric/?{query}", headers=org_headers)
+        assert response.status_code == status.HTTP_200_OK
+        return sorted(item["id"] for item in response.json())
+
+    assert listed("device.id:A-1") == [first, third]
+    assert listed("quality>=60") == [first]
+    assert listed("quality<60") == [second]
+    assert listed("device.id=A-1", "quality>90") == [first]
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/analytics/?data_type=fingerprint&meta=device.id:A-1", headers=org_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["count"] == 2
+    assert response.json()["average"] == 2.0
+
+    # Updates and deletes keep the side table in step
+    client.put(f"{API_PREFIX}/biometric/{third}", headers={"Authorization": f"Bearer {user_token}"},
+               json={"data_metadata": {"device": {"id": "C-3"}}})
+    assert listed("device.id:A-1") == [first]
+    client.delete(f"{API_PREFIX}/biometric/{first}", headers={"Authorization": f"Bearer {user_token}"})
+    assert listed("device.id:A-1") == []
+    assert db.query(BiometricMetadataValue).filter(BiometricMetadataValue.data_id == first).count() == 0
+
+def test_large_backfill_runs_as_job(client, db, tokens, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_OPERATION_SYNC_LIMIT", 2)
+    monkeypatch.setattr(settings, "BULK_OPERATION_CHUNK_SIZE", 2)
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    user_token, org_token = tokens
+    org_headers = {"Authorization": f"Bearer {org_token}"}
+    ids = [_create(client, user_token, float(i), {"site": "HQ" if i % 2 else "Lab"}) for i in range(5)]
+
+    response = client.post(f"{API_PREFIX}/biometric/metadata-keys/", headers=org_headers, json={"key": "site"})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["indexed_values"] is None
+
+    job = client.get(f"{API_PREFIX}/biometric/bulk-jobs/{response.json()['job_id']}", headers=org_headers).json()
+    assert job["operation"] == "metadata_backfill"
+    assert (job["status"], job["processed"], job["total"]) == ("completed", 5, 5)
+    listed = client.get(f"{API_PREFIX}/biometric/?meta=site:HQ", headers=org_headers).json()
+    assert sorted(item["id"] for item in listed) == ids[1::2]
+    assert db.query(BiometricMetadataValue).count() == 5
+
+def test_filter_validation(client, tokens):
+    _, org_token = tokens
+    headers = {"Authorization": f"Bearer {org_token}"}
+    client.post(f"{API_PREFIX}/biometric/metadata-keys/", headers=headers, json={"key": "site"})
+
+    for bad in ("unknown:1", "site>3", "no-operator"):
+        response = client.get(f"{API_PREFIX}/biometric/?meta={bad}", headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.post(f"{API_PREFIX}/biometric/metadata-keys/", headers=headers, json={"key": "site"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.delete(f"{API_PREFIX}/biometric/metadata-keys/site", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert client.get(f"{API_PREFIX}/biometric/metadata-keys/", headers=headers).json() == []
+
+def test_declaring_keys_requires_organization_role(client, tokens):
+    user_token, _ = tokens
+    response = client.post(f"{API_PREFIX}/biometric/metadata-keys/",
+                           headers={"Authorization": f"Bearer {user_token}"}, json={"key": "site"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_filter_uses_index(db):
+    from app.utils.metadata_index import metadata_conditions
+    from app.models.models import BiometricData, MetadataKey, MetadataValueType
+
+    db.add(MetadataKey(organization_id=1, key="site", value_type=MetadataValueType.STRING))
+    db.flush()
+    query = db.query(BiometricData.id).filter(*metadata_conditions(db, 1, ["site:HQ"]))
+    sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+    plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "USING COVERING INDEX ix_metadata_values_org_key_text" in plan
+
+def test_bulk_import_indexes_declared_keys(db, test_user, test_organization, tmp_path):
+    import json
+    from app.models.models import BiometricData, MetadataKey, MetadataValueType
+    from app.utils.bulk_import import import_biometric_file
+    from app.utils.metadata_index import metadata_conditions
+
+    db.add(MetadataKey(organization_id=test_organization.id, key="i", value_type=MetadataValueType.NUMBER))
+    db.commit()
+    source = tmp_path / "readings.ndjson"
+    source.write_text("\n".join(json.dumps({
+        "data_type": "voice", "value": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}", "data_metadata": {"i": i}
+    }) for i in range(10)), encoding="utf-8")
+
+    import_biometric_file(db, str(source), organization_id=test_organization.id,
+                          default_user_id=test_user.id, batch_size=3)
+
+    rows = db.query(BiometricData).filter(*metadata_conditions(db, test_organization.id, ["i>=7"])).all()
+    assert sorted(row.value for row in rows) == [7.0, 8.0, 9.0]
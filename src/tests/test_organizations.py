@@ -1,7 +1,7 @@
 import pytest
 from fastapi import status
 
-from app.models.models import UserRole
+from app.models.models import UserRole, User, Organization, OrganizationTeardown, BiometricData
 from app.utils.auth import create_access_token
 
 def test_create_organization(client, test_admin):
@@ -46,14 +46,22 @@ def test_update_organization(client, test_admin, test_organization):
     assert data["name"] == "Updated Organization"
     assert data["contact_email"] == "updated@org.com"
 
-def test_delete_organization(client, test_admin, test_organization):
+def test_delete_organization(client, db, test_admin, test_organization, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    org_id = test_organization.id
     token = create_access_token({"sub": test_admin.email, "role": test_admin.role})
     response = client.delete(
-        f"/api/v1/organizations/{test_organization.id}",
+        f"/api/v1/organizations/{org_id}",
         headers={"Authorization": f"Bearer {token}"}
     )
-    assert response.status_code == status.HTTP_200_OK
-    assert response.json()["message"] == "Organization deleted successfully"
+    # Deletion runs as a background teardown
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["organization_id"] == org_id
+    db.expire_all()
+    assert db.query(OrganizationTeardown).one().status == "completed"
+    assert db.query(Organization).filter(Organization.id == org_id).first() is None
 
 def test_list_organizations(client, test_admin, test_organization):
     token = create_access_token({"sub": test_admin.email, "role": test_admin.role})
@@ -117,4 +125,145 @@ def test_list_organizations_unauthorized(client, test_user):
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == status.HTTP_403_FORBIDDEN
-    assert response.json()["detail"] == "Not enough permissions" 
\ No newline at end of file
+    assert response.json()["detail"] == "Not enough permissions" 
+
+def test_teardown_organization(client, db, test_admin, test_user, test_biometric_data, test_organization, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+    from app.config import settings
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "TEARDOWN_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "TEARDOWN_PAUSE_SECONDS", 0)
+    org_id = test_organization.id
+    token = create_access_token({"sub": test_admin.email, "role": test_admin.role})
+
+    response = client.post(
+        f"/api/v1/organizations/{org_id}/teardown",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    db.expire_all()
+    teardown = db.query(OrganizationTeardown).filter(OrganizationTeardown.organization_id == org_id).one()
+    assert teardown.status == "completed"
+    assert teardown.deleted_counts == {"changes": 1, "biometric_data": 1, "users": 2}
+    assert db.query(Organization).filter(Organization.id == org_id).first() is None
+    assert db.query(BiometricData).count() == 0
+
+def test_resume_interrupted_teardown(db, test_user, test_biometric_data, test_organization, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+    from app.utils.teardown import run_teardown
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    # A crash after the first phase left the job "running" with partial progress
+    teardown = OrganizationTeardown(
+        organization_id=test_organization.id,
+        status="running",
+        phase="access_logs",
+        deleted_counts={"biometric_data": 5}
+    )
+    db.add(teardown)
+    db.commit()
+
+    run_teardown(teardown.id)
+
+    db.expire_all()
+    assert teardown.status == "completed"
+    assert teardown.deleted_counts == {"biometric_data": 6, "changes": 1, "users": 1}
+    assert db.query(User).count() == 0
+
+def test_teardown_organization_unauthorized(client, test_user, test_organization):
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    response = client.post(
+        f"/api/v1/organizations/{test_organization.id}/teardown",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_running_teardown_is_not_started_twice(db, test_user, test_biometric_data, test_organization, monkeypatch):
+    from datetime import datetime, timedelta
+    from tests.conftest import TestingSessionLocal
+    from app.utils.teardown import run_teardown
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    teardown = OrganizationTeardown(
+        organization_id=test_organization.id,
+        status="running",
+        deleted_counts={},
+        owner="other-worker",
+        lease_expires_at=datetime.utcnow() + timedelta(minutes=1)
+    )
+    db.add(teardown)
+    db.commit()
+
+    # Another worker holds the lease: nothing is deleted
+    assert run_teardown(teardown.id) is False
+    db.expire_all()
+    assert db.query(BiometricData).count() == 1
+    assert teardown.deleted_counts == {}
+
+    # The lease of a crashed worker expires and the job is taken over
+    teardown.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert run_teardown(teardown.id) is True
+    db.expire_all()
+    assert teardown.status == "completed"
+    assert db.query(BiometricData).count() == 0
+
+def test_teardown_blocks_requests_and_detaches_users(client, db, test_admin, test_user, test_organization, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+    from app.models.models import AccessLog
+    from app.utils.teardown import run_teardown, start_teardown
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    org_id, user_id = test_organization.id, test_user.id
+    user_token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    other = Organization(name="Other", contact_email="other@org.com")
+    db.add(other)
+    db.commit()
+    # An audit row of another organization that points at the departing user
+    db.add(AccessLog(user_id=user_id, organization_id=other.id, action="read", details={}))
+    db.commit()
+    other_id = other.id
+
+    teardown = start_teardown(db, org_id)
+    response = client.get("/api/v1/biometric/", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = client.post("/api/v1/register", json={
+        "email": "late@example.com", "password": "secret123", "organization_id": org_id
+    })
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    run_teardown(teardown.id)
+    db.expire_all()
+    log = db.query(AccessLog).one()
+    assert (log.organization_id, log.user_id) == (other_id, None)
+    assert db.query(OrganizationTeardown).one().deleted_counts["detached_references"] == 1
+
+def test_teardown_state_is_cached_between_requests(db, test_user, test_organization, monkeypatch):
+    import time
+    from tests.conftest import TestingSessionLocal
+    from app.utils.teardown import organization_departing, run_teardown, start_teardown, teardown_state_cache
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(teardown_state_cache, "ttl", 0.3)
+    org_id = test_organization.id
+    assert organization_departing(db, org_id) is False
+
+    # A teardown registered by another worker is seen once the cached state expires
+    other_worker = OrganizationTeardown(organization_id=org_id, status="pending", deleted_counts={})
+    db.add(other_worker)
+    db.commit()
+    assert organization_departing(db, org_id) is False
+    time.sleep(0.3)
+    assert organization_departing(db, org_id) is True
+
+    # The final sweep waits until no worker can hold a stale state any more
+    db.delete(other_worker)
+    db.commit()
+    teardown = start_teardown(db, org_id)
+    assert organization_departing(db, org_id) is True
+    started = time.monotonic()
+    run_teardown(teardown.id)
+    assert time.monotonic() - started >= 0.25
+    assert len(teardown_state_cache) == 0
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.database import Base
+from app.models.models import BiometricData, BiometricDataType, Organization, User, UserRole
+from app.utils.auth import create_access_token
+from app.utils.parallel_analytics import (
+    AnalyticsTask, Moments, PartialAggregate, analytics_pool, compute_partial, iter_partials, plan_tasks,
+    shutdown_analytics_pool, summarize
+)
+
+API_PREFIX = "/api/v1"
+START = datetime(2024, 1, 1)
+
+def _seed(db, organizations=2, per_org=60):
+    for index in range(organizations):
+        organization = Organization(name=f"Org {index}", contact_email=f"org{index}@example.com")
+        db.add(organization)
+        db.flush()
+        users = [
+            User(email=f"u{index}-{n}@example.com", hashed_password="x",
+                 role=UserRole.USER, organization_id=organization.id)
+            for n in range(3)
+        ]
+        db.add_all(users)
+        db.flush()
+        db.add_all([
+            BiometricData(
+                user_id=users[n % 3].id, organization_id=organization.id,
+                data_type=BiometricDataType.FACE if n % 2 else BiometricDataType.VOICE,
+                value=float(n * (index + 1)), timestamp=START + timedelta(hours=12 * n), data_metadata={}
+            )
+            for n in range(per_org)
+        ])
+    db.commit()
+
+def test_moments_merge_matches_numpy():
+    values = np.random.default_rng(1).normal(50, 10, 1000)
+    moments = Moments()
+    for chunk in np.array_split(values, 7):
+        part = Moments()
+        part.add_array(chunk)
+        moments.merge(part)
+    assert moments.count == 1000
+    assert moments.mean == pytest.approx(values.mean())
+    assert moments.std == pytest.approx(values.std(ddof=1))
+    assert (moments.min, moments.max) == (values.min(), values.max())
+
+def test_rows_without_user_are_counted(db, test_user, test_organization):
+    # Readings whose user was detached by another organization's teardown
+    db.add_all([
+        BiometricData(user_id=user_id, organization_id=test_organization.id, data_type=BiometricDataType.FACE,
+                      value=value, timestamp=START, data_metadata={})
+        for user_id, value in ((test_user.id, 1.0), (None, 3.0))
+    ])
+    db.commit()
+    task = AnalyticsTask(test_organization.id, START, START + timedelta(days=1))
+    result = summarize(compute_partial(db, task, fetch_size=10))
+    assert result["data_types"]["face"]["count"] == 2
+    assert result["data_types"]["face"]["mean"] == 2.0
+    assert result["data_types"]["face"]["active_users"] == 1
+
+def test_process_pool_matches_in_process(tmp_path):
+    url = f"sqlite:///{tmp_path / 'analytics.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        _seed(db)
+        tasks = plan_tasks(db, chunk_days=7, database_url=lambda organization_id: url)
+        # 60 readings every 12 hours span 30 days: 5 chunks per organization
+        assert len(tasks) == 10
+
+        expected = PartialAggregate()
+        for partial in iter_partials(tasks, 0, fetch_size=8, db=db):
+            expected.merge(partial)
+
+    parallel = PartialAggregate()
+    try:
+        for partial in iter_partials(tasks, 2, fetch_size=8):
+            parallel.merge(partial)
+        # Later requests reuse the worker processes of the first one
+        pool = analytics_pool(2)
+        assert sum(partial.tasks for partial in iter_partials(tasks[:3], 2, fetch_size=8)) == 3
+        assert analytics_pool(2) is pool
+    finally:
+        shutdown_analytics_pool()
+    engine.dispose()
+
+    result, reference = summarize(parallel), summarize(expected)
+    for data_type, stats in reference.pop("data_types").items():
+        assert result["data_types"][data_type] == pytest.approx(stats)
+    assert {key: result[key] for key in reference} == reference
+    assert result["total_records"] == 120
+    assert result["tasks"] == 10
+    assert list(result["by_organization"].values()) == [60, 60]
+    assert result["data_types"]["face"]["count"] == 60
+    assert result["data_types"]["face"]["active_users"] == 6
+    assert sum(result["daily_activity"].values()) == 120
+
+def test_admin_analytics_endpoint(client, db, test_admin, test_org_user, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_ANALYTICS_WORKERS", 0)
+    _seed(db, organizations=1, per_org=10)
+    admin_token = create_access_token({"sub": test_admin.email, "role": test_admin.role})
+    org_token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+
+    response = client.get(
+        f"{API_PREFIX}/admin/analytics/",
+        params={"start": START.isoformat(), "end": (START + timedelta(days=2)).isoformat()},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_records"] == 4
+    assert data["daily_activity"] == {"2024-01-01": 2, "2024-01-02": 2}
+    assert data["data_types"]["voice"]["mean"] == 1.0
+
+    response = client.get(f"{API_PREFIX}/admin/analytics/", headers={"Authorization": f"Bearer {org_token}"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = client.get(
+        f"{API_PREFIX}/admin/analytics/",
+        params={"start": START.isoformat(), "end": START.isoformat()},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,135 @@
+import asyncio
+import pstats
+import pytest
+from fastapi import status
+
+from app.database import database
+from app.utils.auth import create_access_token
+from app.utils import profiling
+from app.utils.profiling import ProfileStore, ProfilingMiddleware, profile_store
+from tests.conftest import TestingSessionLocal
+
+API_PREFIX = "/api/v1"
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    # The middleware checks the admin role with its own session
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(profile_store, "directory", str(tmp_path))
+    return tmp_path
+
+def test_admin_profiles_request(client, test_admin, profiles):
+    token = create_access_token({"sub": test_admin.email, "role": test_admin.role})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"{API_PREFIX}/organizations/", headers={**headers, "X-Profile": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    profile_id = response.headers["X-Profile-Id"]
+    stats = pstats.Stats(str(profiles / f"{profile_id}.pstats"))
+    assert stats.total_calls > 0
+
+    listing = client.get(f"{API_PREFIX}/admin/profiles/", headers=headers).json()
+    assert listing[0]["id"] == profile_id
+    assert listing[0]["path"] == f"{API_PREFIX}/organizations/"
+    assert listing[0]["sampled"] is False
+
+    response = client.get(f"{API_PREFIX}/admin/profiles/{profile_id}?format=text", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "function calls" in response.text
+
+    response = client.get(f"{API_PREFIX}/admin/profiles/{profile_id}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == (profiles / f"{profile_id}.pstats").read_bytes()
+
+    response = client.get(f"{API_PREFIX}/admin/profiles/../../etc", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_profiling_requires_admin(client, test_user, profiles):
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"{API_PREFIX}/users/me?profile=1", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert list(profiles.iterdir()) == []
+
+    response = client.get(f"{API_PREFIX}/users/me", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "X-Profile-Id" not in response.headers
+
+    response = client.get(f"{API_PREFIX}/admin/profiles/", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_sampled_profiling_stores_artifacts(client, test_user, profiles, monkeypatch):
+    middleware = client.app.middleware_stack
+    while not isinstance(middleware, ProfilingMiddleware):
+        middleware = middleware.app
+    monkeypatch.setattr(middleware, "sample_rate", 1.0)
+
+    response = client.get("/")
+    assert response.status_code == status.HTTP_200_OK
+    assert "X-Profile-Id" not in response.headers
+
+    [item] = profile_store.list()
+    assert item["sampled"] is True and item["status_code"] == 200
+    assert (profiles / f"{item['id']}.pstats").exists()
+
+def test_profile_store_keeps_latest(tmp_path):
+    import cProfile
+
+    store = ProfileStore(str(tmp_path), max_files=2)
+    for i in range(3):
+        store.save(f"{i:032x}", cProfile.Profile(), {"created_at": f"2024-01-0{i + 1}"})
+    assert [item["id"] for item in store.list()] == [f"{2:032x}", f"{1:032x}"]
+    assert not (tmp_path / f"{0:032x}.pstats").exists()
+
+def _scope(path, headers=()):
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": list(headers)}
+
+def test_stream_does_not_hold_the_profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_is_admin", lambda scope: True)
+    stream_open, release = asyncio.Event(), asyncio.Event()
+
+    async def app(scope, receive, send):
+        content_type = b"text/event-stream" if scope["path"] == "/events/" else b"application/json"
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        if scope["path"] == "/events/":
+            await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+            stream_open.set()
+            await release.wait()
+        elif scope["path"] == "/slow/":
+            stream_open.set()
+            await release.wait()
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def call(middleware, scope):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware(scope, None, send)
+        return messages
+
+    async def scenario():
+        store = ProfileStore(str(tmp_path))
+        middleware = ProfilingMiddleware(app, store, sample_rate=1.0)
+        stream = asyncio.create_task(call(middleware, _scope("/events/")))
+        await stream_open.wait()
+        # The open stream finished its profile at the start of the response
+        await call(middleware, _scope("/"))
+        assert [item["streaming"] for item in store.list()].count(True) == 1
+        assert len(store.list()) == 2
+        release.set()
+        await stream
+
+        stream_open.clear()
+        release.clear()
+        slow = asyncio.create_task(call(middleware, _scope("/slow/")))
+        await stream_open.wait()
+        busy = await call(middleware, _scope("/", [(b"x-profile", b"1")]))
+        assert busy[0]["status"] == status.HTTP_409_CONFLICT
+        release.set()
+        await slow
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,153 @@
+import asyncio
+import random
+import pytest
+from datetime import datetime, timedelta
+from fastapi import status
+
+from app.models.models import BiometricDataType, UsageSketch
+from app.utils.auth import create_access_token
+from app.utils.sketches import HyperLogLog, KLLSketch, flush_usage_periodically, record_usage, usage_buffer
+
+API_PREFIX = "/api/v1"
+
+def _exact_rank(values, x):
+    return sum(1 for v in values if v <= x) / len(values)
+
+def test_hyperloglog_within_error_bound():
+    sketch = HyperLogLog()
+    sketch.update(range(20000))
+    # Three standard errors is a practically guaranteed bound
+    assert abs(sketch.estimate() - 20000) / 20000 < 3 * sketch.relative_error
+
+    small = HyperLogLog()
+    small.update([1, 2, 3, 3, 3, 4, 5, 5, 6, 7])
+    assert round(small.estimate()) == 7
+
+def test_hyperloglog_merge_equals_union():
+    days = [HyperLogLog() for _ in range(3)]
+    for day, sketch in enumerate(days):
+        sketch.update(range(day * 1000, day * 1000 + 2000))
+    merged = HyperLogLog()
+    for sketch in days:
+        merged.merge(HyperLogLog.from_bytes(sketch.to_bytes()))
+
+    union = HyperLogLog()
+    union.update(range(4000))
+    assert merged.estimate() == union.estimate()
+    assert abs(merged.estimate() - 4000) / 4000 < 3 * merged.relative_error
+
+def test_kll_quantiles_within_rank_error():
+    rng = random.Random(7)
+    values = [rng.gauss(100, 15) for _ in range(50000)]
+    parts = [KLLSketch(rng=random.Random(i)) for i in range(5)]
+    for i, value in enumerate(values):
+        parts[i % 5].add(value)
+
+    merged = KLLSketch(rng=random.Random(42))
+    for part in parts:
+        merged.merge(KLLSketch.from_bytes(part.to_bytes()))
+
+    assert merged.count == len(values)
+    assert len(merged.to_bytes()) < 16 * 1024
+    for q, estimate in zip([0.01, 0.5, 0.9, 0.99], merged.quantiles([0.01, 0.5, 0.9, 0.99])):
+        assert abs(_exact_rank(values, estimate) - q) <= merged.rank_error
+
+def test_kll_small_input_is_exact():
+    sketch = KLLSketch()
+    sketch.update([5, 1, 4, 2, 3])
+    assert sketch.quantiles([0.2, 0.6, 1.0]) == [1.0, 3.0, 5.0]
+    assert KLLSketch().quantile(0.5) is None
+
+def test_record_usage_groups_by_day(db, test_user, test_organization):
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
+    record_usage(db, [
+        (test_organization.id, BiometricDataType.FINGERPRINT, today, test_user.id, 1.0),
+        (test_organization.id, BiometricDataType.FINGERPRINT, today, test_user.id + 1, 2.0),
+        (test_organization.id, BiometricDataType.FINGERPRINT, yesterday, test_user.id, 3.0),
+    ])
+    record_usage(db, [(test_organization.id, BiometricDataType.FINGERPRINT, today, test_user.id, 4.0)])
+    db.commit()
+
+    rows = {row.day: row for row in db.query(UsageSketch).all()}
+    assert rows[today].record_count == 3
+    assert rows[yesterday].record_count == 1
+    assert round(HyperLogLog.from_bytes(rows[today].users_hll).estimate()) == 2
+
+def test_usage_report_and_quantiles(client, db, test_user, test_org_user, test_organization):
+    user_token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    org_token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+    values = [float(v) for v in range(1, 21)]
+    for value in values:
+        client.post(
+            f"{API_PREFIX}/biometric/",
+            headers={"Authorization": f"Bearer {user_token}"},
+            json={"data_type": "fingerprint", "value": value, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+        )
+    client.post(
+        f"{API_PREFIX}/biometric/",
+        headers={"Authorization": f"Bearer {org_token}"},
+        json={"data_type": "face", "value": 1.0, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+    )
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/usage-report/?period_days=7",
+        headers={"Authorization": f"Bearer {org_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    report = response.json()
+    assert report["total_records"] == 21
+    assert report["active_users"] == 2
+    assert report["data_distribution"] == {"fingerprint": 20, "face": 1}
+    assert list(report["daily_activity"].values()) == [21]
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/quantiles/?data_type=fingerprint&q=0.5&q=0.9",
+        headers={"Authorization": f"Bearer {org_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["count"] == 20
+    assert body["quantiles"] == {"0.5": 10.0, "0.9": 18.0}
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/quantiles/?data_type=fingerprint",
+        headers={"Authorization": f"Bearer {user_token}"}
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+def test_single_writes_are_buffered(client, db, monkeypatch, test_user, test_org_user, test_organization):
+    monkeypatch.setattr(usage_buffer, "max_records", 5)
+    user_headers = {"Authorization": f"Bearer {create_access_token({'sub': test_user.email, 'role': test_user.role})}"}
+    org_headers = {"Authorization": f"Bearer {create_access_token({'sub': test_org_user.email, 'role': test_org_user.role})}"}
+    for value in range(7):
+        client.post(
+            f"{API_PREFIX}/biometric/", headers=user_headers,
+            json={"data_type": "fingerprint", "value": float(value), "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+        )
+
+    # Five observations reached the database in one flush, two are still buffered
+    assert [row.record_count for row in db.query(UsageSketch).all()] == [5]
+    report = client.get(f"{API_PREFIX}/biometric/usage-report/", headers=org_headers).json()
+    assert report["total_records"] == 7
+    assert report["includes_deleted"] is True
+
+
+def test_quiet_organization_is_flushed_by_age(db, monkeypatch, test_user, test_organization):
+    from tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr("app.database.database.SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(usage_buffer, "max_age", 0.05)
+    organization_id, user_id = test_organization.id, test_user.id
+    # One write, then silence: no later write would trigger the flush
+    assert usage_buffer.add(organization_id, BiometricDataType.FACE, datetime.utcnow().date(), user_id, 1.0) is False
+
+    async def run_briefly():
+        task = asyncio.create_task(flush_usage_periodically())
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+    asyncio.run(run_briefly())
+    assert usage_buffer.pending_organizations() == []
+    db.expire_all()
+    assert [row.record_count for row in db.query(UsageSketch).all()] == [1]
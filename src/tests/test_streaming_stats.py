@@ -0,0 +1,90 @@
+import statistics
+import pytest
+from datetime import datetime
+from fastapi import status
+
+from app.models.models import BiometricData, BiometricDataType, BiometricStats
+from app.utils.auth import create_access_token
+from app.utils.streaming_stats import add_value, apply_observations, remove_value, variance
+
+API_PREFIX = "/api/v1"
+
+def test_welford_matches_exact_statistics():
+    values = [12.5, 13.1, 11.9, 12.2, 14.0, 12.8, 13.3]
+    stats = BiometricStats(count=0, mean=0.0, m2=0.0)
+    for value in values:
+        add_value(stats, value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert variance(stats) == pytest.approx(statistics.variance(values))
+    assert (stats.min, stats.max) == (min(values), max(values))
+
+    remove_value(stats, 14.0)
+    remaining = [v for v in values if v != 14.0]
+    assert stats.mean == pytest.approx(statistics.mean(remaining))
+    assert variance(stats) == pytest.approx(statistics.variance(remaining))
+
+def test_anomaly_scores_need_minimum_history(db, test_user, test_organization, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "ANOMALY_MIN_SAMPLES", 5)
+
+    history = [(test_user.id, test_organization.id, BiometricDataType.VOICE, v) for v in [10, 11, 9, 10, 10]]
+    assert apply_observations(db, added=history) == [None] * 5
+
+    typical, outlier = apply_observations(db, added=[
+        (test_user.id, test_organization.id, BiometricDataType.VOICE, 10.2),
+        (test_user.id, test_organization.id, BiometricDataType.VOICE, 30.0),
+    ])
+    assert typical < 1
+    assert outlier > 3
+
+def test_create_flags_anomalies(client, db, test_user, test_org_user, test_organization, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "ANOMALY_MIN_SAMPLES", 3)
+    user_id = test_user.id
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    org_token = create_access_token({"sub": test_org_user.email, "role": test_org_user.role})
+
+    for value in [70.0, 71.0, 69.0, 70.5, 140.0]:
+        response = client.post(
+            f"{API_PREFIX}/biometric/",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "data_type": "face",
+                "value": value,
+                "timestamp": datetime.utcnow().isoformat(),
+                "data_metadata": {}
+            }
+        )
+        assert response.status_code == status.HTTP_200_OK
+    assert response.json()["anomaly_score"] > settings.ANOMALY_SCORE_THRESHOLD
+
+    stats = db.query(BiometricStats).filter(BiometricStats.user_id == user_id).one()
+    assert stats.count == 5
+    assert stats.max == 140.0
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/anomalies/",
+        headers={"Authorization": f"Bearer {org_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["value"] for item in response.json()] == [140.0]
+
+def test_delete_updates_statistics(client, db, test_user, test_organization):
+    user_id = test_user.id
+    token = create_access_token({"sub": test_user.email, "role": test_user.role})
+    ids = []
+    for value in [1.0, 2.0, 3.0]:
+        response = client.post(
+            f"{API_PREFIX}/biometric/",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"data_type": "palm", "value": value, "timestamp": datetime.utcnow().isoformat(), "data_metadata": {}}
+        )
+        ids.append(response.json()["id"])
+
+    client.delete(f"{API_PREFIX}/biometric/{ids[-1]}", headers={"Authorization": f"Bearer {token}"})
+
+    stats = db.query(BiometricStats).filter(BiometricStats.user_id == user_id).one()
+    assert stats.count == 2
+    assert stats.mean == pytest.approx(1.5)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+from fastapi import status
+from sqlalchemy import event
+
+from app.models.models import BiometricData, BiometricDataType, User, UserRole
+from app.utils.auth import create_access_token, get_password_hash
+from app.utils.timeline import decode_cursor, encode_cursor, read_timeline
+
+API_PREFIX = "/api/v1"
+START = datetime(2024, 3, 1)
+
+def _seed(db, user_id, organization_id):
+    rows = [
+        BiometricData(user_id=user_id, organization_id=organization_id, data_type=BiometricDataType.FACE,
+                      value=float(i), timestamp=START + timedelta(hours=i // 2), data_metadata={"i": i})
+        for i in range(10)
+    ]
+    # Other types and users must not show up
+    rows.append(BiometricData(user_id=user_id, organization_id=organization_id, data_type=BiometricDataType.VOICE,
+                              value=99.0, timestamp=START, data_metadata={}))
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows[:10]]
+
+def _headers(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email, 'role': user.role})}"}
+
+def test_keyset_pages_cover_range_in_order(client, db, test_user):
+    headers = _headers(test_user)
+    ids = _seed(db, test_user.id, test_user.organization_id)
+
+    seen, cursor = [], None
+    while True:
+        params = {"data_type": "face", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"{API_PREFIX}/biometric/timeline/", params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        seen += [item["id"] for item in page["items"]]
+        assert all(item["data_metadata"] is None for item in page["items"])
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            break
+        cursor = page["next_cursor"]
+    assert seen == ids
+
+    response = client.get(
+        f"{API_PREFIX}/biometric/timeline/",
+        params={"data_type": "face", "start": (START + timedelta(hours=1)).isoformat(),
+                "end": (START + timedelta(hours=3)).isoformat(), "order": "desc", "include_metadata": True},
+        headers=headers
+    )
+    items = response.json()["items"]
+    assert [item["value"] for item in items] == [5.0, 4.0, 3.0, 2.0]
+    assert [item["data_metadata"] for item in items] == [{"i": 5}, {"i": 4}, {"i": 3}, {"i": 2}]
+
+def test_timeline_permissions_and_cursor_validation(client, db, test_user, test_org_user, test_organization):
+    user_id = test_user.id
+    other = User(email="other@example.com", hashed_password=get_password_hash("x"),
+                 role=UserRole.USER, organization_id=test_organization.id)
+    db.add(other)
+    db.commit()
+    other_headers, org_headers = _headers(other), _headers(test_org_user)
+    _seed(db, user_id, test_organization.id)
+
+    response = client.get(f"{API_PREFIX}/biometric/timeline/",
+                          params={"data_type": "face", "user_id": user_id}, headers=other_headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = client.get(f"{API_PREFIX}/biometric/timeline/",
+                          params={"data_type": "face", "user_id": user_id}, headers=org_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["items"]) == 10
+
+    response = client.get(f"{API_PREFIX}/biometric/timeline/",
+                          params={"data_type": "face", "cursor": "not-a-cursor"}, headers=org_headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_timeline_query_uses_covering_index(db, test_user):
+    user_id, organization_id = test_user.id, test_user.organization_id
+    _seed(db, user_id, organization_id)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        read_timeline(db, organization_id, user_id, BiometricDataType.FACE, START, START + timedelta(days=1),
+                      after=(START, 0), limit=5)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    assert len(statements) == 1
+    statement, parameters = statements[0]
+    plan = " ".join(row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+    assert "USING COVERING INDEX ix_biometric_data_timeline_position" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_cursor_round_trip():
+    position = (datetime(2024, 3, 1, 12, 30, 15, 250), 42)
+    assert decode_cursor(encode_cursor(*position)) == position
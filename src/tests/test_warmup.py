@@ -0,0 +1,115 @@
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi import status
+from sqlalchemy import delete
+
+from app.config import settings
+from app.models.models import AccessLog, BiometricData, BiometricDataType, User, UserRole
+from app.utils.auth import create_access_token
+from app.utils.caches import TTLCache, organization_cache, principal_cache
+from app.utils.coalescing import single_flight
+from app.utils.warmup import WARMUP_READY, WARMUP_TIMED_OUT, Warmup, warmup
+
+API_PREFIX = "/api/v1"
+
+def test_ttl_cache_expiry_and_eviction():
+    cache = TTLCache(ttl=0.05, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # "b" was least recently used
+    assert (cache.get("b"), cache.get("a"), cache.get("c")) == (None, 1, 3)
+    time.sleep(0.06)
+    assert cache.get("a") is None and len(cache) == 1
+
+    disabled = TTLCache(ttl=0, max_entries=10)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+
+def test_principal_cache_is_opt_in(client, test_org_user):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': test_org_user.email, 'role': test_org_user.role})}"}
+    assert client.get(f"{API_PREFIX}/users/me", headers=headers).status_code == status.HTTP_200_OK
+    assert len(principal_cache) == 0
+
+def test_principal_cache_serves_and_invalidates(client, db, test_org_user, monkeypatch):
+    monkeypatch.setattr(principal_cache, "ttl", 60.0)
+    email, role = test_org_user.email, test_org_user.role
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': email, 'role': role})}"}
+    assert client.get(f"{API_PREFIX}/users/me", headers=headers).status_code == status.HTTP_200_OK
+    assert principal_cache.get(email)["role"] == UserRole.ORGANIZATION
+
+    # ORM changes drop the cached principal at once
+    user = db.query(User).filter(User.email == email).one()
+    user.role = UserRole.USER
+    db.commit()
+    assert principal_cache.get(email) is None
+    assert client.get(f"{API_PREFIX}/users/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+    # A cached principal answers without reading the users table
+    user = db.query(User).filter(User.email == email).one()
+    user.role = UserRole.ORGANIZATION
+    db.commit()
+    assert client.get(f"{API_PREFIX}/users/me", headers=headers).status_code == status.HTTP_200_OK
+    db.execute(delete(User).where(User.email == email))
+    db.commit()
+    response = client.get(f"{API_PREFIX}/users/me", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["email"] == email
+
+def test_warmup_primes_caches(client, db, test_org_user, test_organization, monkeypatch):
+    monkeypatch.setattr(principal_cache, "ttl", 60.0)
+    monkeypatch.setattr(settings, "LATEST_READINGS_SINGLE_WORKER", True)
+    email, role = test_org_user.email, test_org_user.role
+    user_id, organization_id = test_org_user.id, test_organization.id
+    db.add_all([
+        BiometricData(user_id=user_id, organization_id=organization_id, data_type=BiometricDataType.FACE,
+                      value=value, timestamp=datetime.utcnow(), data_metadata={})
+        for value in (1.0, 2.0, 3.0)
+    ])
+    db.add(AccessLog(user_id=user_id, organization_id=organization_id, action="read",
+                     details={}, timestamp=datetime.utcnow()))
+    db.commit()
+
+    asyncio.run(warmup.run(lambda: db, timeout=10))
+    assert warmup.status == WARMUP_READY
+    assert warmup.results == {"principals": 1, "organizations": 1, "analytics": 2, "latest_readings": 1}
+    assert principal_cache.get(email)["id"] == user_id
+    assert organization_cache.get(organization_id)["name"] == "Test Organization"
+
+    # Precomputed analytics are served without computing again
+    executed = single_flight.executed
+    requested_at = datetime.utcnow()
+    response = client.get(
+        f"{API_PREFIX}/biometric/analytics/?data_type=face",
+        headers={"Authorization": f"Bearer {create_access_token({'sub': email, 'role': role})}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["average"] == 2.0
+    assert single_flight.executed == executed
+    # The cached summary still reports when this response was produced
+    assert datetime.fromisoformat(response.json()["metadata"]["analysis_timestamp"]) >= requested_at
+
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == WARMUP_READY
+
+def test_readiness_waits_for_warmup_or_timeout(client, db):
+    slow = Warmup()
+    slow.add_step("slow", lambda db: time.sleep(0.5))
+    slow.add_step("broken", lambda db: 1 / 0)
+
+    warmup.reset()
+    assert client.get("/ready").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    asyncio.run(slow.run(lambda: db, timeout=0.1))
+    assert slow.status == WARMUP_TIMED_OUT and slow.ready
+
+    fast = Warmup()
+    fast.add_step("broken", lambda db: 1 / 0)
+    asyncio.run(fast.run(lambda: db, timeout=1))
+    assert fast.status == WARMUP_READY
+    assert "broken" in fast.errors
+    warmup.skip()